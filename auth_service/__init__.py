@@ -3,13 +3,14 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
-import os
 import logging
-import jinja2
-from datetime import datetime
 
 from shared.config import AuthConfig
-from shared.swagger_config import init_swagger # Убедимся, что импорт правильный
+from shared.schema import init_schema
+from shared.storage import init_storage
+from shared.templating import configure_templates
+from shared.swagger_config import init_swagger, precompute_apispec # Убедимся, что импорт правильный
+from .hashing import PasswordHasher
 
 db = SQLAlchemy()
 jwt = JWTManager()
@@ -20,32 +21,41 @@ def create_app(config_class=AuthConfig):
                 static_folder='static')
     app.config.from_object(config_class) # Загружаем конфиг, включая PORT
 
-    # Настройка загрузчика шаблонов
-    service_templates = os.path.join(app.root_path, app.template_folder)
-    shared_templates = os.path.abspath(os.path.join(app.root_path, '..', 'shared', 'templates'))
-    app.jinja_loader = jinja2.ChoiceLoader([
-        jinja2.FileSystemLoader(service_templates),
-        jinja2.FileSystemLoader(shared_templates),
-    ])
+    # Загрузчик шаблонов (сервис + shared) и профиль рендеринга (TEMPLATE_PROFILE)
+    configure_templates(app)
 
     # Инициализация расширений
     db.init_app(app)
+    # PRAGMA профиля хранения SQLite и отдельный движок для чтения
+    init_storage(app, db)
     jwt.init_app(app)
 
+    # Пул процессов для хеширования паролей
+    app.extensions['password_hasher'] = PasswordHasher.from_config(app.config)
+    # Фильтр Блума занятых имен (строится при первой проверке)
+    from .usernames import UsernameIndex
+    app.extensions['username_index'] = UsernameIndex.from_config(app.config)
+    # Отозванные refresh-токены (проверяются flask_jwt_extended на каждом jwt_required)
+    from .tokens import TokenDenylist, check_if_token_revoked
+    app.extensions['token_denylist'] = TokenDenylist(app.config.get('TOKEN_DENYLIST_REFRESH_INTERVAL', 1.0))
+    jwt.token_in_blocklist_loader(check_if_token_revoked)
+
     # Инициализация Swagger
     # init_swagger берет PORT из app.config для настройки host
     init_swagger(app)
 
 
+    # Сигнал relay outbox после commit (в том числе relay в фоновом процессе)
+    from .outbox import init_outbox
+    init_outbox(app)
+
     # Регистрация blueprint'ов
     from .routes import auth_bp
     app.register_blueprint(auth_bp)
+    # Спецификация /apispec.json собирается один раз, когда все маршруты уже известны
+    precompute_apispec(app)
 
-    # Создание таблиц (лучше делать это отдельно, например, через flask db migrate/upgrade)
-    # Но если оставляем здесь:
-    with app.app_context():
-        db.create_all()
-
-    app.jinja_env.globals['now'] = datetime.utcnow
+    # Создание таблиц (AUTO_CREATE_SCHEMA) и команда 'flask init-db'
+    init_schema(app)
 
     return app
\ No newline at end of file
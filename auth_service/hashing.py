@@ -0,0 +1,103 @@
+# auth_service/hashing.py
+
+"""
+Хеширование паролей в пуле процессов.
+
+generate_password_hash/check_password_hash намеренно медленные и держат GIL,
+поэтому при выполнении в потоке запроса всплеск логинов сериализует весь
+процесс AuthService. Здесь они выполняются в ProcessPoolExecutor, а очередь
+ожидающих задач ограничена: при ее переполнении сразу выбрасывается
+HasherBusy, и роут отвечает 503 вместо того, чтобы копить запросы.
+"""
+
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+logger = logging.getLogger(__name__)
+
+
+class HasherBusy(Exception):
+    """Пул хеширования перегружен - запрос нужно повторить позже."""
+
+
+class PasswordHasher:
+    """
+    Исполнитель хеширования паролей.
+
+    Args:
+        method: Метод хеширования werkzeug (например, 'scrypt' или 'pbkdf2:sha256:600000').
+        salt_length: Длина соли.
+        workers: Число процессов. 0 - хешировать в текущем потоке (без пула).
+        max_pending: Сколько задач может ждать в очереди сверх числа процессов.
+        timeout: Максимальное ожидание результата (сек.).
+    """
+
+    def __init__(self, method: str = 'scrypt', salt_length: int = 16,
+                 workers: int = None, max_pending: int = 64, timeout: float = 10.0):
+        self.method = method
+        self.salt_length = salt_length
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(self.workers + max_pending)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config) -> 'PasswordHasher':
+        return cls(
+            method=config.get('PASSWORD_HASH_METHOD', 'scrypt'),
+            salt_length=config.get('PASSWORD_SALT_LENGTH', 16),
+            workers=config.get('PASSWORD_HASH_WORKERS'),
+            max_pending=config.get('PASSWORD_HASH_QUEUE_SIZE', 64),
+            timeout=config.get('PASSWORD_HASH_TIMEOUT', 10.0),
+        )
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Пул создается лениво: так он не наследуется процессами, форкнутыми после create_app.
+        # forkserver безопасен при наличии потоков в родительском процессе.
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    context = multiprocessing.get_context('forkserver')
+                    context.set_forkserver_preload(['werkzeug.security'])
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                    atexit.register(self.shutdown)
+                    logger.info(f"Password hashing pool started with {self.workers} worker process(es).")
+        return self._executor
+
+    def _run(self, func, *args):
+        if not self.workers:
+            return func(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy("Password hashing queue is full")
+        try:
+            future = self._get_executor().submit(func, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise HasherBusy("Password hashing timed out")
+
+    def hash(self, password: str) -> str:
+        """Хеширует пароль с параметрами из конфигурации."""
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def check(self, password_hash: str, password: str) -> bool:
+        """Проверяет пароль по сохраненному хешу."""
+        return self._run(check_password_hash, password_hash, password)
+
+    def shutdown(self):
+        """Останавливает процессы пула (пул будет пересоздан при следующем вызове)."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
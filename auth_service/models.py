@@ -1,7 +1,24 @@
 # auth_service/models.py
 from . import db
+from datetime import datetime
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(150), unique=True, nullable=False)
     password_hash = db.Column(db.String(256), nullable=False)
+
+class RevokedToken(db.Model):
+    """Отозванный или уже использованный (ротированный) refresh-токен."""
+    __tablename__ = 'revoked_token'
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(36), unique=True, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True) # exp токена (UTC), после него запись не нужна
+
+class OutboxEvent(db.Model):
+    """Событие, ожидающее отправки в RabbitMQ (transactional outbox)."""
+    __tablename__ = 'outbox_event'
+    id = db.Column(db.Integer, primary_key=True)
+    queue_name = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False) # Тело сообщения в JSON
+    partition_key = db.Column(db.String(100), nullable=True) # Ключ партиции очереди (user_id) или NULL
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
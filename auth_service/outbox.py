@@ -0,0 +1,200 @@
+# auth_service/outbox.py
+
+"""
+Transactional outbox для событий AuthService.
+
+События записываются в таблицу outbox_event в той же транзакции, что и
+изменения данных (например, новый User). Фоновый relay-поток выбирает их
+пачками, публикует в RabbitMQ и удаляет отправленные записи.
+
+Гарантия доставки - "как минимум один раз": если процесс упадет между
+публикацией и удалением, событие будет отправлено повторно, поэтому
+обработчики на стороне консьюмера должны быть идемпотентными.
+
+Relay не ждет OUTBOX_FLUSH_INTERVAL, если его разбудили (notify_relay после
+commit). В run_production.py relay работает в отдельном фоновом процессе,
+поэтому сигнал передается датаграммой в Unix-сокет OUTBOX_WAKEUP_SOCKET;
+без Unix-сокетов (Windows) или если сокет не удалось открыть, будятся только
+relay-потоки того же процесса (run_auth.py), а остальные события уходят
+не позже чем через OUTBOX_FLUSH_INTERVAL.
+"""
+
+import json
+import logging
+import os
+import select
+import socket
+import stat
+import threading
+import time
+from collections import defaultdict
+
+from . import db
+from .models import OutboxEvent
+from shared.rabbitmq import send_messages
+
+logger = logging.getLogger(__name__)
+
+
+class RelayWakeup:
+    """
+    Сигнал relay-потоку, что появились новые события (чтобы не ждать flush interval).
+
+    В процессе relay сигнал ждется на Unix-сокете (если он открыт через listen),
+    иначе - на threading.Event. notify() выставляет оба: событие процесса и
+    датаграмму в сокет relay, который может работать в другом процессе.
+    """
+
+    def __init__(self):
+        self.path = None
+        self._event = threading.Event()
+        self._listener = None
+        self._sender = None
+        self._lock = threading.Lock()
+
+    def configure(self, path: str):
+        """Задает путь сокета relay (OUTBOX_WAKEUP_SOCKET, None - только внутри процесса)."""
+        self.path = path if hasattr(socket, 'AF_UNIX') else None
+
+    def listen(self):
+        """Открывает сокет для сигналов других процессов (вызывается relay-потоком)."""
+        if not self.path or self._listener is not None:
+            return
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            # Сокет, оставшийся от прошлого запуска, мешает bind
+            if os.path.exists(self.path) and stat.S_ISSOCK(os.stat(self.path).st_mode):
+                os.unlink(self.path)
+            listener.bind(self.path)
+        except OSError as e:
+            listener.close()
+            logger.warning(f"Outbox wakeup socket {self.path} is unavailable ({e}), "
+                           f"relay of other processes' events waits for the flush interval.")
+            return
+        listener.setblocking(False)
+        self._listener = listener
+
+    def notify(self):
+        self._event.set()
+        if not self.path:
+            return
+        try:
+            with self._lock:
+                if self._sender is None:
+                    self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+                    self._sender.setblocking(False)
+            self._sender.sendto(b'1', self.path)
+        except OSError:
+            # Relay не запущен или его очередь сигналов полна - событие уйдет по интервалу
+            pass
+
+    def clear(self):
+        """Сбрасывает полученные сигналы. Вызывается ДО выборки событий, чтобы не потерять новые."""
+        self._event.clear()
+        if self._listener is None:
+            return
+        try:
+            while self._listener.recv(64):
+                pass
+        except OSError:
+            pass
+
+    def wait(self, timeout: float):
+        if self._listener is None:
+            self._event.wait(timeout)
+            return
+        # notify() в этом же процессе тоже шлет датаграмму, поэтому достаточно сокета
+        select.select([self._listener], [], [], timeout)
+
+
+_wakeup = RelayWakeup()
+
+def enqueue_event(queue_name: str, message_body: dict, partition_key=None):
+    """
+    Добавляет событие в outbox в рамках текущей сессии. Commit делает вызывающий код.
+
+    Args:
+        queue_name: Имя очереди RabbitMQ.
+        message_body: Словарь Python, который будет сериализован в JSON.
+        partition_key: Ключ партиции (например, user_id): при MESSAGE_PARTITIONS > 0
+                       события одного ключа попадают в одну партицию очереди.
+    """
+    db.session.add(OutboxEvent(
+        queue_name=queue_name,
+        payload=json.dumps(message_body),
+        partition_key=None if partition_key is None else str(partition_key),
+    ))
+
+def init_outbox(app):
+    """Настраивает сигнал relay по конфигурации приложения (вызывается в create_app)."""
+    _wakeup.configure(app.config.get('OUTBOX_WAKEUP_SOCKET'))
+
+def notify_relay():
+    """Будит relay-поток (в том числе в другом процессе) после commit транзакции с новыми событиями."""
+    _wakeup.notify()
+
+def drain_outbox(batch_size: int) -> int:
+    """
+    Отправляет в RabbitMQ одну пачку самых старых событий и удаляет отправленные.
+    Должна вызываться внутри app_context.
+
+    Returns:
+        Количество отправленных событий.
+    """
+    events = (OutboxEvent.query
+              .order_by(OutboxEvent.id)
+              .limit(batch_size)
+              .all())
+    if not events:
+        return 0
+
+    # События с ключом партиции и без него публикуются разными пачками
+    by_queue = defaultdict(list)
+    for event in events:
+        by_queue[(event.queue_name, event.partition_key is not None)].append(event)
+
+    sent_ids = []
+    for (queue_name, keyed), queue_events in by_queue.items():
+        partition_keys = [event.partition_key for event in queue_events] if keyed else None
+        if send_messages(queue_name, [json.loads(event.payload) for event in queue_events], partition_keys):
+            sent_ids.extend(event.id for event in queue_events)
+
+    if sent_ids:
+        OutboxEvent.query.filter(OutboxEvent.id.in_(sent_ids)).delete(synchronize_session=False)
+    db.session.commit()
+    return len(sent_ids)
+
+def _relay_loop(app):
+    """Цикл relay-потока: отправляет пачки, пока outbox не опустеет, затем ждет."""
+    batch_size = app.config.get('OUTBOX_BATCH_SIZE', 100)
+    flush_interval = app.config.get('OUTBOX_FLUSH_INTERVAL', 1.0)
+    _wakeup.listen()
+    logger.info(f"Outbox relay started (batch_size={batch_size}, flush_interval={flush_interval}s).")
+
+    while True:
+        # Сигналы сбрасываются до выборки: события, закоммиченные во время отправки, разбудят wait
+        _wakeup.clear()
+        try:
+            with app.app_context():
+                sent = drain_outbox(batch_size)
+        except Exception as e:
+            logger.error(f"[!] Outbox relay error: {e}", exc_info=True)
+            time.sleep(flush_interval)
+            continue
+
+        if sent >= batch_size:
+            continue # В outbox, вероятно, есть еще события - отправляем сразу
+        # Ждем новых событий или истечения интервала (на случай сбоя брокера)
+        _wakeup.wait(flush_interval)
+
+def start_outbox_relay(app):
+    """
+    Запускает relay outbox в отдельном демон-потоке.
+
+    Args:
+        app: Экземпляр Flask приложения AuthService.
+    """
+    relay_thread = threading.Thread(target=_relay_loop, args=(app,), daemon=True)
+    relay_thread.start()
+    logger.info("Outbox relay thread initiated.")
+    return relay_thread
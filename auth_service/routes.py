@@ -3,18 +3,48 @@
 from flask import (
     Blueprint, render_template, request, jsonify, redirect, url_for, current_app
 )
-from werkzeug.security import generate_password_hash, check_password_hash
-from flask_jwt_extended import create_access_token
+from flask_jwt_extended import create_access_token, create_refresh_token, get_jwt, jwt_required
 import logging
-from flasgger import swag_from
+from shared.swagger_config import swag_from
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 
 from . import db
 from .models import User
-from shared.rabbitmq import send_message
+from .outbox import enqueue_event, notify_relay
+from .hashing import HasherBusy
+from shared.storage import read_session
 
 auth_bp = Blueprint('auth', __name__, template_folder='../templates', static_folder='../static')
 logger = logging.getLogger(__name__)
 
+def _issue_tokens(user_id, username: str) -> dict:
+    """Новая пара токенов пользователя и адрес игры с access-токеном."""
+    claims = {'username': username}
+    access_token = create_access_token(identity=str(user_id), additional_claims=claims)
+    refresh_token = create_refresh_token(identity=str(user_id), additional_claims=claims)
+    game_service_base_url = current_app.config.get('GAME_SERVICE_URL', 'http://localhost:5001')
+    return {
+        'access_token': access_token,
+        'refresh_token': refresh_token,
+        'redirect_url': f'{game_service_base_url}/game?token={access_token}',
+    }
+
+_TOKENS_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'access_token': {'type': 'string'},
+        'refresh_token': {'type': 'string'},
+        'redirect_url': {'type': 'string'}
+    }
+}
+
+def _busy_response():
+    """Ответ при переполненном пуле хеширования паролей."""
+    response = jsonify({'message': 'Server is busy, please retry shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 @auth_bp.route('/')
 def index():
     """Перенаправление на страницу входа
@@ -83,7 +113,8 @@ def register():
         },
         400: {'description': 'Не указаны имя пользователя или пароль'},
         409: {'description': 'Пользователь уже существует'},
-        500: {'description': 'Ошибка сервера'}
+        500: {'description': 'Ошибка сервера'},
+        503: {'description': 'Сервер перегружен, повторите запрос позже'}
     }
 })
 def api_register():
@@ -93,32 +124,83 @@ def api_register():
 
     username = data['username']
     password = data['password']
+    usernames = current_app.extensions['username_index']
 
     try:
-        if User.query.filter_by(username=username).first():
+        # Занятое имя отсекаем до дорогого хеширования пароля; свободные имена фильтр
+        # отвечает без запроса к БД, гонку двух регистраций решает уникальный индекс
+        if usernames.exists(username):
             logger.warning(f"Registration attempt for existing user: {username}")
             return jsonify({'message': 'User already exists'}), 409
 
-        hashed_password = generate_password_hash(password)
+        hashed_password = current_app.extensions['password_hasher'].hash(password)
         new_user = User(username=username, password_hash=hashed_password)
         db.session.add(new_user)
-        db.session.commit()
-        logger.info(f"User '{username}' (ID: {new_user.id}) registered successfully.")
+        try:
+            db.session.flush() # Получаем ID пользователя до commit
+        except IntegrityError:
+            db.session.rollback()
+            logger.warning(f"Registration attempt for existing user: {username}")
+            return jsonify({'message': 'User already exists'}), 409
 
+        # Событие пишется в outbox в той же транзакции, что и пользователь;
+        # в RabbitMQ его отправит фоновый relay
         message_data = {
             'user_id': new_user.id,
             'username': new_user.username
         }
-        send_message(queue_name='user_created', message_body=message_data)
+        enqueue_event(queue_name='user_created', message_body=message_data, partition_key=new_user.id)
+        db.session.commit()
+        notify_relay()
+        usernames.add(username)
+        logger.info(f"User '{username}' (ID: {new_user.id}) registered successfully.")
 
         login_url = url_for('auth.login', _external=False)
         return jsonify({'message': 'User registered successfully', 'redirect_url': login_url}), 201
 
+    except HasherBusy as e:
+        db.session.rollback()
+        logger.warning(f"Password hasher busy during registration for user '{username}': {e}")
+        return _busy_response()
     except Exception as e:
         db.session.rollback()
         logger.error(f"Error during registration for user '{username}': {e}", exc_info=True)
         return jsonify({'message': 'Internal Server Error during registration'}), 500
 
+@auth_bp.route('/api/username-available')
+@swag_from({
+    'tags': ['Authentication'],
+    'description': 'Проверка, свободно ли имя пользователя (ответ может отставать на несколько секунд)',
+    'parameters': [
+        {'name': 'username', 'in': 'query', 'type': 'string', 'required': True, 'example': 'new_user'}
+    ],
+    'responses': {
+        200: {
+            'description': 'Результат проверки',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'username': {'type': 'string'},
+                    'available': {'type': 'boolean'}
+                }
+            }
+        },
+        400: {'description': 'Не указано имя пользователя'},
+        500: {'description': 'Ошибка сервера'}
+    }
+})
+def api_username_available():
+    username = request.args.get('username', '')
+    if not username:
+        return jsonify({'message': 'Username is required'}), 400
+
+    try:
+        available = not current_app.extensions['username_index'].exists(username)
+    except Exception as e:
+        logger.error(f"Error checking availability of username '{username}': {e}", exc_info=True)
+        return jsonify({'message': 'Internal Server Error during username check'}), 500
+    return jsonify({'username': username, 'available': available}), 200
+
 @auth_bp.route('/api/login', methods=['POST'])
 @swag_from({
     'tags': ['Authentication'],
@@ -140,18 +222,13 @@ def api_register():
     ],
     'responses': {
         200: {
-            'description': 'Успешный вход',
-            'schema': {
-                'type': 'object',
-                'properties': {
-                    'access_token': {'type': 'string'},
-                    'redirect_url': {'type': 'string'}
-                }
-            }
+            'description': 'Успешный вход: access-токен и одноразовый refresh-токен для /api/refresh',
+            'schema': _TOKENS_SCHEMA
         },
         400: {'description': 'Не указаны имя пользователя или пароль'},
         401: {'description': 'Неверные учетные данные'},
-        500: {'description': 'Ошибка сервера'}
+        500: {'description': 'Ошибка сервера'},
+        503: {'description': 'Сервер перегружен, повторите запрос позже'}
     }
 })
 def api_login():
@@ -163,27 +240,83 @@ def api_login():
     password = data['password']
 
     try:
-        user = User.query.filter_by(username=username).first()
+        # Маршрут только читает - используем отдельный движок для чтения
+        with read_session() as session:
+            user = session.execute(select(User).filter_by(username=username)).scalar_one_or_none()
 
-        if user and check_password_hash(user.password_hash, password):
-            access_token = create_access_token(
-                identity=str(user.id),
-                additional_claims={'username': user.username}
-            )
+        if user and current_app.extensions['password_hasher'].check(user.password_hash, password):
+            tokens = _issue_tokens(user.id, user.username)
             logger.info(f"User '{username}' (ID: {user.id}) logged in. JWT issued.")
-
-            game_service_base_url = current_app.config.get('GAME_SERVICE_URL', 'http://localhost:5001')
-            game_url = f'{game_service_base_url}/game?token={access_token}'
-
-            return jsonify({'access_token': access_token, 'redirect_url': game_url}), 200
+            return jsonify(tokens), 200
         else:
             logger.warning(f"Failed login attempt for user: {username}")
             return jsonify({'message': 'Invalid username or password'}), 401
 
+    except HasherBusy as e:
+        logger.warning(f"Password hasher busy during login for user '{username}': {e}")
+        return _busy_response()
     except Exception as e:
         logger.error(f"Error during login for user '{username}': {e}", exc_info=True)
         return jsonify({'message': 'Internal Server Error during login'}), 500
 
+@auth_bp.route('/api/refresh', methods=['POST'])
+@swag_from({
+    'tags': ['Authentication'],
+    'description': 'Новая пара токенов по refresh-токену без проверки пароля. '
+                   'Refresh-токен одноразовый: предъявленный токен отзывается',
+    'parameters': [
+        {'name': 'Authorization', 'in': 'header', 'type': 'string', 'required': True,
+         'description': 'Bearer <refresh-токен>'}
+    ],
+    'responses': {
+        200: {'description': 'Новые токены', 'schema': _TOKENS_SCHEMA},
+        401: {'description': 'Токен отсутствует, истек, отозван или уже использован'},
+        422: {'description': 'Передан не refresh-токен'},
+        500: {'description': 'Ошибка сервера'}
+    }
+})
+@jwt_required(refresh=True)
+def api_refresh():
+    claims = get_jwt()
+    try:
+        # Вставка jti с уникальным индексом: из двух одновременных обменов одного токена пройдет один
+        if not current_app.extensions['token_denylist'].revoke(claims['jti'], claims['exp']):
+            logger.warning(f"Reuse of refresh token for user ID {claims['sub']}.")
+            return jsonify({'message': 'Refresh token has already been used'}), 401
+        tokens = _issue_tokens(claims['sub'], claims.get('username'))
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error refreshing tokens for user ID {claims.get('sub')}: {e}", exc_info=True)
+        return jsonify({'message': 'Internal Server Error during token refresh'}), 500
+    logger.info(f"Tokens refreshed for user ID {claims['sub']}.")
+    return jsonify(tokens), 200
+
+@auth_bp.route('/api/revoke', methods=['POST'])
+@swag_from({
+    'tags': ['Authentication'],
+    'description': 'Отзыв refresh-токена (выход из системы)',
+    'parameters': [
+        {'name': 'Authorization', 'in': 'header', 'type': 'string', 'required': True,
+         'description': 'Bearer <refresh-токен>'}
+    ],
+    'responses': {
+        200: {'description': 'Токен отозван'},
+        401: {'description': 'Токен отсутствует, истек или уже отозван'},
+        500: {'description': 'Ошибка сервера'}
+    }
+})
+@jwt_required(refresh=True)
+def api_revoke():
+    claims = get_jwt()
+    try:
+        current_app.extensions['token_denylist'].revoke(claims['jti'], claims['exp'])
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error revoking refresh token for user ID {claims.get('sub')}: {e}", exc_info=True)
+        return jsonify({'message': 'Internal Server Error during token revocation'}), 500
+    logger.info(f"Refresh token revoked for user ID {claims['sub']}.")
+    return jsonify({'message': 'Token revoked'}), 200
+
 @auth_bp.route('/logout')
 def logout():
     """Выход из системы
@@ -192,7 +325,7 @@ def logout():
       - Authentication
     responses:
       302:
-        description: Redirect to login page
+        description: Redirect to login page (login.js revokes the stored refresh token)
     """
-    login_url = url_for('auth.login', _external=False)
+    login_url = url_for('auth.login', logout=1, _external=False)
     return redirect(login_url)
\ No newline at end of file
@@ -1,6 +1,41 @@
 document.addEventListener("DOMContentLoaded", () => {
     const loginForm = document.getElementById("login-form");
 
+    // Сохраняем токены и перенаправляем на GameService
+    function enterGame(data) {
+        localStorage.setItem("jwt", data.access_token);
+        localStorage.setItem("refresh_token", data.refresh_token);
+        document.cookie = `access_token=${data.access_token}; path=/`;
+        window.location.href = data.redirect_url;
+    }
+
+    function forgetTokens(refreshToken) {
+        // Другая вкладка могла уже сохранить новый refresh-токен - его не трогаем
+        if (localStorage.getItem("refresh_token") === refreshToken) {
+            localStorage.removeItem("refresh_token");
+            localStorage.removeItem("jwt");
+            document.cookie = "access_token=; path=/; max-age=0";
+        }
+    }
+
+    const refreshToken = localStorage.getItem("refresh_token");
+    if (refreshToken) {
+        const loggingOut = new URLSearchParams(window.location.search).has("logout");
+        // Выход отзывает refresh-токен, иначе сессия продолжается без повторного ввода пароля
+        fetch(loggingOut ? "/api/revoke" : "/api/refresh", {
+            method: "POST",
+            headers: { "Authorization": `Bearer ${refreshToken}` }
+        }).then(async (response) => {
+            if (response.ok && !loggingOut) {
+                enterGame(await response.json());
+            } else {
+                forgetTokens(refreshToken);
+            }
+        }).catch((error) => {
+            console.error("Ошибка обновления сессии:", error);
+        });
+    }
+
     loginForm.addEventListener("submit", async (e) => {
         e.preventDefault();
 
@@ -19,12 +54,7 @@ document.addEventListener("DOMContentLoaded", () => {
             const data = await response.json();
 
             if (response.ok) {
-                // Сохраняем токен
-                localStorage.setItem("jwt", data.access_token);
-                document.cookie = `access_token=${data.access_token}; path=/`;
-
-                // Перенаправляем на GameService
-                window.location.href = data.redirect_url;
+                enterGame(data);
             } else {
                 document.getElementById("error-message").textContent = data.message || "Ошибка входа";
             }
@@ -1,6 +1,34 @@
 document.addEventListener("DOMContentLoaded", () => {
     const registerForm = document.getElementById("register-form");
     const errorMessage = document.getElementById("error-message");
+    const usernameInput = document.getElementById("username");
+    const usernameStatus = document.getElementById("username-status");
+    let checkTimer = null;
+    let checkedName = "";
+
+    // Проверяем имя после паузы в вводе, чтобы не отправлять запрос на каждую букву
+    usernameInput.addEventListener("input", () => {
+        clearTimeout(checkTimer);
+        const username = usernameInput.value.trim();
+        if (!username) {
+            usernameStatus.textContent = "";
+            return;
+        }
+        checkTimer = setTimeout(async () => {
+            checkedName = username;
+            try {
+                const response = await fetch(`/api/username-available?username=${encodeURIComponent(username)}`);
+                if (!response.ok || checkedName !== usernameInput.value.trim()) {
+                    return; // Ошибка проверки или имя уже изменилось - ответ устарел
+                }
+                const data = await response.json();
+                usernameStatus.textContent = data.available ? "Имя свободно" : "Имя уже занято";
+                usernameStatus.style.color = data.available ? "green" : "red";
+            } catch (error) {
+                console.error("Ошибка при проверке имени:", error);
+            }
+        }, 300);
+    });
 
     registerForm.addEventListener("submit", async (event) => {
         event.preventDefault();
@@ -0,0 +1,121 @@
+# auth_service/tokens.py
+
+"""
+Отзыв refresh-токенов.
+
+Refresh-токен одноразовый: /api/refresh записывает его jti в таблицу
+revoked_token и выдает новую пару токенов, /api/revoke просто отзывает его.
+Уникальный индекс по jti делает использование атомарным и между процессами:
+повторно предъявленный токен не пройдет вставку, даже если процесс еще
+не знает о его отзыве.
+
+Чтобы не обращаться к БД при каждой проверке, процесс держит в памяти
+jti отозванных и еще не истекших токенов. Записи других процессов
+подгружаются не чаще раза в TOKEN_DENYLIST_REFRESH_INTERVAL секунд
+по первичному ключу, истекшие токены удаляются из памяти и из таблицы.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import current_app
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+from .models import RevokedToken
+from shared.storage import read_session
+
+logger = logging.getLogger(__name__)
+
+# Как часто удалять истекшие записи (сек.)
+PRUNE_INTERVAL = 3600.0
+
+
+def _utc(timestamp: float) -> datetime:
+    # Колонка DateTime без часового пояса, как created_at в outbox_event (UTC)
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+
+
+class TokenDenylist:
+    """
+    Отозванные refresh-токены: jti -> exp (unix time). Методы вызываются
+    внутри app_context. Потокобезопасен.
+
+    Args:
+        refresh_interval: Как часто подгружать отзывы других процессов (сек.).
+    """
+
+    def __init__(self, refresh_interval: float = 1.0):
+        self.refresh_interval = refresh_interval
+        self._revoked = None
+        self._last_id = 0
+        self._refreshed_at = 0.0
+        self._pruned_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        """Подгружает отзывы после последней загрузки. Вызывать под блокировкой."""
+        now = time.monotonic()
+        if self._revoked is not None and now - self._refreshed_at < self.refresh_interval:
+            return
+        if self._revoked is None:
+            self._revoked = {}
+            # Истекшие токены отклоняются по exp, их отзыв хранить не нужно
+            query = select(RevokedToken.id, RevokedToken.jti, RevokedToken.expires_at).where(
+                RevokedToken.expires_at > _utc(time.time())
+            )
+        else:
+            query = select(RevokedToken.id, RevokedToken.jti, RevokedToken.expires_at).where(
+                RevokedToken.id > self._last_id
+            )
+        with read_session() as session:
+            rows = session.execute(query.order_by(RevokedToken.id)).all()
+        for row_id, jti, expires_at in rows:
+            self._revoked[jti] = expires_at.replace(tzinfo=timezone.utc).timestamp()
+            self._last_id = max(self._last_id, row_id)
+        self._refreshed_at = now
+
+        if now - self._pruned_at >= PRUNE_INTERVAL:
+            self._prune()
+            self._pruned_at = now
+
+    def _prune(self):
+        wall = time.time()
+        self._revoked = {jti: exp for jti, exp in self._revoked.items() if exp > wall}
+        result = db.session.execute(delete(RevokedToken).where(RevokedToken.expires_at <= _utc(wall)))
+        db.session.commit()
+        if result.rowcount:
+            logger.info(f"Pruned {result.rowcount} expired revoked token(s).")
+
+    def is_revoked(self, jti: str) -> bool:
+        with self._lock:
+            self._refresh()
+            return jti in self._revoked
+
+    def revoke(self, jti: str, exp: float) -> bool:
+        """
+        Отзывает токен (commit выполняется здесь).
+
+        Returns:
+            False, если токен уже был отозван или использован (в том числе другим процессом).
+        """
+        db.session.add(RevokedToken(jti=jti, expires_at=_utc(exp)))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return False
+        with self._lock:
+            if self._revoked is not None:
+                self._revoked[jti] = exp
+        return True
+
+
+def check_if_token_revoked(jwt_header: dict, jwt_payload: dict) -> bool:
+    """token_in_blocklist_loader: проверяются только refresh-токены, access-токены живут недолго."""
+    if jwt_payload.get('type') != 'refresh':
+        return False
+    return current_app.extensions['token_denylist'].is_revoked(jwt_payload['jti'])
@@ -0,0 +1,151 @@
+# auth_service/usernames.py
+
+"""
+Индекс занятых имен пользователей в памяти процесса на фильтре Блума.
+
+Фильтр строится по таблице user при первом обращении и пополняется
+при регистрации. Ответ "имени точно нет" дается без запроса к SQLite;
+"имя, возможно, есть" (в том числе ложноположительный ответ с вероятностью
+около USERNAME_FILTER_ERROR_RATE) проверяется точным запросом.
+
+Пользователей, зарегистрированных другими процессами сервиса, индекс
+подгружает не чаще раза в USERNAME_FILTER_REFRESH_INTERVAL секунд запросом
+по первичному ключу (id больше последнего известного). Поэтому ответ
+/api/username-available может отставать на этот интервал - окончательно
+занятость имени проверяет уникальный индекс при вставке пользователя.
+"""
+
+import hashlib
+import logging
+import math
+import threading
+import time
+
+from sqlalchemy import select
+
+from .models import User
+from shared.storage import read_session
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """
+    Фильтр Блума: множество строк без ложноотрицательных ответов.
+
+    Args:
+        capacity: Ожидаемое число элементов.
+        error_rate: Допустимая доля ложноположительных ответов при capacity элементах.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.capacity = max(1, capacity)
+        self.size = max(8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        # Двойное хэширование: k позиций из двух 64-битных хэшей одного дайджеста
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class UsernameIndex:
+    """
+    Занятые имена пользователей: фильтр Блума и id последнего загруженного пользователя.
+    Методы вызываются внутри app_context. Потокобезопасен.
+
+    Args:
+        capacity: Начальная емкость фильтра; при переполнении фильтр перестраивается с запасом.
+        error_rate: Доля ложноположительных ответов фильтра.
+        refresh_interval: Как часто подгружать пользователей других процессов (сек.).
+    """
+
+    def __init__(self, capacity: int = 100000, error_rate: float = 0.01, refresh_interval: float = 1.0):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.refresh_interval = refresh_interval
+        self.filter_misses = 0  # Ответы "имени нет" без запроса к БД
+        self.exact_checks = 0
+        self._filter = None
+        self._count = 0
+        self._last_id = 0
+        self._refreshed_at = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config) -> 'UsernameIndex':
+        return cls(
+            capacity=config.get('USERNAME_FILTER_CAPACITY', 100000),
+            error_rate=config.get('USERNAME_FILTER_ERROR_RATE', 0.01),
+            refresh_interval=config.get('USERNAME_FILTER_REFRESH_INTERVAL', 1.0),
+        )
+
+    def _load(self, after_id: int):
+        with read_session() as session:
+            return session.execute(
+                select(User.id, User.username).where(User.id > after_id).order_by(User.id)
+            ).all()
+
+    def _rebuild(self):
+        rows = self._load(0)
+        bloom = BloomFilter(max(self.capacity, 2 * len(rows)), self.error_rate)
+        for _, username in rows:
+            bloom.add(username)
+        self._filter = bloom
+        self._count = len(rows)
+        self._last_id = rows[-1][0] if rows else 0
+        logger.info(f"Username filter built for {len(rows)} user(s) "
+                    f"({bloom.size // 8} bytes, {bloom.hashes} hashes).")
+
+    def _refresh(self):
+        """Загружает имена, зарегистрированные после последней загрузки. Вызывать под блокировкой."""
+        now = time.monotonic()
+        if self._filter is not None and now - self._refreshed_at < self.refresh_interval:
+            return
+        if self._filter is None or self._count > self._filter.capacity:
+            self._rebuild()
+        else:
+            rows = self._load(self._last_id)
+            for user_id, username in rows:
+                self._filter.add(username)
+                self._last_id = user_id
+            self._count += len(rows)
+        self._refreshed_at = now
+
+    def add(self, username: str):
+        """Добавляет только что зарегистрированного пользователя этого процесса."""
+        with self._lock:
+            if self._filter is None:
+                return  # Фильтр еще не построен - имя загрузится при построении
+            # _last_id не двигаем: пользователи других процессов с меньшим id еще не загружены.
+            # Имя загрузится повторно при обновлении и тогда же будет учтено в _count
+            self._filter.add(username)
+
+    def might_exist(self, username: str) -> bool:
+        """False - имени точно нет (без запроса к БД), True - имя, возможно, занято."""
+        with self._lock:
+            self._refresh()
+            if username in self._filter:
+                return True
+            self.filter_misses += 1
+            return False
+
+    def exists(self, username: str) -> bool:
+        """Точная проверка: фильтр, а при положительном ответе - запрос к БД."""
+        if not self.might_exist(username):
+            return False
+        self.exact_checks += 1
+        with read_session() as session:
+            return session.execute(
+                select(User.id).filter_by(username=username).limit(1)
+            ).first() is not None
@@ -0,0 +1,103 @@
+# benchmarks/bench_concurrent_upgrades.py
+
+"""
+Проверка и бенчмарк конкурентных улучшений зданий одного игрока.
+
+Несколько потоков одновременно улучшают здание одного и того же игрока
+в GameService без кэша состояния (PLAYER_STATE_CACHE_SIZE = 0, как при
+нескольких процессах-писателях). Сравниваются два способа:
+    - rmw: чтение строк в Python, изменение и запись (старый подход);
+    - sql: атомарные UPDATE ... RETURNING (PlayerRepository.upgrade_building).
+Для каждого выводится число действий в секунду и число потерянных улучшений.
+Скрипт завершается с кодом 1, если способ sql потерял хотя бы одно улучшение
+(или действие завершилось ошибкой): потери допустимы только у rmw.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_concurrent_upgrades --threads 8 --actions 200
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from shared.config import GameConfig
+from game_service import create_app
+from game_service.economy import upgrade_building
+from game_service.repository import get_player_repository, load_snapshot
+from game_service import db
+
+USER_ID = 1
+
+
+def run(app, mode: str, threads: int, actions: int) -> dict:
+    with app.app_context():
+        players = get_player_repository()
+        players.provision([USER_ID])
+        start_level = load_snapshot(db.session, USER_ID).mine_level
+
+    errors = []
+
+    def worker():
+        with app.app_context():
+            players = get_player_repository()
+            for _ in range(actions):
+                try:
+                    if mode == 'sql':
+                        players.upgrade_building(USER_ID, 'mine')
+                    else:
+                        players.update(USER_ID, lambda player: upgrade_building(player, 'mine'))
+                except Exception as e:
+                    db.session.rollback()
+                    errors.append(repr(e))
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        final_level = load_snapshot(db.session, USER_ID).mine_level
+    expected = threads * actions
+    return {
+        'actions_per_sec': expected / elapsed,
+        'lost_upgrades': expected - (final_level - start_level),
+        'errors': len(errors),
+        'first_error': errors[0] if errors else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--actions', type=int, default=200)
+    parser.add_argument('--json', action='store_true', help='Вывести результаты в JSON')
+    args = parser.parse_args()
+
+    class BenchConfig(GameConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'game.db')}"
+        PLAYER_STATE_CACHE_SIZE = 0
+
+    app = create_app(BenchConfig)
+    results = {mode: run(app, mode, args.threads, args.actions) for mode in ('rmw', 'sql')}
+    if args.json:
+        print(json.dumps(results))
+    else:
+        for mode, r in results.items():
+            print(f"{mode:>4}: {r['actions_per_sec']:8.0f} actions/s {r['lost_upgrades']:6d} lost upgrades "
+                  f"{r['errors']:6d} errors")
+    sql = results['sql']
+    if sql['lost_upgrades'] or sql['errors']:
+        print(f"FAIL: sql path lost {sql['lost_upgrades']} upgrade(s), {sql['errors']} error(s)"
+              + (f", first: {sql['first_error']}" if sql['first_error'] else ''), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
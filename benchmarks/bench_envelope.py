@@ -0,0 +1,125 @@
+# benchmarks/bench_envelope.py
+
+"""
+Бенчмарк конвертов событий (shared/envelope.py) на транспортах сообщений.
+
+События user_created публикуются пачками в каждом формате EVENT_ENCODING:
+    - none: одно событие JSON на сообщение (исходный формат);
+    - json: конверт до --envelope-size событий в одном сообщении;
+    - compact: тот же конверт по столбцам, сжатый zlib.
+Затем очередь читается с prefetch, сообщения распаковываются по content_type
+и подтверждаются одним ack(multiple=True) на пачку, как у пакетного консьюмера.
+Для каждого формата выводятся события в секунду при публикации и потреблении
+и байт на событие. Транспорт rabbitmq пропускается, если брокер недоступен.
+Скрипт завершается с кодом 1, если после распаковки события не совпали
+с отправленными.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_envelope --events 50000 --envelope-size 100
+    python -m benchmarks.bench_envelope --transport rabbitmq
+"""
+
+import argparse
+import json
+import sys
+import time
+import uuid
+
+import pika
+
+from shared.envelope import ENCODINGS, content_type_for, pack, unpack
+from shared.rabbitmq import get_transport
+
+
+def bench(transport, encoding: str, events: list, batch_size: int, envelope_size: int) -> dict:
+    queue_name = f"bench_envelope_{uuid.uuid4().hex[:8]}"
+    content_type = content_type_for(encoding)
+
+    connection = transport.connect()
+    try:
+        channel = connection.channel()
+        channel.queue_declare(queue=queue_name, durable=True)
+        payload_bytes = messages = 0
+        started = time.perf_counter()
+        for start in range(0, len(events), batch_size):
+            bodies = pack(events[start:start + batch_size], encoding, envelope_size)
+            transport.publish(queue_name, bodies, content_type=content_type)
+            messages += len(bodies)
+            payload_bytes += sum(len(body.encode() if isinstance(body, str) else body) for body in bodies)
+        publish_seconds = time.perf_counter() - started
+
+        # prefetch в сообщениях: пачка консьюмера - около batch_size событий
+        prefetch = max(1, batch_size // (1 if encoding == 'none' else envelope_size))
+        channel.basic_qos(prefetch_count=prefetch)
+        received = []
+        pending = 0
+        started = time.perf_counter()
+        for method, properties, body in channel.consume(queue_name, auto_ack=False, inactivity_timeout=1.0):
+            if method is None:
+                break
+            received.extend(unpack(body, properties.content_type))
+            pending += 1
+            if pending >= prefetch or len(received) >= len(events):
+                channel.basic_ack(delivery_tag=method.delivery_tag, multiple=True)
+                pending = 0
+            if len(received) >= len(events):
+                break
+        consume_seconds = time.perf_counter() - started
+        channel.cancel()
+        channel.queue_delete(queue=queue_name)
+    finally:
+        connection.close()
+    return {
+        'events': len(received),
+        'messages': messages,
+        'intact': received == events,
+        'bytes_per_event': payload_bytes / len(events),
+        'publish_events_per_sec': len(events) / publish_seconds,
+        'consume_events_per_sec': len(received) / consume_seconds if consume_seconds else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=50000)
+    parser.add_argument('--batch-size', type=int, default=1000, help='Событий в одной публикации (пачка outbox)')
+    parser.add_argument('--envelope-size', type=int, default=100, help='Событий в одном конверте')
+    parser.add_argument('--transport', choices=('memory', 'rabbitmq'), action='append',
+                        help='Транспорт (можно указать несколько раз; по умолчанию - memory)')
+    parser.add_argument('--rabbitmq-host', default='localhost')
+    parser.add_argument('--json', action='store_true', help='Вывести результаты в JSON')
+    args = parser.parse_args()
+
+    events = [{'user_id': user_id, 'username': f"player_{user_id}"} for user_id in range(1, args.events + 1)]
+    results = {}
+    for name in args.transport or ('memory',):
+        transport = get_transport({'MESSAGE_TRANSPORT': name, 'RABBITMQ_HOST': args.rabbitmq_host})
+        try:
+            results[name] = {
+                encoding: bench(transport, encoding, events, args.batch_size, args.envelope_size)
+                for encoding in ENCODINGS
+            }
+        except pika.exceptions.AMQPConnectionError as e:
+            results[name] = {'skipped': f"{transport} is unavailable ({e!r})"}
+
+    if args.json:
+        print(json.dumps(results))
+    else:
+        for name, by_encoding in results.items():
+            if 'skipped' in by_encoding:
+                print(f"{name:>8}: skipped, {by_encoding['skipped']}")
+                continue
+            for encoding, r in by_encoding.items():
+                print(f"{name:>8} {encoding:>8}: {r['messages']:7d} messages, {r['bytes_per_event']:6.1f} bytes/event, "
+                      f"publish {r['publish_events_per_sec']:10.0f} events/s, "
+                      f"consume {r['consume_events_per_sec']:10.0f} events/s")
+
+    broken = [f"{name}/{encoding}" for name, by_encoding in results.items() if 'skipped' not in by_encoding
+              for encoding, r in by_encoding.items() if not r['intact']]
+    if broken:
+        print(f"FAIL: events changed after unpacking: {', '.join(broken)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
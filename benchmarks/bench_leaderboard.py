@@ -0,0 +1,118 @@
+# benchmarks/bench_leaderboard.py
+
+"""
+Бенчмарк рейтингов (game_service/leaderboard.py) против запросов к SQLite.
+
+На синтетической БД GameService (см. bench_world_tick.make_database) измеряются:
+    - build: пересборка рейтингов из БД и загрузка из снимка;
+    - observe: обновление очков игрока (как после сбора или улучшения);
+    - top/rank/around: запросы к индексу в памяти;
+    - sql_top/sql_rank: те же запросы через ORDER BY ... LIMIT и COUNT(*)
+      по вычисляемым очкам (как без индекса).
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_leaderboard --players 200000 --queries 2000
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+from flask import Flask
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from benchmarks.bench_world_tick import make_database
+from game_service.leaderboard import Leaderboards, _score_query
+from shared.storage import READ_ENGINE_KEY
+
+
+def timed(action, runs: int) -> dict:
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        action()
+        samples.append((time.perf_counter() - started) * 1e6)
+    samples.sort()
+    return {
+        'runs': runs,
+        'mean_us': statistics.fmean(samples),
+        'p50_us': samples[len(samples) // 2],
+        'p99_us': samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+    }
+
+
+def random_snapshot(rng, user_id: int):
+    return SimpleNamespace(
+        user_id=user_id, wood=rng.randrange(10 ** 5), stone=rng.randrange(10 ** 5), gold=rng.randrange(10 ** 5),
+        wood_rate=0, stone_rate=0, gold_rate=0, last_collected=None,
+        buildings={'sawmill_level': rng.randint(1, 20), 'quarry_level': rng.randint(1, 20),
+                   'mine_level': rng.randint(1, 20)},
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--players', type=int, default=200000)
+    parser.add_argument('--queries', type=int, default=2000, help='Запросов к индексу в памяти на операцию')
+    parser.add_argument('--sql-queries', type=int, default=20, help='Запросов к SQLite на операцию')
+    parser.add_argument('--profile', default='wal', help='Профиль хранения SQLite (shared/storage.py)')
+    parser.add_argument('--json', action='store_true', help='Вывести результаты в JSON')
+    args = parser.parse_args()
+
+    engine = make_database(args.players, args.profile)
+    app = Flask(__name__)
+    app.extensions[READ_ENGINE_KEY] = engine
+    snapshot_path = os.path.join(os.path.dirname(engine.url.database), 'leaderboard.snapshot')
+    rng = random.Random(7)
+    results = {}
+
+    leaderboards = Leaderboards(app, snapshot_path=snapshot_path)
+    started = time.perf_counter()
+    leaderboards.rebuild()
+    results['build_from_db_s'] = time.perf_counter() - started
+    started = time.perf_counter()
+    leaderboards.save_snapshot()
+    results['save_snapshot_s'] = time.perf_counter() - started
+    started = time.perf_counter()
+    Leaderboards(app, snapshot_path=snapshot_path).size()
+    results['load_snapshot_s'] = time.perf_counter() - started
+
+    def random_user():
+        return rng.randint(1, args.players)
+
+    results['observe'] = timed(lambda: leaderboards.observe(random_user(), random_snapshot(rng, 0)), args.queries)
+    results['top'] = timed(lambda: leaderboards.top('gold', 10), args.queries)
+    results['rank'] = timed(lambda: leaderboards.rank('gold', random_user()), args.queries)
+    results['around'] = timed(lambda: leaderboards.around('gold', random_user(), 5), args.queries)
+
+    scores = _score_query(datetime.utcnow()).subquery()
+    gold = scores.c[1]
+    with Session(engine) as session:
+        top_query = select(scores.c.user_id, gold).order_by(gold.desc(), scores.c.user_id).limit(10)
+        results['sql_top'] = timed(lambda: session.execute(top_query).all(), args.sql_queries)
+
+        def sql_rank():
+            user_gold = session.execute(select(gold).where(scores.c.user_id == random_user())).scalar()
+            return session.execute(select(func.count()).select_from(scores).where(gold > user_gold)).scalar()
+
+        results['sql_rank'] = timed(sql_rank, args.sql_queries)
+    engine.dispose()
+
+    if args.json:
+        print(json.dumps({'players': args.players, 'results': results}))
+        return
+    print(f"{args.players} players: build from DB {results['build_from_db_s']:.2f}s, "
+          f"save snapshot {results['save_snapshot_s']:.2f}s, load snapshot {results['load_snapshot_s']:.2f}s")
+    for name in ('observe', 'top', 'rank', 'around', 'sql_top', 'sql_rank'):
+        r = results[name]
+        print(f"{name:>8}: mean {r['mean_us']:10.1f}us  p50 {r['p50_us']:10.1f}us  p99 {r['p99_us']:10.1f}us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+# benchmarks/bench_password_hashing.py
+
+"""
+Бенчмарк пула хеширования паролей: логины в секунду в зависимости от числа процессов.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_password_hashing --logins 200 --max-workers 8
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import generate_password_hash
+
+from auth_service.hashing import PasswordHasher
+
+
+def run(workers: int, logins: int, method: str) -> float:
+    """Возвращает логины/сек. при параллельных проверках пароля (workers=0 - в потоках запроса)."""
+    password_hash = generate_password_hash('secure_password123', method=method)
+    hasher = PasswordHasher(method=method, workers=workers, max_pending=logins)
+    concurrency = max(workers, 1) * 2 # Как несколько потоков Werkzeug на каждый процесс пула
+    try:
+        hasher.check(password_hash, 'warm-up') # Запуск процессов не входит в замер
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(lambda _: hasher.check(password_hash, 'secure_password123'), range(logins)))
+        elapsed = time.perf_counter() - started
+    finally:
+        hasher.shutdown()
+    assert all(results)
+    return logins / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--method', default='scrypt')
+    parser.add_argument('--json', action='store_true', help='Вывести результаты в JSON')
+    args = parser.parse_args()
+
+    results = {}
+    for workers in range(0, args.max_workers + 1):
+        results[workers] = run(workers, args.logins, args.method)
+        if not args.json:
+            label = 'inline' if workers == 0 else f'{workers} proc'
+            print(f"{label:>8}: {results[workers]:8.1f} logins/sec")
+    if args.json:
+        print(json.dumps({'method': args.method, 'logins_per_sec': results}))
+
+
+if __name__ == '__main__':
+    main()
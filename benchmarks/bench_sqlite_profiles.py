@@ -0,0 +1,109 @@
+# benchmarks/bench_sqlite_profiles.py
+
+"""
+Бенчмарк профилей хранения SQLite при конкурентных чтении и записи.
+
+Для каждого профиля создается временная БД с таблицей resources;
+несколько потоков читают случайные строки через движок для чтения,
+а один поток обновляет их через движок записи (как консьюмер RabbitMQ
+и роуты GameService). Выводится число операций в секунду и ошибок.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_sqlite_profiles --players 10000 --readers 8 --seconds 5
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, text
+
+from shared.storage import STORAGE_PROFILES, apply_storage_profile
+
+
+def run(profile: str, players: int, readers: int, seconds: float) -> dict:
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    uri = f"sqlite:///{path}"
+    write_engine = create_engine(uri)
+    apply_storage_profile(write_engine, profile)
+    read_engine = create_engine(uri, pool_size=readers, max_overflow=0)
+    apply_storage_profile(read_engine, profile, read_only=True)
+
+    with write_engine.begin() as conn:
+        conn.execute(text("CREATE TABLE resources (user_id INTEGER PRIMARY KEY, wood INTEGER, stone INTEGER, gold INTEGER)"))
+        conn.execute(text("INSERT INTO resources VALUES (:id, 0, 0, 0)"), [{'id': i} for i in range(players)])
+
+    counters = {'reads': 0, 'writes': 0, 'errors': 0}
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def reader():
+        reads = errors = 0
+        with read_engine.connect() as conn:
+            while not stop.is_set():
+                try:
+                    conn.execute(text("SELECT wood, stone, gold FROM resources WHERE user_id = :id"),
+                                 {'id': random.randrange(players)}).fetchone()
+                    reads += 1
+                except Exception:
+                    errors += 1
+        with lock:
+            counters['reads'] += reads
+            counters['errors'] += errors
+
+    def writer():
+        writes = errors = 0
+        while not stop.is_set():
+            try:
+                with write_engine.begin() as conn:
+                    conn.execute(text("UPDATE resources SET wood = wood + 1 WHERE user_id = :id"),
+                                 {'id': random.randrange(players)})
+                writes += 1
+            except Exception:
+                errors += 1
+        with lock:
+            counters['writes'] += writes
+            counters['errors'] += errors
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)] + [threading.Thread(target=writer)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    write_engine.dispose()
+    read_engine.dispose()
+
+    return {
+        'reads_per_sec': counters['reads'] / seconds,
+        'writes_per_sec': counters['writes'] / seconds,
+        'errors': counters['errors'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--players', type=int, default=10000)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--profiles', nargs='+', default=list(STORAGE_PROFILES))
+    parser.add_argument('--json', action='store_true', help='Вывести результаты в JSON')
+    args = parser.parse_args()
+
+    results = {}
+    for profile in args.profiles:
+        results[profile] = run(profile, args.players, args.readers, args.seconds)
+        if not args.json:
+            r = results[profile]
+            print(f"{profile:>8}: {r['reads_per_sec']:10.0f} reads/s {r['writes_per_sec']:8.0f} writes/s {r['errors']:5d} errors")
+    if args.json:
+        print(json.dumps(results))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+# benchmarks/bench_startup.py
+
+"""
+Бенчмарк времени запуска сервиса с проверкой бюджета.
+
+Каждый сценарий выполняется в чистом интерпретаторе (subprocess) несколько раз,
+измеряются импорт пакета сервиса и create_app():
+    - full: настройки по умолчанию (Swagger, db.create_all() в create_app);
+    - lean: SWAGGER_ENABLED=0, AUTO_CREATE_SCHEMA=0;
+    - prefork: как воркер run_production.py - процесс с предзагруженными
+      библиотеками (PRELOAD_MODULES) форкается, и дочерний процесс
+      импортирует сервис и создает приложение.
+
+Бюджет (--budget-ms) проверяется по медиане сценария --budget-scenario;
+при превышении скрипт завершается с кодом 1 (можно использовать в CI).
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_startup --service game --runs 5 --budget-ms 150
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+SCENARIOS = {
+    'full': {},
+    'lean': {'SWAGGER_ENABLED': '0', 'AUTO_CREATE_SCHEMA': '0'},
+    'prefork': {'SWAGGER_ENABLED': '0', 'AUTO_CREATE_SCHEMA': '0'},
+}
+
+MEASURE = '''
+import json, time
+started = time.perf_counter()
+from {package} import create_app
+imported = time.perf_counter()
+create_app()
+finished = time.perf_counter()
+print(json.dumps({{'import_ms': (imported - started) * 1000, 'create_ms': (finished - imported) * 1000}}))
+'''
+
+PREFORK = '''
+import importlib, os, sys
+from run_production import PRELOAD_MODULES, SERVICES
+for module_name in PRELOAD_MODULES + SERVICES[{service!r}]['preload']:
+    importlib.import_module(module_name)
+pid = os.fork()
+if pid == 0:
+    exec({measure!r})
+    sys.stdout.flush()
+    os._exit(0)
+os.waitpid(pid, 0)
+'''
+
+
+def run_once(service: str, scenario: str) -> dict:
+    package = f'{service}_service'
+    measure = MEASURE.format(package=package)
+    code = PREFORK.format(service=service, measure=measure) if scenario == 'prefork' else measure
+    # БД и кэши шаблонов - во временном каталоге, а не в instance/ сервиса
+    instance_path = tempfile.mkdtemp()
+    env = dict(os.environ, **SCENARIOS[scenario], AUTH_INSTANCE_PATH=instance_path, GAME_INSTANCE_PATH=instance_path)
+    output = subprocess.run(
+        [sys.executable, '-c', code], cwd=ROOT, env=env,
+        capture_output=True, text=True, check=True
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result['total_ms'] = result['import_ms'] + result['create_ms']
+    return result
+
+
+def run(service: str, scenario: str, runs: int) -> dict:
+    samples = [run_once(service, scenario) for _ in range(runs)]
+    return {key: statistics.median(sample[key] for sample in samples) for key in samples[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--service', choices=('auth', 'game'), default='game')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--scenarios', nargs='+', default=list(SCENARIOS))
+    parser.add_argument('--budget-ms', type=float, default=150.0,
+                        help='Максимальная медиана import + create_app (мс)')
+    parser.add_argument('--budget-scenario', default='prefork')
+    parser.add_argument('--json', action='store_true', help='Вывести результаты в JSON')
+    args = parser.parse_args()
+
+    results = {}
+    for scenario in args.scenarios:
+        results[scenario] = run(args.service, scenario, args.runs)
+        if not args.json:
+            r = results[scenario]
+            print(f"{scenario:>8}: import {r['import_ms']:7.1f} ms  create_app {r['create_ms']:7.1f} ms  "
+                  f"total {r['total_ms']:7.1f} ms")
+
+    within_budget = True
+    if args.budget_scenario in results:
+        total = results[args.budget_scenario]['total_ms']
+        within_budget = total <= args.budget_ms
+        if not args.json:
+            status = 'OK' if within_budget else 'OVER BUDGET'
+            print(f"budget ({args.budget_scenario}): {total:.1f} / {args.budget_ms:.1f} ms - {status}")
+    if args.json:
+        print(json.dumps({'results': results, 'budget_ms': args.budget_ms, 'within_budget': within_budget}))
+    sys.exit(0 if within_budget else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+# benchmarks/bench_templates.py
+
+"""
+Бенчмарк профилей рендеринга шаблонов (shared/templating.py).
+
+Для каждого профиля создается приложение GameService с временной БД и
+каталогом байткода и измеряется:
+    - загрузка всех шаблонов "с нуля" (как в новом процессе): в development
+      это разбор и компиляция исходников, в production - чтение байткода;
+    - среднее время рендеринга game.html и error.html. Уровни зданий и
+      сообщения об ошибках берутся из небольшого набора значений, как у
+      реальных игроков, поэтому кэш фрагментов работает с попаданиями.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_templates --renders 5000
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from flask import render_template
+
+from game_service import create_app
+from shared.config import GameConfig
+
+PROFILES = ('development', 'production')
+ERROR_MESSAGES = ('Token is required', 'Invalid or expired token', 'User data not found', 'Invalid token')
+
+
+def make_app(profile: str):
+    workdir = tempfile.mkdtemp()
+
+    class BenchConfig(GameConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(workdir, 'game.db')}"
+        TEMPLATE_PROFILE = profile
+        TEMPLATES_AUTO_RELOAD = profile != 'production'
+        TEMPLATE_CACHE_DIR = os.path.join(workdir, 'jinja_cache')
+
+    return create_app(BenchConfig)
+
+
+def time_template_loading(app, rounds: int) -> float:
+    """Среднее время загрузки всех шаблонов с пустым кэшем окружения (мс)."""
+    env = app.jinja_env
+    names = env.list_templates(extensions=('html',))
+    started = time.perf_counter()
+    for _ in range(rounds):
+        env.cache.clear()
+        for name in names:
+            env.get_template(name)
+    return (time.perf_counter() - started) / rounds * 1000
+
+
+def time_renders(app, renders: int, levels: int) -> dict:
+    rng = random.Random(42)
+    game_contexts = []
+    for _ in range(renders):
+        buildings = {
+            'sawmill_level': rng.randint(1, levels),
+            'quarry_level': rng.randint(1, levels),
+            'mine_level': rng.randint(1, levels),
+        }
+        game_contexts.append({
+            'username': 'bench',
+            'resources': {'wood': rng.randrange(10 ** 6), 'stone': rng.randrange(10 ** 6), 'gold': rng.randrange(10 ** 6)},
+            'rates': {'wood': 10, 'stone': 5, 'gold': 2},
+            'buildings': buildings,
+            'token': 'token',
+        })
+
+    results = {}
+    with app.test_request_context('/game'):
+        started = time.perf_counter()
+        for context in game_contexts:
+            render_template('game.html', **context)
+        results['game_render_us'] = (time.perf_counter() - started) / renders * 10 ** 6
+
+        started = time.perf_counter()
+        for i in range(renders):
+            render_template('error.html', message=ERROR_MESSAGES[i % len(ERROR_MESSAGES)], token=None)
+        results['error_render_us'] = (time.perf_counter() - started) / renders * 10 ** 6
+
+    fragment_cache = getattr(app.jinja_env, 'fragment_cache', None)
+    results['fragment_cache'] = fragment_cache.stats() if fragment_cache else None
+    return results
+
+
+def run(profile: str, renders: int, levels: int, load_rounds: int) -> dict:
+    app = make_app(profile)
+    result = {'template_load_ms': time_template_loading(app, load_rounds)}
+    result.update(time_renders(app, renders, levels))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--renders', type=int, default=5000)
+    parser.add_argument('--levels', type=int, default=5, help='Максимальный уровень зданий в выборке')
+    parser.add_argument('--load-rounds', type=int, default=20)
+    parser.add_argument('--profiles', nargs='+', default=list(PROFILES))
+    parser.add_argument('--json', action='store_true', help='Вывести результаты в JSON')
+    args = parser.parse_args()
+
+    results = {}
+    for profile in args.profiles:
+        results[profile] = run(profile, args.renders, args.levels, args.load_rounds)
+        if not args.json:
+            r = results[profile]
+            print(f"{profile:>12}: load {r['template_load_ms']:7.2f} ms  "
+                  f"game.html {r['game_render_us']:7.1f} us  error.html {r['error_render_us']:7.1f} us")
+    if args.json:
+        print(json.dumps(results))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+# benchmarks/bench_transport.py
+
+"""
+Бенчмарк транспортов сообщений (shared/rabbitmq.py): публикация пачками
+и потребление с prefetch и одним ack(multiple=True) на пачку, как у
+пакетного консьюмера user_created.
+
+Для каждого транспорта измеряются сообщения в секунду при публикации
+и при потреблении. Транспорт rabbitmq пропускается, если брокер недоступен.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_transport --messages 20000 --batch-size 100
+    python -m benchmarks.bench_transport --transport memory
+"""
+
+import argparse
+import json
+import time
+import uuid
+
+import pika
+
+from shared.rabbitmq import get_transport
+
+
+def bench(transport, messages: int, batch_size: int) -> dict:
+    queue_name = f"bench_transport_{uuid.uuid4().hex[:8]}"
+    body = json.dumps({'user_id': 1, 'username': 'bench_user'})
+
+    connection = transport.connect()
+    try:
+        channel = connection.channel()
+        channel.queue_declare(queue=queue_name, durable=True)
+        started = time.perf_counter()
+        for start in range(0, messages, batch_size):
+            transport.publish(queue_name, [body] * min(batch_size, messages - start))
+        publish_seconds = time.perf_counter() - started
+
+        channel.basic_qos(prefetch_count=batch_size)
+        received = pending = 0
+        started = time.perf_counter()
+        for method, properties, payload in channel.consume(queue_name, auto_ack=False, inactivity_timeout=1.0):
+            if method is None:
+                break
+            json.loads(payload)
+            received += 1
+            pending += 1
+            if pending >= batch_size or received == messages:
+                channel.basic_ack(delivery_tag=method.delivery_tag, multiple=True)
+                pending = 0
+            if received == messages:
+                break
+        consume_seconds = time.perf_counter() - started
+        channel.cancel()
+        channel.queue_delete(queue=queue_name)
+    finally:
+        connection.close()
+    return {
+        'messages': received,
+        'publish_per_sec': messages / publish_seconds,
+        'consume_per_sec': received / consume_seconds if consume_seconds else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--transport', choices=('memory', 'rabbitmq'), action='append',
+                        help='Транспорт (можно указать несколько раз; по умолчанию - все)')
+    parser.add_argument('--rabbitmq-host', default='localhost')
+    parser.add_argument('--json', action='store_true', help='Вывести результаты в JSON')
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.transport or ('memory', 'rabbitmq'):
+        transport = get_transport({'MESSAGE_TRANSPORT': name, 'RABBITMQ_HOST': args.rabbitmq_host})
+        try:
+            results[name] = bench(transport, args.messages, args.batch_size)
+        except pika.exceptions.AMQPConnectionError as e:
+            results[name] = {'skipped': f"{transport} is unavailable ({e!r})"}
+
+    if args.json:
+        print(json.dumps(results))
+        return
+    for name, r in results.items():
+        if 'skipped' in r:
+            print(f"{name:>8}: skipped, {r['skipped']}")
+            continue
+        print(f"{name:>8}: {r['messages']:7d} messages, publish {r['publish_per_sec']:10.0f} msg/s, "
+              f"consume {r['consume_per_sec']:10.0f} msg/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+# benchmarks/bench_world_tick.py
+
+"""
+Бенчмарк векторного тика мира (game_service/world_tick.py).
+
+Создается временная БД GameService с синтетическими игроками (случайные
+уровни зданий, балансы и время последнего сбора за последнюю неделю), после
+чего измеряется пропускная способность (игроков/сек.):
+    - world_tick: чанки NumPy + executemany (сезонная выплата с бустом);
+    - per_player: построчная обработка через ORM и economy.checkpoint,
+      как если бы каждый игрок обрабатывался отдельно (на выборке --sample).
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_world_tick --players 1000000 --chunk-size 50000
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from game_service import db
+from game_service.economy import checkpoint
+from game_service.models import Resources, Buildings
+from game_service.world_tick import SQLITE_DATETIME_FORMAT, world_tick
+from shared.storage import apply_storage_profile
+
+
+def make_database(players: int, profile: str):
+    path = os.path.join(tempfile.mkdtemp(), 'game.db')
+    engine = create_engine(f"sqlite:///{path}")
+    apply_storage_profile(engine, profile)
+    db.metadata.create_all(engine)
+
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    batch = 100000
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        for start in range(0, players, batch):
+            user_ids = range(start + 1, min(start + batch, players) + 1)
+            levels = [(user_id, rng.randint(1, 20), rng.randint(1, 20), rng.randint(1, 20)) for user_id in user_ids]
+            cursor.executemany("INSERT INTO buildings VALUES (?, ?, ?, ?)", levels)
+            cursor.executemany(
+                "INSERT INTO resources (user_id, wood, stone, gold, wood_rate, stone_rate, gold_rate,"
+                " wood_carry, stone_carry, gold_carry, last_collected) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (user_id, rng.randrange(10 ** 5), rng.randrange(10 ** 5), rng.randrange(10 ** 5),
+                     sawmill * 10, quarry * 5, mine * 2,
+                     rng.randrange(3600), rng.randrange(3600), rng.randrange(3600),
+                     (now - timedelta(seconds=rng.randrange(7 * 86400))).strftime(SQLITE_DATETIME_FORMAT))
+                    for user_id, sawmill, quarry, mine in levels
+                )
+            )
+            connection.commit()
+    finally:
+        connection.close()
+    return engine
+
+
+def bench_world_tick(engine, chunk_size: int) -> dict:
+    result = world_tick(engine, rate_multiplier=1.5, payout_hours=24, chunk_size=chunk_size)
+    return {'players': result.players, 'seconds': result.seconds, 'players_per_sec': result.players_per_sec}
+
+
+def bench_per_player(engine, sample: int) -> dict:
+    started = time.perf_counter()
+    with Session(engine) as session:
+        for user_id in range(1, sample + 1):
+            resources = session.get(Resources, user_id)
+            buildings = session.get(Buildings, user_id)
+            checkpoint(resources, buildings)
+        session.commit()
+    seconds = time.perf_counter() - started
+    return {'players': sample, 'seconds': seconds, 'players_per_sec': sample / seconds}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--players', type=int, default=1000000)
+    parser.add_argument('--chunk-size', type=int, default=50000)
+    parser.add_argument('--sample', type=int, default=20000, help='Игроков для построчного варианта')
+    parser.add_argument('--profile', default='wal', help='Профиль хранения SQLite (shared/storage.py)')
+    parser.add_argument('--json', action='store_true', help='Вывести результаты в JSON')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    engine = make_database(args.players, args.profile)
+    setup_seconds = time.perf_counter() - started
+
+    results = {
+        'world_tick': bench_world_tick(engine, args.chunk_size),
+        'per_player': bench_per_player(engine, min(args.sample, args.players)),
+    }
+    engine.dispose()
+
+    if args.json:
+        print(json.dumps({'setup_seconds': setup_seconds, 'results': results}))
+        return
+    print(f"Synthetic table: {args.players} players in {setup_seconds:.1f}s")
+    for name, r in results.items():
+        print(f"{name:>11}: {r['players']:8d} players {r['seconds']:7.2f}s {r['players_per_sec']:10.0f} players/s")
+
+
+if __name__ == '__main__':
+    main()
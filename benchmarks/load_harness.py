@@ -0,0 +1,393 @@
+# benchmarks/load_harness.py
+
+"""
+Нагрузочный стенд: сквозные игровые сессии против запущенных AuthService и GameService.
+
+Сессия повторяет путь игрока из браузера:
+    1. POST /api/register, POST /api/login (AuthService);
+    2. ожидание данных игрока: опрос GET /api/v1/state до 200 - так измеряется
+       задержка между регистрацией и созданием данных консьюмером user_created
+       (страница /game создала бы данные "на лету" и скрыла бы задержку);
+    3. GET redirect_url из ответа логина (/game?token=...);
+    4. POST /collect_resources и POST /build/<type> (с переходом по 302 на /game).
+
+Сессии запускаются с заданной интенсивностью (--arrival-rate, сессий/сек.;
+0 - замкнутый цикл: новая сессия сразу после завершения предыдущей) и не
+более --concurrency одновременно. Для каждого эндпоинта выводятся p50/p95/p99,
+ошибки и коды ответов, для создания данных - задержка и число таймаутов.
+
+Отчет (--json или --output) машиночитаемый. С --baseline отчет сравнивается
+с сохраненным: рост p95 эндпоинта больше чем на --tolerance или рост доли
+ошибок - регрессия, скрипт завершается с кодом 1.
+
+Сервисы должны быть запущены (run_auth.py и run_game.py или run_production.py,
+RabbitMQ). Запуск из корня репозитория:
+    python -m benchmarks.load_harness --sessions 200 --concurrency 16 --arrival-rate 20
+    python -m benchmarks.load_harness --sessions 200 --output current.json --baseline release.json
+"""
+
+import argparse
+import http.client
+import json
+import random
+import statistics
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import urlencode, urlsplit
+
+BUILDING_TYPES = ('sawmill', 'quarry', 'mine')
+PERCENTILES = (50, 95, 99)
+
+
+class HttpClient:
+    """
+    Keep-alive соединения одного потока с сервисами (по одному на host:port).
+    При разрыве соединения сервером запрос повторяется на новом соединении.
+    """
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self._connections = {}
+
+    def request(self, method: str, url: str, body: bytes = None, headers: dict = None):
+        parts = urlsplit(url)
+        path = parts.path + (f'?{parts.query}' if parts.query else '')
+        for attempt in range(2):
+            connection = self._connections.get(parts.netloc)
+            if connection is None:
+                connection = http.client.HTTPConnection(parts.netloc, timeout=self.timeout)
+                self._connections[parts.netloc] = connection
+            try:
+                connection.request(method, path, body=body, headers=headers or {})
+                response = connection.getresponse()
+                data = response.read()
+                if response.getheader('Connection', '').lower() == 'close':
+                    self._drop(parts.netloc)
+                return response.status, response.getheader('Location'), data
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                self._drop(parts.netloc)
+                if attempt:
+                    raise
+            except Exception:
+                self._drop(parts.netloc)
+                raise
+
+    def _drop(self, netloc: str):
+        connection = self._connections.pop(netloc, None)
+        if connection is not None:
+            connection.close()
+
+    def close(self):
+        for netloc in list(self._connections):
+            self._drop(netloc)
+
+
+class Recorder:
+    """Потокобезопасный сбор задержек и ошибок по эндпоинтам."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.errors = Counter()
+        self.provisioning = []
+        self.provisioning_timeouts = 0
+        self.sessions = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, seconds: float, status, ok: bool):
+        with self._lock:
+            self.latencies[endpoint].append(seconds)
+            self.statuses[endpoint][str(status)] += 1
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def record_provisioning(self, seconds):
+        with self._lock:
+            if seconds is None:
+                self.provisioning_timeouts += 1
+            else:
+                self.provisioning.append(seconds)
+
+    def record_session(self, outcome: str):
+        with self._lock:
+            self.sessions[outcome] += 1
+
+
+class SessionFailed(Exception):
+    pass
+
+
+def _resolve(base_url: str, location: str) -> str:
+    return location if '://' in location else base_url.rstrip('/') + location
+
+
+class PlayerSession:
+    """
+    Одна игровая сессия.
+
+    Args:
+        args: Параметры стенда (argparse.Namespace).
+        recorder: Recorder для результатов.
+        client: HttpClient потока.
+        number: Номер сессии (для имени пользователя).
+    """
+
+    def __init__(self, args, recorder: Recorder, client: HttpClient, number: int):
+        self.args = args
+        self.recorder = recorder
+        self.client = client
+        self.username = f"{args.username_prefix}-{number}"
+        self.password = 'load-test-password'
+        self.rng = random.Random(number)
+
+    def call(self, endpoint: str, method: str, url: str, expected=(200,), body: bytes = None, headers: dict = None):
+        started = time.perf_counter()
+        try:
+            status, location, data = self.client.request(method, url, body=body, headers=headers)
+        except (OSError, http.client.HTTPException) as e:
+            self.recorder.record(endpoint, time.perf_counter() - started, type(e).__name__, ok=False)
+            raise SessionFailed(f"{endpoint}: {e}")
+        ok = status in expected
+        self.recorder.record(endpoint, time.perf_counter() - started, status, ok)
+        if not ok:
+            raise SessionFailed(f"{endpoint}: HTTP {status}")
+        return status, location, data
+
+    def call_json(self, endpoint: str, url: str, payload: dict, expected=(200,)):
+        _, _, data = self.call(
+            endpoint, 'POST', url, expected,
+            body=json.dumps(payload).encode(), headers={'Content-Type': 'application/json'}
+        )
+        return json.loads(data or b'{}')
+
+    def post_form(self, endpoint: str, url: str, token: str):
+        _, location, _ = self.call(
+            endpoint, 'POST', url, expected=(302,),
+            body=urlencode({'token': token}).encode(),
+            headers={'Content-Type': 'application/x-www-form-urlencoded'}
+        )
+        if location and self.args.follow_redirects:
+            self.call('GET /game', 'GET', _resolve(self.args.game_url, location))
+
+    def wait_provisioned(self, token: str, registered_at: float):
+        """Опрашивает /api/v1/state, пока консьюмер не создаст данные игрока."""
+        url = f"{self.args.game_url.rstrip('/')}/api/v1/state"
+        headers = {'Authorization': f'Bearer {token}'}
+        deadline = registered_at + self.args.provisioning_timeout
+        while True:
+            status, _, _ = self.client.request('GET', url, headers=headers)
+            if status == 200:
+                self.recorder.record_provisioning(time.perf_counter() - registered_at)
+                return
+            if status != 404:
+                raise SessionFailed(f"GET /api/v1/state: HTTP {status}")
+            if time.perf_counter() >= deadline:
+                self.recorder.record_provisioning(None)
+                return
+            time.sleep(self.args.provisioning_poll)
+
+    def think(self):
+        if self.args.think_time:
+            time.sleep(self.rng.expovariate(1000.0 / self.args.think_time))
+
+    def run(self):
+        auth_url = self.args.auth_url.rstrip('/')
+        game_url = self.args.game_url.rstrip('/')
+        credentials = {'username': self.username, 'password': self.password}
+
+        self.call_json('POST /api/register', f'{auth_url}/api/register', credentials, expected=(201,))
+        registered_at = time.perf_counter()
+        login = self.call_json('POST /api/login', f'{auth_url}/api/login', credentials)
+        token = login['access_token']
+
+        if self.args.measure_provisioning:
+            self.wait_provisioned(token, registered_at)
+        self.call('GET /game', 'GET', _resolve(game_url, login.get('redirect_url') or f'/game?token={token}'))
+
+        for _ in range(self.args.collects):
+            self.think()
+            self.post_form('POST /collect_resources', f'{game_url}/collect_resources', token)
+        for _ in range(self.args.builds):
+            self.think()
+            building_type = self.rng.choice(BUILDING_TYPES)
+            self.post_form('POST /build/<type>', f'{game_url}/build/{building_type}', token)
+
+
+def percentiles(samples: list) -> dict:
+    """p50/p95/p99, среднее и максимум в миллисекундах (ближайший ранг)."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    result = {f'p{p}_ms': ordered[min(len(ordered) - 1, max(0, -(-len(ordered) * p // 100) - 1))] * 1000
+              for p in PERCENTILES}
+    result['mean_ms'] = statistics.fmean(ordered) * 1000
+    result['max_ms'] = ordered[-1] * 1000
+    return result
+
+
+def run_load(args) -> dict:
+    recorder = Recorder()
+    local = threading.local()
+    clients = []
+    clients_lock = threading.Lock()
+
+    def thread_client() -> HttpClient:
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = HttpClient(args.timeout)
+            with clients_lock:
+                clients.append(client)
+        return client
+
+    def session(number: int):
+        try:
+            PlayerSession(args, recorder, thread_client(), number).run()
+            recorder.record_session('completed')
+        except SessionFailed as e:
+            recorder.record_session('failed')
+            if args.verbose:
+                print(f"session {number} failed: {e}", file=sys.stderr)
+        except Exception as e:
+            recorder.record_session('failed')
+            print(f"session {number} crashed: {e!r}", file=sys.stderr)
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        if args.arrival_rate > 0:
+            # Открытая модель: сессии приходят по расписанию независимо от ответов сервера
+            interval = 1.0 / args.arrival_rate
+            next_arrival = started
+            for number in range(args.sessions):
+                delay = next_arrival - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(session, number)
+                next_arrival += rng.expovariate(args.arrival_rate) if args.poisson else interval
+        else:
+            for number in range(args.sessions):
+                executor.submit(session, number)
+    duration = time.perf_counter() - started
+    for client in clients:
+        client.close()
+
+    endpoints = {}
+    for endpoint, samples in sorted(recorder.latencies.items()):
+        endpoints[endpoint] = {
+            'requests': len(samples),
+            'errors': recorder.errors[endpoint],
+            'error_rate': recorder.errors[endpoint] / len(samples),
+            'requests_per_sec': len(samples) / duration,
+            'statuses': dict(recorder.statuses[endpoint]),
+            **percentiles(samples),
+        }
+    provisioned = len(recorder.provisioning)
+    return {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'config': {
+            'sessions': args.sessions, 'concurrency': args.concurrency, 'arrival_rate': args.arrival_rate,
+            'poisson': args.poisson, 'collects': args.collects, 'builds': args.builds,
+            'think_time_ms': args.think_time, 'follow_redirects': args.follow_redirects,
+            'auth_url': args.auth_url, 'game_url': args.game_url,
+        },
+        'duration_s': duration,
+        'sessions': {
+            'completed': recorder.sessions['completed'],
+            'failed': recorder.sessions['failed'],
+            'sessions_per_sec': recorder.sessions['completed'] / duration,
+        },
+        'endpoints': endpoints,
+        'provisioning': {
+            'measured': provisioned,
+            'timeouts': recorder.provisioning_timeouts,
+            **percentiles(recorder.provisioning),
+        },
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """Регрессии относительно baseline: рост p95 больше tolerance или рост доли ошибок."""
+    regressions = []
+    for endpoint, base in baseline.get('endpoints', {}).items():
+        current = report['endpoints'].get(endpoint)
+        if current is None:
+            continue
+        if base.get('p95_ms') and current['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{endpoint}: p95 {base['p95_ms']:.1f}ms -> {current['p95_ms']:.1f}ms")
+        if current['error_rate'] > base.get('error_rate', 0):
+            regressions.append(f"{endpoint}: error rate {base.get('error_rate', 0):.2%} -> {current['error_rate']:.2%}")
+    base_lag = baseline.get('provisioning', {}).get('p95_ms')
+    lag = report['provisioning'].get('p95_ms')
+    if base_lag and lag and lag > base_lag * (1 + tolerance):
+        regressions.append(f"provisioning: p95 {base_lag:.1f}ms -> {lag:.1f}ms")
+    return regressions
+
+
+def print_report(report: dict):
+    sessions = report['sessions']
+    print(f"{sessions['completed']} session(s) completed, {sessions['failed']} failed "
+          f"in {report['duration_s']:.1f}s ({sessions['sessions_per_sec']:.1f} sessions/s)")
+    print(f"{'endpoint':<26}{'reqs':>7}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for endpoint, r in report['endpoints'].items():
+        print(f"{endpoint:<26}{r['requests']:>7}{r['errors']:>8}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}"
+              f"{r['p99_ms']:>9.1f}{r['max_ms']:>9.1f}")
+    lag = report['provisioning']
+    if lag.get('measured'):
+        print(f"provisioning lag: p50 {lag['p50_ms']:.1f}ms p95 {lag['p95_ms']:.1f}ms p99 {lag['p99_ms']:.1f}ms "
+              f"({lag['timeouts']} timeout(s))")
+    elif lag['timeouts']:
+        print(f"provisioning lag: all {lag['timeouts']} measurement(s) timed out")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--auth-url', default='http://localhost:5000')
+    parser.add_argument('--game-url', default='http://localhost:5001')
+    parser.add_argument('--sessions', type=int, default=100, help='Всего сессий')
+    parser.add_argument('--concurrency', type=int, default=8, help='Максимум одновременных сессий')
+    parser.add_argument('--arrival-rate', type=float, default=0.0,
+                        help='Новых сессий в секунду (0 - замкнутый цикл)')
+    parser.add_argument('--poisson', action='store_true', help='Пуассоновский поток сессий вместо равномерного')
+    parser.add_argument('--collects', type=int, default=3, help='Сборов ресурсов за сессию')
+    parser.add_argument('--builds', type=int, default=2, help='Улучшений зданий за сессию')
+    parser.add_argument('--think-time', type=float, default=0.0, help='Средняя пауза между действиями (мс)')
+    parser.add_argument('--no-follow-redirects', dest='follow_redirects', action='store_false',
+                        help='Не переходить по 302 после действий')
+    parser.add_argument('--no-provisioning', dest='measure_provisioning', action='store_false',
+                        help='Не ждать создания данных консьюмером')
+    parser.add_argument('--provisioning-timeout', type=float, default=10.0)
+    parser.add_argument('--provisioning-poll', type=float, default=0.02, help='Интервал опроса /api/v1/state (сек.)')
+    parser.add_argument('--timeout', type=float, default=30.0, help='Таймаут HTTP-запроса (сек.)')
+    parser.add_argument('--username-prefix', default=f'load-{uuid.uuid4().hex[:8]}')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help='Вывести отчет в JSON')
+    parser.add_argument('--output', help='Сохранить отчет в JSON-файл')
+    parser.add_argument('--baseline', help='JSON-отчет для сравнения (например, прошлого релиза)')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Допустимый рост p95 относительно baseline')
+    parser.add_argument('--verbose', action='store_true', help='Печатать причины неудачных сессий')
+    args = parser.parse_args()
+
+    report = run_load(args)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            report['regressions'] = compare(report, json.load(baseline_file), args.tolerance)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump(report, output_file, indent=2)
+    if args.json:
+        print(json.dumps(report))
+    else:
+        print_report(report)
+        for regression in report.get('regressions', ()):
+            print(f"REGRESSION {regression}")
+    if report.get('regressions'):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
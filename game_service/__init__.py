@@ -3,14 +3,15 @@
 
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-import os
 # import logging # Логгирование здесь не используется напрямую
-from datetime import datetime
-import jinja2
 
 # Импортируем правильную конфигурацию и функцию инициализации Swagger
 from shared.config import GameConfig
-from shared.swagger_config import init_swagger
+from shared.locks import database_lock_path
+from shared.schema import init_schema
+from shared.storage import init_storage
+from shared.templating import configure_templates
+from shared.swagger_config import init_swagger, precompute_apispec
 
 db = SQLAlchemy()
 
@@ -21,33 +22,69 @@ def create_app(config_class=GameConfig):
     # Загружаем конфигурацию ИЗ GameConfig (включая PORT=5001, SWAGGER_DESCRIPTION и т.д.)
     app.config.from_object(config_class)
 
-    # Настройка загрузчика шаблонов
-    service_templates = os.path.join(app.root_path, app.template_folder)
-    shared_templates = os.path.abspath(os.path.join(app.root_path, '..', 'shared', 'templates'))
-    app.jinja_loader = jinja2.ChoiceLoader([
-        jinja2.FileSystemLoader(service_templates),
-        jinja2.FileSystemLoader(shared_templates),
-    ])
+    # Загрузчик шаблонов (сервис + shared) и профиль рендеринга (TEMPLATE_PROFILE)
+    configure_templates(app)
 
     # Инициализация расширений
     db.init_app(app)
+    # PRAGMA профиля хранения SQLite и отдельный движок для чтения
+    init_storage(app, db)
 
     # Инициализация Swagger
     # init_swagger(app) прочитает app.config (включая PORT) и настроит все сама
     init_swagger(app)
 
 
+    # Кэш декодированных JWT (используется в utils.verify_jwt_token)
+    from .utils import TokenCache
+    app.extensions['jwt_token_cache'] = TokenCache(
+        app.config['JWT_SECRET_KEY'],
+        maxsize=app.config.get('JWT_CACHE_SIZE', 10000)
+    )
+
+    # Репозиторий игроков поверх кэша состояния с отложенной записью в БД
+    from .repository import PlayerRepository
+    from .state_cache import OWNER_LOCK_NAME, PlayerStateCache
+    player_cache = PlayerStateCache(
+        app,
+        maxsize=app.config.get('PLAYER_STATE_CACHE_SIZE', 10000),
+        flush_interval=app.config.get('PLAYER_STATE_FLUSH_INTERVAL', 1.0),
+        lock_path=database_lock_path(app.config['SQLALCHEMY_DATABASE_URI'], OWNER_LOCK_NAME),
+        lock_timeout=app.config.get('PLAYER_STATE_LOCK_TIMEOUT', 2.0)
+    )
+    app.extensions['player_state_cache'] = player_cache
+    # Подписчики SSE-потока получают снимки после каждой записи через репозиторий
+    from .events import PlayerEventHub
+    player_events = PlayerEventHub(buffer_size=app.config.get('SSE_CLIENT_BUFFER_SIZE', 16))
+    app.extensions['player_events'] = player_events
+    # Рейтинги загружаются из снимка или БД при первом обращении, а не здесь
+    from .leaderboard import Leaderboards
+    leaderboards = Leaderboards(
+        app,
+        snapshot_path=app.config.get('LEADERBOARD_SNAPSHOT_PATH'),
+        snapshot_interval=app.config.get('LEADERBOARD_SNAPSHOT_INTERVAL', 60.0),
+        rebuild_interval=app.config.get('LEADERBOARD_REBUILD_INTERVAL', 0.0)
+    )
+    app.extensions['leaderboards'] = leaderboards
+    app.extensions['player_repository'] = PlayerRepository(
+        player_cache, events=player_events, leaderboards=leaderboards
+    )
+
     # Регистрация blueprint'ов
     from .routes import game_bp
+    from .api import game_api_bp
     app.register_blueprint(game_bp)
+    app.register_blueprint(game_api_bp)
+    # Спецификация /apispec.json собирается один раз, когда все маршруты уже известны
+    precompute_apispec(app)
 
-    # Создание таблиц БД (лучше использовать Alembic/Flask-Migrate для управления)
-    with app.app_context():
-        # Убедитесь, что модели импортированы ДО db.create_all()
-        from . import models # Пример импорта моделей, если они определены в models.py
-        db.create_all()
+    # CLI-команды сервиса (world-tick и др.)
+    from .commands import register_commands
+    register_commands(app)
 
-    # Добавление глобальных переменных/функций в Jinja
-    app.jinja_env.globals['now'] = datetime.utcnow
+    # Создание таблиц БД (AUTO_CREATE_SCHEMA) и команда 'flask init-db'
+    # Модели должны быть импортированы ДО создания схемы
+    from . import models
+    init_schema(app, upgrades=(models.backfill_production_rates,))
 
     return app
\ No newline at end of file
@@ -0,0 +1,412 @@
+# game_service/api.py
+
+"""
+JSON API игрового сервиса (версия 1).
+
+В отличие от HTML-роутов (POST -> 302 -> рендер game.html) каждое действие
+здесь - один запрос, который сразу возвращает новое состояние игрока.
+Эндпоинт состояния отдает ETag с версией состояния и отвечает 304 на
+If-None-Match, если с прошлого запроса ничего не изменилось.
+
+Версия состояния - хеш хранимых полей (балансы на контрольной точке,
+скорости, время контрольной точки, уровни зданий). Текущие балансы в ответе
+растут со временем, но однозначно вычисляются из этих полей, поэтому ETag
+слабый (W/): клиент, получивший 304, досчитывает балансы сам по rates.
+
+Вместо опроса клиент может держать одно SSE-соединение (/api/v1/stream):
+первым событием приходит полное состояние, далее - только изменившиеся поля
+после каждой записи состояния игрока в этом процессе. Записи других процессов
+(другие воркеры, тик мира) хаб событий не видит, поэтому при каждом keepalive
+состояние перечитывается через репозиторий и отправляется, если версия изменилась.
+
+Рейтинги (/api/v1/leaderboard/<board>) отдаются из индекса в памяти
+(leaderboard.Leaderboards), без запросов к БД.
+"""
+
+import hashlib
+import json
+import logging
+from datetime import datetime
+
+from flask import Blueprint, Response, current_app, request, jsonify
+from shared.swagger_config import swag_from
+
+from .economy import BUILDING_TYPES, current_balance
+from .leaderboard import BOARDS, get_leaderboards
+from .repository import get_player_repository
+from .utils import verify_jwt_token
+
+game_api_bp = Blueprint('game_api', __name__, url_prefix='/api/v1')
+logger = logging.getLogger(__name__)
+
+TOKEN_PARAMETER = {
+    'name': 'Authorization',
+    'in': 'header',
+    'type': 'string',
+    'required': False,
+    'description': 'Bearer <JWT>. Можно также передать токен параметром token'
+}
+STATE_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'version': {'type': 'string'},
+        'resources': {'type': 'object', 'description': 'Текущие балансы на момент server_time'},
+        'checkpoint': {'type': 'object', 'description': 'Балансы на момент checkpoint_at'},
+        'checkpoint_at': {'type': 'string', 'format': 'date-time'},
+        'carry': {'type': 'object', 'description': 'Неначисленные доли единиц на checkpoint_at (ресурс * сек. / час)'},
+        'rates': {'type': 'object', 'description': 'Производство в час'},
+        'buildings': {'type': 'object'},
+        'server_time': {'type': 'string', 'format': 'date-time'}
+    }
+}
+
+
+LEADERBOARD_MAX_LIMIT = 100
+BOARD_PARAMETER = {
+    'name': 'board',
+    'in': 'path',
+    'type': 'string',
+    'enum': list(BOARDS),
+    'required': True,
+    'description': 'gold - золото, total - сумма ресурсов, buildings - сумма уровней зданий'
+}
+LEADERBOARD_ENTRY_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'rank': {'type': 'integer'},
+        'user_id': {'type': 'integer'},
+        'score': {'type': 'integer'},
+        'me': {'type': 'boolean'}
+    }
+}
+
+
+def state_version(snapshot) -> str:
+    """Версия состояния игрока: меняется при любой записи его данных."""
+    return hashlib.blake2b(repr(tuple(snapshot)).encode(), digest_size=8).hexdigest()
+
+
+def _isoformat(value: datetime) -> str:
+    return value.isoformat(timespec='milliseconds') + 'Z' if value else None
+
+
+def state_payload(snapshot, now: datetime = None) -> dict:
+    """JSON-представление снимка игрока."""
+    now = now or datetime.utcnow()
+    return {
+        'version': state_version(snapshot),
+        'resources': current_balance(snapshot, now),
+        'checkpoint': {'wood': snapshot.wood, 'stone': snapshot.stone, 'gold': snapshot.gold},
+        'checkpoint_at': _isoformat(snapshot.last_collected),
+        'carry': snapshot.carry,
+        'rates': snapshot.rates,
+        'buildings': snapshot.buildings,
+        'server_time': _isoformat(now),
+    }
+
+
+def _state_response(snapshot):
+    payload = state_payload(snapshot)
+    response = jsonify(payload)
+    response.set_etag(payload['version'], weak=True)
+    # Клиент может хранить ответ, но обязан перепроверять его через If-None-Match
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _authenticate():
+    """
+    Проверяет JWT из заголовка Authorization или параметра token.
+
+    Returns:
+        (user_id, None) при успехе или (None, JSON-ответ с ошибкой).
+    """
+    auth_header = request.headers.get('Authorization', '')
+    token = auth_header[7:] if auth_header.startswith('Bearer ') else request.values.get('token')
+    if not token:
+        return None, (jsonify({'message': 'Token is required'}), 401)
+
+    user_data = verify_jwt_token(token)
+    if not user_data:
+        return None, (jsonify({'message': 'Invalid or expired token'}), 401)
+    try:
+        return int(user_data['sub']), None
+    except (KeyError, ValueError, TypeError):
+        logger.error(f"Token payload has invalid 'sub': {user_data}")
+        return None, (jsonify({'message': 'Invalid token payload'}), 401)
+
+
+@game_api_bp.route('/state', methods=['GET'])
+@swag_from({
+    'tags': ['Game API'],
+    'description': 'Текущее состояние игрока. Поддерживает условный запрос через If-None-Match',
+    'parameters': [
+        TOKEN_PARAMETER,
+        {'name': 'If-None-Match', 'in': 'header', 'type': 'string', 'required': False}
+    ],
+    'responses': {
+        200: {'description': 'Состояние игрока', 'schema': STATE_SCHEMA},
+        304: {'description': 'Состояние не изменилось'},
+        401: {'description': 'Невалидный или просроченный токен'},
+        404: {'description': 'Данные пользователя не найдены'}
+    },
+    'security': [{'JWT': []}]
+})
+def get_state():
+    user_id, error = _authenticate()
+    if error:
+        return error
+
+    snapshot = get_player_repository().get(user_id)
+    if not snapshot:
+        return jsonify({'message': 'User data not found'}), 404
+    return _state_response(snapshot).make_conditional(request)
+
+
+@game_api_bp.route('/collect', methods=['POST'])
+@swag_from({
+    'tags': ['Game API'],
+    'description': 'Сбор ресурсов: возвращает текущее состояние (ресурсы начисляются непрерывно)',
+    'parameters': [TOKEN_PARAMETER],
+    'responses': {
+        200: {'description': 'Состояние игрока', 'schema': STATE_SCHEMA},
+        401: {'description': 'Невалидный или просроченный токен'},
+        404: {'description': 'Данные пользователя не найдены'}
+    },
+    'security': [{'JWT': []}]
+})
+def collect():
+    user_id, error = _authenticate()
+    if error:
+        return error
+
+    snapshot = get_player_repository().collect(user_id)
+    if not snapshot:
+        return jsonify({'message': 'User data not found'}), 404
+    return _state_response(snapshot)
+
+
+@game_api_bp.route('/build/<building_type>', methods=['POST'])
+@swag_from({
+    'tags': ['Game API'],
+    'description': 'Улучшение здания: возвращает новое состояние игрока',
+    'parameters': [
+        TOKEN_PARAMETER,
+        {
+            'name': 'building_type',
+            'in': 'path',
+            'type': 'string',
+            'enum': list(BUILDING_TYPES),
+            'required': True,
+            'description': 'Тип здания для улучшения'
+        }
+    ],
+    'responses': {
+        200: {'description': 'Состояние игрока после улучшения', 'schema': STATE_SCHEMA},
+        400: {'description': 'Неверный тип здания'},
+        401: {'description': 'Невалидный или просроченный токен'},
+        404: {'description': 'Данные пользователя не найдены'}
+    },
+    'security': [{'JWT': []}]
+})
+def build(building_type):
+    user_id, error = _authenticate()
+    if error:
+        return error
+    if building_type not in BUILDING_TYPES:
+        return jsonify({'message': 'Invalid building type'}), 400
+
+    snapshot = get_player_repository().upgrade_building(user_id, building_type)
+    if not snapshot:
+        return jsonify({'message': 'User data not found'}), 404
+    return _state_response(snapshot)
+
+
+def state_delta(previous: dict, current: dict) -> dict:
+    """
+    Изменившиеся поля состояния. Для вложенных словарей (rates, buildings и т.д.)
+    возвращаются только изменившиеся ключи; version и server_time - всегда.
+    """
+    delta = {}
+    for key, value in current.items():
+        old = previous.get(key)
+        if isinstance(value, dict) and isinstance(old, dict):
+            changed = {name: item for name, item in value.items() if old.get(name) != item}
+            if changed:
+                delta[key] = changed
+        elif old != value or key in ('version', 'server_time'):
+            delta[key] = value
+    return delta
+
+
+def _sse_event(event: str, data: dict, event_id: str = None) -> str:
+    lines = [f"event: {event}"]
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return '\n'.join(lines) + '\n\n'
+
+
+def _reread_snapshot(app, user_id):
+    """Снимок игрока из репозитория вне контекста запроса (None при ошибке чтения)."""
+    try:
+        with app.app_context():
+            return get_player_repository().get(user_id)
+    except Exception as e:
+        logger.error(f"[!] Failed to re-read state of user {user_id} for SSE: {e}")
+        return None
+
+
+def _state_stream(app, subscription, snapshot, keepalive_interval: float):
+    """Генератор SSE: полное состояние, затем дельты и keepalive-комментарии."""
+    last = state_payload(snapshot)
+    yield f"retry: {int(keepalive_interval * 1000)}\n\n"
+    yield _sse_event('state', last, last['version'])
+    while True:
+        snapshot = subscription.wait(keepalive_interval)
+        if snapshot is None:
+            # Изменения из других процессов хаб не доставляет - сверяемся с репозиторием
+            snapshot = _reread_snapshot(app, subscription.user_id)
+            if snapshot is None or state_version(snapshot) == last['version']:
+                # Комментарий держит соединение (прокси) и выявляет отключившихся клиентов
+                yield ": keepalive\n\n"
+                continue
+        current = state_payload(snapshot)
+        if current['version'] == last['version']:
+            continue
+        yield _sse_event('delta', state_delta(last, current), current['version'])
+        last = current
+
+
+@game_api_bp.route('/stream', methods=['GET'])
+@swag_from({
+    'tags': ['Game API'],
+    'description': (
+        'SSE-поток состояния игрока (text/event-stream). Событие state - полное состояние, '
+        'delta - изменившиеся поля. EventSource не передает заголовки, поэтому токен '
+        'обычно передается параметром token'
+    ),
+    'produces': ['text/event-stream'],
+    'parameters': [
+        TOKEN_PARAMETER,
+        {'name': 'token', 'in': 'query', 'type': 'string', 'required': False}
+    ],
+    'responses': {
+        200: {'description': 'Поток событий'},
+        401: {'description': 'Невалидный или просроченный токен'},
+        404: {'description': 'Данные пользователя не найдены'}
+    },
+    'security': [{'JWT': []}]
+})
+def stream():
+    user_id, error = _authenticate()
+    if error:
+        return error
+
+    hub = current_app.extensions['player_events']
+    # Подписка до чтения состояния: запись между ними придет дельтой, а не потеряется
+    subscription = hub.subscribe(user_id)
+    snapshot = get_player_repository().get(user_id)
+    if not snapshot:
+        hub.unsubscribe(subscription)
+        return jsonify({'message': 'User data not found'}), 404
+
+    keepalive_interval = current_app.config.get('SSE_KEEPALIVE_INTERVAL', 15.0)
+    response = Response(
+        _state_stream(current_app._get_current_object(), subscription, snapshot, keepalive_interval),
+        mimetype='text/event-stream'
+    )
+    # Вызывается сервером при завершении ответа, в том числе при отключении клиента
+    response.call_on_close(lambda: hub.unsubscribe(subscription))
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Отключает буферизацию ответа в nginx
+    return response
+
+
+def _bounded_int(name: str, default: int, maximum: int) -> int:
+    value = request.args.get(name, default, type=int)
+    return min(max(value if value is not None else default, 0), maximum)
+
+
+@game_api_bp.route('/leaderboard/<board>', methods=['GET'])
+@swag_from({
+    'tags': ['Game API'],
+    'description': 'Первые места рейтинга',
+    'parameters': [
+        BOARD_PARAMETER,
+        {'name': 'limit', 'in': 'query', 'type': 'integer', 'required': False, 'default': 10,
+         'description': f'Количество мест (не больше {LEADERBOARD_MAX_LIMIT})'}
+    ],
+    'responses': {
+        200: {
+            'description': 'Первые места',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'board': {'type': 'string'},
+                    'players': {'type': 'integer'},
+                    'entries': {'type': 'array', 'items': LEADERBOARD_ENTRY_SCHEMA}
+                }
+            }
+        },
+        404: {'description': 'Неизвестный рейтинг'}
+    }
+})
+def leaderboard_top(board):
+    if board not in BOARDS:
+        return jsonify({'message': 'Unknown leaderboard'}), 404
+    leaderboards = get_leaderboards()
+    limit = _bounded_int('limit', 10, LEADERBOARD_MAX_LIMIT)
+    return jsonify({'board': board, 'players': leaderboards.size(), 'entries': leaderboards.top(board, limit)})
+
+
+@game_api_bp.route('/leaderboard/<board>/me', methods=['GET'])
+@swag_from({
+    'tags': ['Game API'],
+    'description': 'Место игрока в рейтинге и соседи выше и ниже',
+    'parameters': [
+        TOKEN_PARAMETER,
+        BOARD_PARAMETER,
+        {'name': 'radius', 'in': 'query', 'type': 'integer', 'required': False, 'default': 5,
+         'description': f'Соседей с каждой стороны (не больше {LEADERBOARD_MAX_LIMIT})'}
+    ],
+    'responses': {
+        200: {
+            'description': 'Место игрока',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'board': {'type': 'string'},
+                    'players': {'type': 'integer'},
+                    'rank': {'type': 'integer'},
+                    'score': {'type': 'integer'},
+                    'entries': {'type': 'array', 'items': LEADERBOARD_ENTRY_SCHEMA}
+                }
+            }
+        },
+        401: {'description': 'Невалидный или просроченный токен'},
+        404: {'description': 'Неизвестный рейтинг или данные пользователя не найдены'}
+    },
+    'security': [{'JWT': []}]
+})
+def leaderboard_me(board):
+    user_id, error = _authenticate()
+    if error:
+        return error
+    if board not in BOARDS:
+        return jsonify({'message': 'Unknown leaderboard'}), 404
+
+    # Место считается по текущему балансу игрока
+    if not get_player_repository().collect(user_id):
+        return jsonify({'message': 'User data not found'}), 404
+    leaderboards = get_leaderboards()
+    found = leaderboards.around(board, user_id, _bounded_int('radius', 5, LEADERBOARD_MAX_LIMIT))
+    if found is None:
+        return jsonify({'message': 'User data not found'}), 404
+    rank, score, entries = found
+    for entry in entries:
+        if entry['user_id'] == user_id:
+            entry['me'] = True
+    return jsonify({
+        'board': board, 'players': leaderboards.size(), 'rank': rank, 'score': score, 'entries': entries
+    })
@@ -0,0 +1,75 @@
+# game_service/commands.py
+
+"""
+CLI-команды GameService (flask --app game_service ...).
+
+    flask --app game_service world-tick catch-up
+    flask --app game_service world-tick payout --hours 24
+    flask --app game_service world-tick boost --multiplier 1.5
+    flask --app game_service world-tick grant --gold 100
+
+Модули с тяжелыми зависимостями (NumPy) импортируются внутри команд,
+чтобы не замедлять create_app.
+"""
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+world_tick_cli = AppGroup('world-tick', help=(
+    'Массовые операции экономики над всеми игроками. Отказывается запускаться, '
+    'пока работает сервис с кэшем состояния: остановите его или запускайте '
+    'сервис с PLAYER_STATE_CACHE_SIZE=0.'
+))
+
+chunk_size_option = click.option('--chunk-size', type=int, default=50000, show_default=True,
+                                 help='Игроков в одном чанке (и транзакции)')
+
+
+def _run(**kwargs):
+    from .world_tick import run_world_tick
+
+    try:
+        result = run_world_tick(current_app._get_current_object(), **kwargs)
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Updated {result.players} player(s) in {result.chunks} chunk(s), "
+               f"{result.seconds:.2f}s ({result.players_per_sec:.0f} players/s).")
+
+
+@world_tick_cli.command('catch-up')
+@chunk_size_option
+def catch_up_command(chunk_size):
+    """Зафиксировать начисленные ресурсы всех игроков ("догоняющее" начисление)."""
+    _run(chunk_size=chunk_size)
+
+
+@world_tick_cli.command('payout')
+@click.option('--hours', type=float, required=True, help='Часы производства для начисления')
+@chunk_size_option
+def payout_command(hours, chunk_size):
+    """Сезонная выплата: начислить N часов производства по текущим скоростям."""
+    _run(payout_hours=hours, chunk_size=chunk_size)
+
+
+@world_tick_cli.command('boost')
+@click.option('--multiplier', type=float, required=True, help='Множитель скоростей (1.0 - отменить буст)')
+@chunk_size_option
+def boost_command(multiplier, chunk_size):
+    """Глобальный буст производства (действует до следующего boost)."""
+    _run(rate_multiplier=multiplier, chunk_size=chunk_size)
+
+
+@world_tick_cli.command('grant')
+@click.option('--wood', type=int, default=0)
+@click.option('--stone', type=int, default=0)
+@click.option('--gold', type=int, default=0)
+@chunk_size_option
+def grant_command(wood, stone, gold, chunk_size):
+    """Начислить фиксированное количество ресурсов всем игрокам."""
+    _run(grant={'wood': wood, 'stone': stone, 'gold': gold}, chunk_size=chunk_size)
+
+
+def register_commands(app):
+    """Регистрирует CLI-команды GameService."""
+    app.cli.add_command(world_tick_cli)
@@ -0,0 +1,131 @@
+# game_service/economy.py
+
+"""
+Модель производства ресурсов с "ленивым" начислением.
+
+Вместо того чтобы записывать ресурсы в БД при каждом сборе, для игрока хранятся:
+    - баланс на момент контрольной точки (Resources.wood/stone/gold);
+    - скорость производства в час (Resources.wood_rate/stone_rate/gold_rate),
+      вычисленная по уровням зданий;
+    - время контрольной точки (Resources.last_collected);
+    - неначисленный остаток (Resources.wood_carry/stone_carry/gold_carry) -
+      доля единицы ресурса, накопленная к контрольной точке, в единицах
+      "ресурс * сек. / час" (0 <= carry < SECONDS_PER_HOUR).
+
+Текущий баланс считается при чтении: amount + (carry + rate * elapsed) // 3600,
+где elapsed - целые секунды с контрольной точки. При фиксации (checkpoint)
+контрольная точка сдвигается ровно на начисленные целые секунды, а дробная
+часть единицы остается в carry, поэтому частые фиксации ничего не теряют.
+Строка в БД переписывается только тогда, когда меняется скорость
+(улучшение здания) или ресурсы тратятся.
+"""
+
+from datetime import datetime, timedelta
+
+# Ресурс -> (поле уровня здания, производство в час за один уровень)
+PRODUCTION_PER_LEVEL = {
+    'wood': ('sawmill_level', 10),
+    'stone': ('quarry_level', 5),
+    'gold': ('mine_level', 2),
+}
+
+RESOURCE_NAMES = tuple(PRODUCTION_PER_LEVEL)
+BUILDING_TYPES = ('sawmill', 'quarry', 'mine')
+SECONDS_PER_HOUR = 3600
+
+
+def base_rate(resource: str) -> int:
+    """Скорость производства ресурса для зданий первого уровня."""
+    return PRODUCTION_PER_LEVEL[resource][1]
+
+
+def production_rates(buildings) -> dict:
+    """
+    Вычисляет производство в час по уровням зданий.
+
+    Args:
+        buildings: Объект с полями sawmill_level, quarry_level, mine_level
+                   (модель Buildings или любое совместимое представление).
+    """
+    return {
+        resource: (getattr(buildings, level_field) or 0) * per_level
+        for resource, (level_field, per_level) in PRODUCTION_PER_LEVEL.items()
+    }
+
+
+def elapsed_seconds(since: datetime, now: datetime) -> int:
+    """Целые секунды от контрольной точки до now (0, если точки нет или now раньше)."""
+    if not since or now <= since:
+        return 0
+    return (now - since) // timedelta(seconds=1)
+
+
+def accrued(amount: int, rate: int, since: datetime, now: datetime, carry: int = 0) -> int:
+    """Баланс одного ресурса: значение на контрольной точке + начисленное с тех пор."""
+    return amount + (carry + rate * elapsed_seconds(since, now)) // SECONDS_PER_HOUR
+
+
+def current_balance(resources, now: datetime = None) -> dict:
+    """
+    Текущие балансы игрока без записи в БД.
+
+    Args:
+        resources: Модель Resources (или совместимый объект).
+        now: Момент времени, на который считается баланс (по умолчанию - сейчас, UTC).
+    """
+    now = now or datetime.utcnow()
+    return {
+        resource: accrued(
+            getattr(resources, resource) or 0,
+            getattr(resources, f'{resource}_rate') or 0,
+            resources.last_collected,
+            now,
+            getattr(resources, f'{resource}_carry', 0) or 0,
+        )
+        for resource in RESOURCE_NAMES
+    }
+
+
+def checkpoint(resources, buildings, now: datetime = None) -> dict:
+    """
+    Фиксирует начисленные ресурсы в модели и пересчитывает скорости по зданиям.
+
+    Вызывается перед изменением уровней зданий или списанием ресурсов,
+    чтобы уже накопленное было посчитано по старой скорости. Контрольная
+    точка сдвигается на начисленные целые секунды, дробные доли единиц
+    переносятся в carry. Изменяет объект resources, но не делает commit.
+
+    Returns:
+        Словарь с новыми балансами.
+    """
+    now = now or datetime.utcnow()
+    since = resources.last_collected
+    elapsed = elapsed_seconds(since, now)
+    balance = {}
+    for resource in RESOURCE_NAMES:
+        carry_field = f'{resource}_carry'
+        produced = (getattr(resources, carry_field, 0) or 0) + (getattr(resources, f'{resource}_rate') or 0) * elapsed
+        balance[resource] = (getattr(resources, resource) or 0) + produced // SECONDS_PER_HOUR
+        setattr(resources, resource, balance[resource])
+        setattr(resources, carry_field, produced % SECONDS_PER_HOUR)
+    for resource, rate in production_rates(buildings).items():
+        setattr(resources, f'{resource}_rate', rate)
+    resources.last_collected = since + timedelta(seconds=elapsed) if since else now
+    return balance
+
+
+def upgrade_building(state, building_type: str, now: datetime = None) -> dict:
+    """
+    Повышает уровень здания на 1 с фиксацией накопленных ресурсов.
+
+    Args:
+        state: Объект с полями ресурсов и уровней зданий (например, PlayerState).
+        building_type: Один из BUILDING_TYPES.
+
+    Returns:
+        Словарь с балансами на момент улучшения.
+    """
+    level_field = f'{building_type}_level'
+    setattr(state, level_field, getattr(state, level_field) + 1)
+    # Накопленное считается по старой скорости, новая скорость - по новым уровням
+    return checkpoint(state, state, now)
@@ -0,0 +1,96 @@
+# game_service/events.py
+
+"""
+Реестр подписчиков на изменения состояния игроков (для SSE-потока).
+
+Репозиторий публикует новый снимок игрока после каждой записи, а каждое
+открытое SSE-соединение держит свой ограниченный буфер снимков. Если клиент
+не успевает читать, из буфера вытесняются самые старые снимки: каждый снимок
+полный, поэтому потеря промежуточных не искажает итоговое состояние.
+
+Реестр живет в памяти процесса: подписчик получает изменения, сделанные
+этим же процессом.
+"""
+
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """
+    Буфер снимков одного соединения.
+
+    Args:
+        user_id: ID игрока.
+        buffer_size: Максимальное число неотправленных снимков.
+    """
+
+    def __init__(self, user_id: int, buffer_size: int = 16):
+        self.user_id = user_id
+        self._buffer = deque(maxlen=buffer_size)
+        self._ready = threading.Condition()
+        self.dropped = 0
+
+    def push(self, snapshot):
+        with self._ready:
+            if len(self._buffer) == self._buffer.maxlen:
+                self.dropped += 1
+            self._buffer.append(snapshot)
+            self._ready.notify()
+
+    def wait(self, timeout: float):
+        """
+        Ждет следующий снимок.
+
+        Returns:
+            Снимок или None, если за timeout секунд ничего не пришло.
+        """
+        with self._ready:
+            if not self._buffer and not self._ready.wait(timeout):
+                return None
+            return self._buffer.popleft() if self._buffer else None
+
+
+class PlayerEventHub:
+    """
+    Подписчики по user_id.
+
+    Args:
+        buffer_size: Размер буфера каждого подписчика.
+    """
+
+    def __init__(self, buffer_size: int = 16):
+        self.buffer_size = buffer_size
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id: int) -> Subscription:
+        subscription = Subscription(user_id, self.buffer_size)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.user_id)
+            if subscriptions is None:
+                return
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscribers[subscription.user_id]
+        if subscription.dropped:
+            logger.info(f"SSE subscriber of user {subscription.user_id} dropped {subscription.dropped} stale snapshot(s).")
+
+    def publish(self, user_id: int, snapshot):
+        """Рассылает снимок всем подписчикам игрока. Без подписчиков ничего не делает."""
+        with self._lock:
+            subscriptions = tuple(self._subscribers.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.push(snapshot)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscribers.values())
@@ -0,0 +1,482 @@
+# game_service/leaderboard.py
+
+"""
+Рейтинги игроков в памяти процесса: по золоту, по сумме ресурсов и по сумме
+уровней зданий.
+
+Каждый рейтинг - индексируемый skip list (SkipList): вставка, удаление, место
+игрока, top-N и "соседи" игрока выполняются за O(log n) без ORDER BY по таблицам.
+Ключ элемента - одно целое число (-очки, user_id), поэтому при равных очках
+выше стоит игрок с меньшим ID.
+
+Очки - балансы игрока на момент его последнего действия (сбор ресурсов,
+улучшение здания, запрос своего места) или последней пересборки. Ресурсы
+начисляются непрерывно, поэтому рейтинг не пересчитывается каждую секунду:
+игрок поднимается в нем, когда заходит в игру.
+
+Источники данных:
+    - при первом обращении рейтинги загружаются из файла снимка
+      (LEADERBOARD_SNAPSHOT_PATH) или, если его нет, пересобираются из БД
+      одним запросом (балансы досчитываются в SQL на текущий момент);
+    - репозиторий игроков сообщает о каждом действии (Leaderboards.observe);
+    - фоновый поток раз в LEADERBOARD_SNAPSHOT_INTERVAL секунд сохраняет снимок
+      и, если задан LEADERBOARD_REBUILD_INTERVAL, пересобирает рейтинги из БД
+      (нужно при нескольких процессах: каждый видит только свои действия).
+"""
+
+import atexit
+import gc
+import json
+import logging
+import os
+import random
+import threading
+import time
+from array import array
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import func, literal, select
+
+from shared.storage import read_session
+
+from .economy import PRODUCTION_PER_LEVEL, RESOURCE_NAMES, SECONDS_PER_HOUR, current_balance
+from .models import Resources, Buildings
+from .repository import elapsed_seconds_sql
+
+logger = logging.getLogger(__name__)
+
+BOARDS = ('gold', 'total', 'buildings')
+SNAPSHOT_FORMAT = 1
+
+# Ключ рейтинга: (-очки << USER_ID_BITS) + user_id
+USER_ID_BITS = 32
+USER_ID_MASK = (1 << USER_ID_BITS) - 1
+
+MAX_LEVEL = 32
+# Вероятность перехода узла на следующий уровень - 1/4 (два младших нулевых бита)
+_LEVEL_BITS = 2 * MAX_LEVEL
+
+
+def make_key(score: int, user_id: int) -> int:
+    return (-score << USER_ID_BITS) + user_id
+
+
+def split_key(key: int):
+    """(user_id, очки) по ключу рейтинга."""
+    return key & USER_ID_MASK, -(key >> USER_ID_BITS)
+
+
+def _random_level() -> int:
+    bits = random.getrandbits(_LEVEL_BITS) | (1 << (_LEVEL_BITS - 2))
+    return 1 + ((bits & -bits).bit_length() - 1) // 2
+
+
+class _Node:
+    __slots__ = ('key', 'next', 'width')
+
+    def __init__(self, key, level: int):
+        self.key = key
+        self.next = [None] * level
+        # width[i] - число элементов нижнего уровня между узлом и next[i] (включая next[i])
+        self.width = [1] * level
+
+
+class SkipList:
+    """
+    Индексируемый skip list уникальных целых ключей по возрастанию.
+
+    Помимо ссылок каждый узел хранит "ширину" ссылки, поэтому позиция ключа
+    и ключ по позиции находятся спуском по уровням за O(log n).
+    """
+
+    def __init__(self):
+        self.head = _Node(None, MAX_LEVEL)
+        self.level = 1
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    @classmethod
+    def from_sorted(cls, keys) -> 'SkipList':
+        """Строит список из отсортированных уникальных ключей за O(n)."""
+        skip_list = cls()
+        last = [skip_list.head] * MAX_LEVEL
+        last_position = [0] * MAX_LEVEL
+        previous = skip_list.head
+        position = 0
+        for position, key in enumerate(keys, 1):
+            level = _random_level()
+            node = _Node(key, level)
+            # Нижний уровень: соседние элементы, ширина ссылки всегда 1
+            previous.next[0] = node
+            previous = node
+            for i in range(1, level):
+                above = last[i]
+                above.next[i] = node
+                above.width[i] = position - last_position[i]
+                last[i] = node
+                last_position[i] = position
+            if level > skip_list.level:
+                skip_list.level = level
+        last[0], last_position[0] = previous, position
+        for i in range(MAX_LEVEL):
+            last[i].width[i] = position + 1 - last_position[i]
+        skip_list.size = position
+        return skip_list
+
+    def _path(self, key):
+        """Последние узлы с ключом < key на каждом уровне и их позиции."""
+        update = [self.head] * MAX_LEVEL
+        positions = [0] * MAX_LEVEL
+        node = self.head
+        position = 0
+        for i in range(self.level - 1, -1, -1):
+            following = node.next[i]
+            while following is not None and following.key < key:
+                position += node.width[i]
+                node = following
+                following = node.next[i]
+            update[i] = node
+            positions[i] = position
+        return update, positions
+
+    def insert(self, key):
+        update, positions = self._path(key)
+        level = _random_level()
+        if level > self.level:
+            for i in range(self.level, level):
+                self.head.width[i] = self.size + 1
+            self.level = level
+        position = positions[0] + 1
+        node = _Node(key, level)
+        for i in range(level):
+            previous = update[i]
+            node.next[i] = previous.next[i]
+            node.width[i] = previous.width[i] - (position - positions[i]) + 1
+            previous.next[i] = node
+            previous.width[i] = position - positions[i]
+        for i in range(level, self.level):
+            update[i].width[i] += 1
+        self.size += 1
+
+    def remove(self, key):
+        update, _ = self._path(key)
+        node = update[0].next[0]
+        if node is None or node.key != key:
+            raise KeyError(key)
+        for i in range(self.level):
+            previous = update[i]
+            if previous.next[i] is node:
+                previous.width[i] += node.width[i] - 1
+                previous.next[i] = node.next[i]
+            else:
+                previous.width[i] -= 1
+        while self.level > 1 and self.head.next[self.level - 1] is None:
+            self.level -= 1
+        self.size -= 1
+
+    def index(self, key) -> int:
+        """Позиция ключа (с 0). KeyError, если ключа нет."""
+        update, positions = self._path(key)
+        node = update[0].next[0]
+        if node is None or node.key != key:
+            raise KeyError(key)
+        return positions[0]
+
+    def slice(self, start: int, count: int) -> list:
+        """До count ключей, начиная с позиции start."""
+        if start < 0 or start >= self.size or count <= 0:
+            return []
+        target = start + 1
+        node = self.head
+        position = 0
+        for i in range(self.level - 1, -1, -1):
+            while node.next[i] is not None and position + node.width[i] <= target:
+                position += node.width[i]
+                node = node.next[i]
+        keys = []
+        while node is not None and len(keys) < count:
+            keys.append(node.key)
+            node = node.next[0]
+        return keys
+
+
+def player_scores(snapshot, now: datetime = None) -> tuple:
+    """Очки игрока во всех рейтингах (в порядке BOARDS)."""
+    balance = current_balance(snapshot, now)
+    levels = sum(level or 0 for level in snapshot.buildings.values())
+    return balance['gold'], sum(balance.values()), levels
+
+
+def _score_query(now: datetime):
+    """SELECT очков всех игроков: балансы досчитываются в SQL на момент now."""
+    elapsed = elapsed_seconds_sql(Resources.last_collected, literal(now, type_=Resources.last_collected.type))
+    balances = {
+        resource: func.coalesce(getattr(Resources, resource), 0)
+        + (func.coalesce(getattr(Resources, f'{resource}_carry'), 0)
+           + func.coalesce(getattr(Resources, f'{resource}_rate'), 0) * elapsed) // SECONDS_PER_HOUR
+        for resource in RESOURCE_NAMES
+    }
+    levels = [func.coalesce(getattr(Buildings, level_field), 0) for level_field, _ in PRODUCTION_PER_LEVEL.values()]
+    return (
+        select(Resources.user_id, balances['gold'], sum(balances.values()), sum(levels))
+        .join(Buildings, Buildings.user_id == Resources.user_id)
+    )
+
+
+class Leaderboards:
+    """
+    Рейтинги BOARDS с загрузкой из снимка или БД и фоновым сохранением.
+
+    Args:
+        app: Экземпляр Flask приложения (контекст для загрузки из БД).
+        snapshot_path: Файл снимка (None - без снимков).
+        snapshot_interval: Интервал сохранения снимка (сек., 0 - только при завершении).
+        rebuild_interval: Интервал пересборки из БД (сек., 0 - без пересборки).
+    """
+
+    def __init__(self, app, snapshot_path: str = None, snapshot_interval: float = 60.0,
+                 rebuild_interval: float = 0.0):
+        self.app = app
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.rebuild_interval = rebuild_interval
+        self._boards = {}
+        self._scores = {}  # user_id -> очки в порядке BOARDS
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()
+        self._loaded = False
+        # Действия до загрузки или во время пересборки применяются после нее
+        self._pending = None
+        self._changed = False
+        self._wakeup = threading.Event()
+        self._worker = None
+
+    # --- Запись ---
+
+    def observe(self, user_id: int, snapshot, now: datetime = None):
+        """Обновляет очки игрока по его снимку состояния."""
+        scores = player_scores(snapshot, now)
+        with self._lock:
+            if self._pending is not None:
+                self._pending[user_id] = scores
+            if self._loaded:
+                self._set_scores(user_id, scores)
+            elif self._pending is None:
+                self._pending = {user_id: scores}
+
+    def _set_scores(self, user_id: int, scores: tuple):
+        """Вызывать под блокировкой."""
+        old = self._scores.get(user_id)
+        if old == scores:
+            return
+        for board, old_score, score in zip(BOARDS, old or (None,) * len(BOARDS), scores):
+            if old_score == score:
+                continue
+            skip_list = self._boards[board]
+            if old_score is not None:
+                skip_list.remove(make_key(old_score, user_id))
+            skip_list.insert(make_key(score, user_id))
+        self._scores[user_id] = scores
+        self._changed = True
+
+    # --- Чтение ---
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            scores = self._read_snapshot() if self.snapshot_path else None
+            from_database = scores is None
+            if from_database:
+                scores = self._read_database()
+            self._install(scores)
+            # Собранные из БД рейтинги сохраняются в снимок для быстрого следующего старта
+            self._changed = self._changed or from_database
+            self._ensure_worker()
+
+    def _install(self, scores: dict):
+        """Строит рейтинги из словаря очков и применяет накопленные действия."""
+        started = time.perf_counter()
+        # Узлы ссылаются только вперед (без циклов) - сборщик мусора на время
+        # создания сотен тысяч объектов только мешает
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            boards = {
+                board: SkipList.from_sorted(sorted(make_key(values[index], user_id) for user_id, values in scores.items()))
+                for index, board in enumerate(BOARDS)
+            }
+        finally:
+            if gc_enabled:
+                gc.enable()
+        with self._lock:
+            self._boards = boards
+            self._scores = scores
+            self._loaded = True
+            pending, self._pending = self._pending or {}, None
+            for user_id, values in pending.items():
+                self._set_scores(user_id, values)
+        logger.info(f"Leaderboards built for {len(scores)} player(s) in {time.perf_counter() - started:.2f}s.")
+
+    def _entries(self, keys: list, first_rank: int) -> list:
+        entries = []
+        for rank, key in enumerate(keys, first_rank):
+            user_id, score = split_key(key)
+            entries.append({'rank': rank, 'user_id': user_id, 'score': score})
+        return entries
+
+    def size(self) -> int:
+        self._ensure_loaded()
+        return len(self._scores)
+
+    def top(self, board: str, limit: int = 10) -> list:
+        """Первые limit мест рейтинга: [{'rank', 'user_id', 'score'}, ...]."""
+        self._ensure_loaded()
+        with self._lock:
+            return self._entries(self._boards[board].slice(0, limit), 1)
+
+    def rank(self, board: str, user_id: int):
+        """
+        Место игрока (с 1) и его очки.
+
+        Returns:
+            (место, очки) или None, если игрока нет в рейтинге.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            scores = self._scores.get(user_id)
+            if scores is None:
+                return None
+            score = scores[BOARDS.index(board)]
+            return self._boards[board].index(make_key(score, user_id)) + 1, score
+
+    def around(self, board: str, user_id: int, radius: int = 5):
+        """
+        Место игрока и до radius соседей выше и ниже.
+
+        Returns:
+            (место, очки, записи) или None, если игрока нет в рейтинге.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            found = self.rank(board, user_id)
+            if found is None:
+                return None
+            rank, score = found
+            start = max(rank - 1 - radius, 0)
+            keys = self._boards[board].slice(start, rank - 1 - start + radius + 1)
+            return rank, score, self._entries(keys, start + 1)
+
+    # --- Источники ---
+
+    def _read_database(self) -> dict:
+        with self.app.app_context():
+            cache = self.app.extensions.get('player_state_cache')
+            if cache is not None and cache.enabled:
+                # Отложенные записи кэша тоже должны попасть в рейтинг
+                cache.flush()
+            with read_session() as session:
+                rows = session.execute(_score_query(datetime.utcnow())).all()
+        return {user_id: (gold, total, levels) for user_id, gold, total, levels in rows}
+
+    def rebuild(self):
+        """Пересобирает рейтинги из БД. Действия во время пересборки не теряются."""
+        with self._lock:
+            self._pending = {}
+        try:
+            scores = self._read_database()
+        except Exception:
+            with self._lock:
+                self._pending = None if self._loaded else self._pending
+            raise
+        self._install(scores)
+        self._changed = True
+
+    def _read_snapshot(self):
+        try:
+            with open(self.snapshot_path, 'rb') as snapshot_file:
+                header = json.loads(snapshot_file.readline())
+                if header.get('format') != SNAPSHOT_FORMAT or list(header.get('boards', ())) != list(BOARDS):
+                    logger.warning(f"Ignoring leaderboard snapshot {self.snapshot_path} of another format.")
+                    return None
+                count = header['players']
+                columns = []
+                for _ in range(1 + len(BOARDS)):
+                    column = array('q')
+                    column.fromfile(snapshot_file, count)
+                    columns.append(column)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, EOFError) as e:
+            logger.warning(f"Failed to read leaderboard snapshot {self.snapshot_path}: {e}")
+            return None
+        logger.info(f"Loading leaderboards from snapshot taken at {header.get('created_at')}.")
+        return dict(zip(columns[0], zip(*columns[1:])))
+
+    def save_snapshot(self) -> bool:
+        """Атомарно записывает снимок очков (временный файл + os.replace)."""
+        if not self.snapshot_path or not self._loaded:
+            return False
+        with self._lock:
+            items = list(self._scores.items())
+            self._changed = False
+        columns = [array('q', (user_id for user_id, _ in items))]
+        columns += [array('q', (values[index] for _, values in items)) for index in range(len(BOARDS))]
+        header = {
+            'format': SNAPSHOT_FORMAT,
+            'boards': list(BOARDS),
+            'players': len(items),
+            'created_at': datetime.utcnow().isoformat(),
+        }
+        os.makedirs(os.path.dirname(self.snapshot_path) or '.', exist_ok=True)
+        temporary_path = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        with open(temporary_path, 'wb') as snapshot_file:
+            snapshot_file.write(json.dumps(header).encode() + b'\n')
+            for column in columns:
+                column.tofile(snapshot_file)
+        os.replace(temporary_path, self.snapshot_path)
+        return True
+
+    # --- Фоновое обслуживание ---
+
+    def _ensure_worker(self):
+        # Поток создается при первой загрузке, а не в create_app,
+        # чтобы не наследоваться процессами, форкнутыми после создания приложения
+        if self._worker is not None or not (self.snapshot_path or self.rebuild_interval):
+            return
+        self._worker = threading.Thread(target=self._maintenance_loop, daemon=True)
+        self._worker.start()
+        atexit.register(self.close)
+
+    def _maintenance_loop(self):
+        intervals = [interval for interval in (self.snapshot_interval, self.rebuild_interval) if interval > 0]
+        if not intervals:
+            return
+        logger.info(f"Leaderboard maintenance started (snapshot={self.snapshot_interval}s, "
+                    f"rebuild={self.rebuild_interval}s).")
+        last_rebuild = time.monotonic()
+        while not self._wakeup.wait(min(intervals)):
+            try:
+                if self.rebuild_interval and time.monotonic() - last_rebuild >= self.rebuild_interval:
+                    self.rebuild()
+                    last_rebuild = time.monotonic()
+                if self.snapshot_interval and self._changed:
+                    self.save_snapshot()
+            except Exception as e:
+                logger.error(f"[!] Leaderboard maintenance failed: {e}", exc_info=True)
+
+    def close(self):
+        """Останавливает фоновый поток и сохраняет снимок, если были изменения."""
+        self._wakeup.set()
+        if self._changed:
+            self.save_snapshot()
+
+
+def get_leaderboards() -> Leaderboards:
+    """Рейтинги текущего приложения."""
+    return current_app.extensions['leaderboards']
@@ -1,13 +1,27 @@
 # game_service/models.py
 from . import db
+from .economy import PRODUCTION_PER_LEVEL, base_rate
 from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
 
 class Resources(db.Model):
     __tablename__ = 'resources'
     user_id = db.Column(db.Integer, primary_key=True)
+    # Балансы на момент контрольной точки (см. economy.py)
     wood = db.Column(db.Integer, default=0)
     stone = db.Column(db.Integer, default=0)
     gold = db.Column(db.Integer, default=0)
+    # Производство в час, вычисляется по уровням зданий
+    wood_rate = db.Column(db.Integer, default=base_rate('wood'))
+    stone_rate = db.Column(db.Integer, default=base_rate('stone'))
+    gold_rate = db.Column(db.Integer, default=base_rate('gold'))
+    # Неначисленные доли единиц ресурсов к контрольной точке (ресурс * сек. / час)
+    wood_carry = db.Column(db.Integer, default=0)
+    stone_carry = db.Column(db.Integer, default=0)
+    gold_carry = db.Column(db.Integer, default=0)
+    # Время контрольной точки, от которого идет начисление
     last_collected = db.Column(db.DateTime, default=datetime.utcnow)
 
 class Buildings(db.Model):
@@ -16,3 +30,21 @@ class Buildings(db.Model):
     sawmill_level = db.Column(db.Integer, default=1)
     quarry_level = db.Column(db.Integer, default=1)
     mine_level = db.Column(db.Integer, default=1)
+
+
+def backfill_production_rates(connection, added: dict):
+    """
+    Шаг обновления схемы (shared/schema.py): если колонки скоростей только что
+    добавлены в старую таблицу resources, заполняет их по уровням зданий,
+    иначе все старые игроки получили бы базовую скорость.
+    """
+    rate_columns = [f'{resource}_rate' for resource in PRODUCTION_PER_LEVEL]
+    if not set(rate_columns) & set(added.get(Resources.__tablename__, ())):
+        return
+    assignments = ', '.join(
+        f"{resource}_rate = COALESCE((SELECT b.{level_field} FROM buildings b "
+        f"WHERE b.user_id = resources.user_id), 1) * {per_level}"
+        for resource, (level_field, per_level) in PRODUCTION_PER_LEVEL.items()
+    )
+    result = connection.exec_driver_sql(f"UPDATE resources SET {assignments}")
+    logger.info(f"Backfilled production rates of {result.rowcount} player(s) from building levels.")
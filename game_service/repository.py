@@ -0,0 +1,277 @@
+# game_service/repository.py
+
+"""
+Репозиторий игровых данных игрока.
+
+Единая точка доступа роутов и консьюмера к ресурсам и зданиям игрока:
+    - чтение одним запросом (resources JOIN buildings);
+    - создание недостающих строк одним идемпотентным INSERT на таблицу;
+    - неизменяемое представление PlayerSnapshot для роутов и шаблонов.
+
+Кэш состояния (state_cache.PlayerStateCache) подключен здесь же, поэтому
+роуты не знают, откуда пришли данные - из памяти или из БД. Здесь же
+о действиях игрока узнают подписчики SSE и рейтинги (leaderboard.Leaderboards).
+"""
+
+from typing import NamedTuple, Optional
+from datetime import datetime
+from functools import lru_cache
+
+from flask import current_app
+from sqlalchemy import Integer, bindparam, case, cast, func, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from . import db
+from .economy import PRODUCTION_PER_LEVEL, SECONDS_PER_HOUR, upgrade_building
+from .models import Resources, Buildings
+
+RESOURCE_COLUMNS = (
+    Resources.user_id,
+    Resources.wood, Resources.stone, Resources.gold,
+    Resources.wood_rate, Resources.stone_rate, Resources.gold_rate,
+    Resources.wood_carry, Resources.stone_carry, Resources.gold_carry,
+    Resources.last_collected,
+)
+BUILDING_COLUMNS = (Buildings.sawmill_level, Buildings.quarry_level, Buildings.mine_level)
+SNAPSHOT_COLUMNS = RESOURCE_COLUMNS + BUILDING_COLUMNS
+
+
+class PlayerSnapshot(NamedTuple):
+    """Неизменяемый снимок состояния игрока."""
+    user_id: int
+    wood: int
+    stone: int
+    gold: int
+    wood_rate: int
+    stone_rate: int
+    gold_rate: int
+    wood_carry: int
+    stone_carry: int
+    gold_carry: int
+    last_collected: datetime
+    sawmill_level: int
+    quarry_level: int
+    mine_level: int
+
+    @classmethod
+    def from_state(cls, state) -> 'PlayerSnapshot':
+        """Снимок из любого объекта с полями состояния (например, PlayerState)."""
+        return cls(*(getattr(state, field) for field in cls._fields))
+
+    @property
+    def rates(self) -> dict:
+        return {'wood': self.wood_rate, 'stone': self.stone_rate, 'gold': self.gold_rate}
+
+    @property
+    def carry(self) -> dict:
+        return {'wood': self.wood_carry or 0, 'stone': self.stone_carry or 0, 'gold': self.gold_carry or 0}
+
+    @property
+    def buildings(self) -> dict:
+        return {
+            'sawmill_level': self.sawmill_level,
+            'quarry_level': self.quarry_level,
+            'mine_level': self.mine_level,
+        }
+
+
+def load_snapshot(session, user_id: int) -> Optional[PlayerSnapshot]:
+    """
+    Загружает ресурсы и здания игрока одним запросом.
+
+    Returns:
+        PlayerSnapshot или None, если у игрока нет одной из строк.
+    """
+    row = session.execute(
+        select(*SNAPSHOT_COLUMNS)
+        .join(Buildings, Buildings.user_id == Resources.user_id)
+        .where(Resources.user_id == user_id)
+    ).first()
+    return PlayerSnapshot(*row) if row is not None else None
+
+
+def ensure_player_rows(user_ids):
+    """
+    Идемпотентно создает строки Resources и Buildings для указанных игроков.
+
+    Выполняет по одному bulk INSERT OR IGNORE (ON CONFLICT DO NOTHING) на таблицу,
+    поэтому уже существующие строки не трогаются, а гонки между консьюмером
+    и созданием "на лету" в game_page не приводят к IntegrityError.
+    Commit остается за вызывающим кодом.
+
+    Args:
+        user_ids: Итерируемый набор ID пользователей.
+    """
+    rows = [{'user_id': user_id} for user_id in dict.fromkeys(user_ids)]
+    if not rows:
+        return
+    db.session.execute(sqlite_insert(Resources).on_conflict_do_nothing(index_elements=['user_id']), rows)
+    db.session.execute(sqlite_insert(Buildings).on_conflict_do_nothing(index_elements=['user_id']), rows)
+
+
+class PlayerRepository:
+    """
+    Доступ к состоянию игроков через кэш состояния.
+
+    Args:
+        cache: Экземпляр PlayerStateCache.
+        events: PlayerEventHub, которому публикуются снимки после записи (необязательно).
+        leaderboards: Leaderboards, в которых обновляются очки игрока после
+                      сбора и записи (необязательно).
+    """
+
+    def __init__(self, cache, events=None, leaderboards=None):
+        self.cache = cache
+        self.events = events
+        self.leaderboards = leaderboards
+
+    def _observed(self, user_id: int, snapshot):
+        if snapshot is not None and self.leaderboards is not None:
+            self.leaderboards.observe(user_id, snapshot)
+        return snapshot
+
+    def _published(self, user_id: int, snapshot):
+        if snapshot is not None and self.events is not None:
+            self.events.publish(user_id, snapshot)
+        return self._observed(user_id, snapshot)
+
+    def get(self, user_id: int, create: bool = False) -> Optional[PlayerSnapshot]:
+        """
+        Возвращает снимок состояния игрока.
+
+        Args:
+            user_id: ID игрока.
+            create: Создать недостающие строки, если данных игрока нет.
+        """
+        snapshot = self.cache.get(user_id)
+        if snapshot is None and create:
+            self.provision([user_id])
+            snapshot = self.cache.get(user_id)
+        return snapshot
+
+    def collect(self, user_id: int) -> Optional[PlayerSnapshot]:
+        """
+        Сбор ресурсов: ресурсы начисляются непрерывно, поэтому в БД ничего не
+        пишется, а текущий баланс игрока только фиксируется в рейтингах.
+        """
+        return self._observed(user_id, self.cache.get(user_id))
+
+    def update(self, user_id: int, mutation) -> Optional[PlayerSnapshot]:
+        """
+        Изменяет состояние игрока.
+
+        Args:
+            user_id: ID игрока.
+            mutation: Функция, изменяющая изменяемую запись состояния на месте
+                      (например, economy.upgrade_building).
+
+        Returns:
+            Снимок после изменения или None, если данных игрока нет.
+        """
+        return self._published(user_id, self.cache.mutate(user_id, mutation))
+
+    def upgrade_building(self, user_id: int, building_type: str) -> Optional[PlayerSnapshot]:
+        """
+        Повышает уровень здания игрока с фиксацией накопленных ресурсов.
+
+        С включенным кэшем изменение атомарно в памяти процесса. Без кэша
+        (несколько процессов пишут в одну БД) выполняется двумя UPDATE ... RETURNING
+        в одной транзакции, без чтения строк в Python, поэтому параллельные
+        улучшения не теряются.
+        """
+        if self.cache.enabled:
+            snapshot = self.cache.mutate(user_id, lambda player: upgrade_building(player, building_type))
+        else:
+            snapshot = self._upgrade_building_sql(user_id, building_type)
+        return self._published(user_id, snapshot)
+
+    def _upgrade_building_sql(self, user_id: int, building_type: str, now: datetime = None) -> Optional[PlayerSnapshot]:
+        upgrade_levels, checkpoint_resources = _upgrade_statements(building_type)
+        # Core-выполнение на соединении сессии: без синхронизации ORM identity map
+        connection = db.session.connection()
+        levels = connection.execute(upgrade_levels, {'player_id': user_id}).first()
+        if levels is None:
+            db.session.rollback()
+            return None
+        resources = connection.execute(
+            checkpoint_resources, {'player_id': user_id, 'now': now or datetime.utcnow()}
+        ).first()
+        if resources is None:
+            db.session.rollback()
+            return None
+        db.session.commit()
+        return PlayerSnapshot(*resources, *levels)
+
+    def provision(self, user_ids):
+        """Создает недостающие строки игроков и фиксирует транзакцию."""
+        ensure_player_rows(user_ids)
+        db.session.commit()
+
+
+def elapsed_seconds_sql(since, now):
+    """
+    SQL-выражение economy.elapsed_seconds: целые секунды от since до now.
+
+    Значения DateTime хранятся как 'YYYY-MM-DD HH:MM:SS.ffffff': секунды
+    берутся из strftime('%s'), а микросекунды сравниваются как строки
+    фиксированной длины, поэтому результат точный (без julianday).
+    """
+    whole = cast(func.strftime('%s', now), Integer) - cast(func.strftime('%s', since), Integer)
+    borrow = case((func.substr(now, 20) < func.substr(since, 20), 1), else_=0)
+    return func.max(0, func.coalesce(whole - borrow, 0))
+
+
+def advanced_checkpoint_sql(since, elapsed, now):
+    """SQL: контрольная точка since, сдвинутая на elapsed целых секунд (now, если точки нет)."""
+    modifier = func.printf('+%d seconds', elapsed)
+    shifted = func.strftime('%Y-%m-%d %H:%M:%S', since, modifier, type_=db.String).concat(func.substr(since, 20))
+    return func.coalesce(shifted, now)
+
+
+@lru_cache(maxsize=None)
+def _upgrade_statements(building_type: str):
+    """
+    Строит (один раз на тип здания) атомарные UPDATE ... RETURNING для улучшения:
+    повышение уровня и фиксацию начисленных ресурсов с пересчетом скоростей.
+    """
+    buildings = Buildings.__table__
+    resources = Resources.__table__
+    level = buildings.c[f'{building_type}_level']
+    upgrade_levels = (
+        update(buildings)
+        .where(buildings.c.user_id == bindparam('player_id'))
+        .values({level: level + 1})
+        .returning(*(buildings.c[column.key] for column in BUILDING_COLUMNS))
+    )
+
+    # Формула производства в SQL (как economy.checkpoint): значения в SET берутся
+    # из строки до изменения, поэтому начисление идет по старой скорости,
+    # а новая скорость - по новым уровням
+    now = bindparam('now', type_=db.DateTime)
+    since = resources.c.last_collected
+    elapsed = elapsed_seconds_sql(since, now)
+    values = {since: advanced_checkpoint_sql(since, elapsed, now)}
+    for resource, (level_field, per_level) in PRODUCTION_PER_LEVEL.items():
+        amount = resources.c[resource]
+        rate = resources.c[f'{resource}_rate']
+        carry = resources.c[f'{resource}_carry']
+        produced = func.coalesce(carry, 0) + rate * elapsed
+        values[amount] = amount + produced // SECONDS_PER_HOUR
+        values[carry] = produced % SECONDS_PER_HOUR
+        values[rate] = (
+            select(buildings.c[level_field] * per_level)
+            .where(buildings.c.user_id == bindparam('player_id'))
+            .scalar_subquery()
+        )
+    checkpoint_resources = (
+        update(resources)
+        .where(resources.c.user_id == bindparam('player_id'))
+        .values(values)
+        .returning(*(resources.c[column.key] for column in RESOURCE_COLUMNS))
+    )
+    return upgrade_levels, checkpoint_resources
+
+
+def get_player_repository() -> PlayerRepository:
+    """Репозиторий игроков текущего приложения."""
+    return current_app.extensions['player_repository']
@@ -1,13 +1,13 @@
 # game_service/routes.py
 
 from flask import Blueprint, request, render_template, redirect, url_for, flash, current_app
-from datetime import datetime, timedelta
 from sqlalchemy.exc import SQLAlchemyError
-from .models import Resources, Buildings
-from .utils import verify_jwt_token, process_user_created_message
+from .economy import BUILDING_TYPES, current_balance
+from .repository import get_player_repository
+from .utils import verify_jwt_token
 from . import db
 import logging
-from flasgger import swag_from
+from shared.swagger_config import swag_from
 
 game_bp = Blueprint('game_bp', __name__, template_folder='templates', static_folder='static')
 logger = logging.getLogger(__name__)
@@ -60,71 +60,37 @@ def game_page():
         logger.error(f"Could not convert user ID from token ('sub': {user_data.get('sub')}) to int: {e}")
         return render_template("error.html", message="Invalid user ID format in token", token=token), 401
 
-    user_resources = db.session.get(Resources, user_id)
-    user_buildings = db.session.get(Buildings, user_id)
-
-    if not user_resources or not user_buildings:
-        logger.warning(f"Game data not found for user {username} (ID: {user_id}). Attempting to create on-the-fly.")
-        try:
-            needs_commit = False
-            if not user_resources:
-                new_resources = Resources(user_id=user_id)
-                db.session.add(new_resources)
-                needs_commit = True
-            if not user_buildings:
-                new_buildings = Buildings(user_id=user_id)
-                db.session.add(new_buildings)
-                needs_commit = True
-
-            if needs_commit:
-                db.session.commit()
-                logger.info(f"Successfully created missing game data for user {username} (ID: {user_id}) on-the-fly.")
-                user_resources = db.session.get(Resources, user_id)
-                user_buildings = db.session.get(Buildings, user_id)
-
-            if not user_resources or not user_buildings:
+    players = get_player_repository()
+    try:
+        snapshot = players.get(user_id)
+        if not snapshot:
+            # Консьюмер user_created еще не успел создать данные - создаем идемпотентно
+            logger.warning(f"Game data not found for user {username} (ID: {user_id}). Attempting to create on-the-fly.")
+            snapshot = players.get(user_id, create=True)
+            if not snapshot:
                 logger.error(f"Failed to create or fetch game data for user {username} (ID: {user_id}) even after attempting creation.")
                 return render_template("error.html", message="Failed to initialize user game data.", token=token), 500
+            logger.info(f"Successfully created missing game data for user {username} (ID: {user_id}) on-the-fly.")
 
-        except SQLAlchemyError as e:
-            db.session.rollback()
-            logger.error(f"Database error creating game data on-the-fly for user {username} (ID: {user_id}): {e}", exc_info=True)
-            return render_template("error.html", message="Error initializing user game data (DB).", token=token), 500
-        except Exception as e:
-            db.session.rollback()
-            logger.error(f"Unexpected error creating game data on-the-fly for user {username} (ID: {user_id}): {e}", exc_info=True)
-            return render_template("error.html", message="Error initializing user game data (Server).", token=token), 500
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logger.error(f"Database error loading game data for user {username} (ID: {user_id}): {e}", exc_info=True)
+        return render_template("error.html", message="Error initializing user game data (DB).", token=token), 500
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Unexpected error loading game data for user {username} (ID: {user_id}): {e}", exc_info=True)
+        return render_template("error.html", message="Error initializing user game data (Server).", token=token), 500
 
-    now = datetime.utcnow()
-    can_collect = True
-    if user_resources.last_collected:
-        try:
-            if isinstance(user_resources.last_collected, datetime):
-                can_collect = (now - user_resources.last_collected) >= timedelta(hours=1)
-            else:
-                logger.warning(f"last_collected for user {user_id} is not a datetime object: {user_resources.last_collected}")
-                user_resources.last_collected = now
-                db.session.commit()
-                can_collect = False
-        except TypeError as e:
-            logger.error(f"TypeError comparing datetimes for user {user_id}. Now: {now}, Last Collected: {user_resources.last_collected}. Error: {e}")
-            can_collect = False
+    # Баланс считается "на лету" от контрольной точки, запись в БД не нужна
+    balance = current_balance(snapshot)
 
     return render_template(
         'game.html',
         username=username,
-        resources={
-            'wood': user_resources.wood,
-            'stone': user_resources.stone,
-            'gold': user_resources.gold
-        },
-        buildings={
-            'sawmill_level': user_buildings.sawmill_level,
-            'quarry_level': user_buildings.quarry_level,
-            'mine_level': user_buildings.mine_level
-        },
-        token=token,
-        can_collect=can_collect
+        resources=balance,
+        rates=snapshot.rates,
+        buildings=snapshot.buildings,
+        token=token
     )
 
 @game_bp.route('/collect_resources', methods=['POST'])
@@ -163,24 +129,18 @@ def collect_resources():
         return render_template("error.html", message="Invalid token", token=token), 401
 
     user_id = int(user_data['sub'])
-    user_resources = db.session.get(Resources, user_id)
-    user_buildings = db.session.get(Buildings, user_id)
+    snapshot = get_player_repository().collect(user_id)
 
-    if not user_resources or not user_buildings:
+    if not snapshot:
         return render_template("error.html", message="User data not found", token=token), 404
 
-    now = datetime.utcnow()
-    if (now - user_resources.last_collected) < timedelta(hours=1):
-        flash("Вы уже собирали ресурсы в течение последнего часа.", "warning")
-        return redirect(url_for('game_bp.game_page', token=token))
-
-    user_resources.wood += user_buildings.sawmill_level * 10
-    user_resources.stone += user_buildings.quarry_level * 5
-    user_resources.gold += user_buildings.mine_level * 2
-    user_resources.last_collected = now
-
-    db.session.commit()
-    flash("Ресурсы успешно собраны!", "success")
+    # Ресурсы начисляются непрерывно: сбор только показывает текущий баланс,
+    # без записи в БД и без блокировки строки.
+    balance = current_balance(snapshot)
+    flash(
+        f"Ресурсы собраны! Дерево: {balance['wood']}, камень: {balance['stone']}, золото: {balance['gold']}.",
+        "success"
+    )
     return redirect(url_for('game_bp.game_page', token=token))
 
 @game_bp.route('/build/<building_type>', methods=['POST'])
@@ -229,21 +189,15 @@ def build_building(building_type):
         return render_template("error.html", message="Invalid token", token=token), 401
 
     user_id = int(user_data['sub'])
-    valid_buildings = ['sawmill', 'quarry', 'mine']
-    if building_type not in valid_buildings:
+    if building_type not in BUILDING_TYPES:
         flash("Указан недопустимый тип здания", "error")
         return redirect(url_for('game_bp.game_page', token=token))
 
-    user_buildings = db.session.get(Buildings, user_id)
-    user_resources = db.session.get(Resources, user_id)
-    if not user_buildings or not user_resources:
+    snapshot = get_player_repository().upgrade_building(user_id, building_type)
+    if not snapshot:
         flash("User data not found.", "error")
         return render_template("error.html", message="User data not found", token=token), 404
 
-    current_level = getattr(user_buildings, f'{building_type}_level')
-    setattr(user_buildings, f'{building_type}_level', current_level + 1)
-
-    db.session.commit()
     flash(f"{building_type.capitalize()} level increased successfully!", "success")
     return redirect(url_for('game_bp.game_page', token=token))
 
@@ -255,7 +209,8 @@ def logout():
       - Game
     responses:
       302:
-        description: Redirect to auth service login page
+        description: Redirect to auth service logout (revokes the refresh token)
     """
     flash("Вы успешно вышли из системы.", "info")
-    return redirect("http://localhost:5000/login")
\ No newline at end of file
+    auth_service_url = current_app.config.get('AUTH_SERVICE_URL', 'http://localhost:5000')
+    return redirect(f"{auth_service_url}/logout")
\ No newline at end of file
@@ -0,0 +1,303 @@
+# game_service/state_cache.py
+
+"""
+Кэш состояния игроков в памяти процесса с отложенной записью (write-behind).
+
+Роуты читают и изменяют состояние игрока в памяти, а фоновый поток раз в
+PLAYER_STATE_FLUSH_INTERVAL секунд записывает все измененные записи в БД
+одной транзакцией. Несколько изменений одного игрока между сбросами
+превращаются в одну запись. При завершении процесса выполняется
+финальный сброс.
+
+Окно возможной потери данных при аварийном завершении - один интервал сброса.
+Кэш предполагает, что этот процесс - единственный, кто изменяет строки
+игроков; при PLAYER_STATE_CACHE_SIZE = 0 кэш работает в режиме
+"сквозной" записи и ничего не хранит.
+
+Чтобы массовые изменения в обход кэша (тик мира, world_tick.py) не
+перезаписывались отложенной записью, кэш с первого обращения к БД и до
+завершения процесса держит межпроцессную блокировку OWNER_LOCK_NAME рядом
+с файлом БД (shared/locks.py): тик отказывается запускаться, пока она
+занята. Если блокировку держит другой процесс (идущий тик или старый воркер,
+который завершается после перезагрузки), запрос ждет ее не дольше
+PLAYER_STATE_LOCK_TIMEOUT секунд и затем выполняется в режиме сквозной
+записи; следующие запросы пробуют захватить блокировку без ожидания,
+и кэш включается, как только она освободится.
+"""
+
+import atexit
+import logging
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import update
+
+from shared.locks import FileLock
+from shared.storage import read_session
+
+from . import db
+from .models import Resources, Buildings
+from .repository import PlayerSnapshot, load_snapshot
+
+logger = logging.getLogger(__name__)
+
+RESOURCE_FIELDS = (
+    'wood', 'stone', 'gold', 'wood_rate', 'stone_rate', 'gold_rate',
+    'wood_carry', 'stone_carry', 'gold_carry', 'last_collected',
+)
+BUILDING_FIELDS = ('sawmill_level', 'quarry_level', 'mine_level')
+OWNER_LOCK_NAME = 'player-state'
+
+
+class PlayerState:
+    """Компактная запись состояния игрока: ресурсы, скорости, контрольная точка и уровни зданий."""
+
+    __slots__ = ('user_id',) + RESOURCE_FIELDS + BUILDING_FIELDS
+
+    def __init__(self, user_id, **fields):
+        self.user_id = user_id
+        for name in RESOURCE_FIELDS + BUILDING_FIELDS:
+            setattr(self, name, fields.get(name))
+
+    @classmethod
+    def from_snapshot(cls, snapshot) -> 'PlayerState':
+        return cls(**snapshot._asdict())
+
+    def resources_row(self) -> dict:
+        row = {name: getattr(self, name) for name in RESOURCE_FIELDS}
+        row['user_id'] = self.user_id
+        return row
+
+    def buildings_row(self) -> dict:
+        row = {name: getattr(self, name) for name in BUILDING_FIELDS}
+        row['user_id'] = self.user_id
+        return row
+
+
+class PlayerStateCache:
+    """
+    LRU-кэш PlayerState по user_id с отложенной пакетной записью в БД.
+
+    Args:
+        app: Экземпляр Flask приложения (контекст для фонового сброса).
+        maxsize: Максимальное число игроков в памяти. 0 - без кэширования.
+        flush_interval: Интервал фонового сброса изменений (сек.).
+        lock_path: Файл межпроцессной блокировки владельца строк игроков
+                   (None - без блокировки, например для БД в памяти).
+        lock_timeout: Сколько запрос ждет блокировку владельца, прежде чем
+                      выполниться в режиме сквозной записи (сек.).
+    """
+
+    def __init__(self, app, maxsize: int = 10000, flush_interval: float = 1.0, lock_path: str = None,
+                 lock_timeout: float = 2.0):
+        self.app = app
+        self.maxsize = maxsize
+        self.flush_interval = flush_interval
+        self.owner_lock = FileLock(lock_path) if lock_path else None
+        self.lock_timeout = lock_timeout
+        self._lock_waited = False  # Ожидание блокировки уже истекало - дальше без ожидания
+        self._entries = OrderedDict()
+        self._evicted = {}  # Вытесненные, но еще не записанные в БД записи
+        self._dirty = set()
+        self._flushing = set()  # Записи, которые сейчас записываются в БД
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()  # Сбросы (фоновый и финальный) не должны пересекаться
+        self._wakeup = threading.Event()
+        self._flusher = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    def _claim(self) -> bool:
+        """
+        Захватывает блокировку владельца перед первым чтением в кэш.
+
+        Returns:
+            True, если кэш можно использовать; False - блокировку держит
+            другой процесс, запрос выполняется в режиме сквозной записи.
+        """
+        if self.owner_lock is None or self.owner_lock.held:
+            return True
+        if self.owner_lock.acquire(blocking=False):
+            logger.info(f"Player state cache owns {self.owner_lock.path}.")
+            return True
+        if self._lock_waited:
+            return False
+        logger.warning(f"Player rows are locked by process {self.owner_lock.owner_pid()} "
+                       f"(world tick or previous worker), waiting up to {self.lock_timeout}s for {self.owner_lock.path}.")
+        if self.owner_lock.acquire(timeout=self.lock_timeout):
+            logger.info(f"Player state cache owns {self.owner_lock.path}.")
+            return True
+        self._lock_waited = True
+        logger.warning(f"Player state cache is off (write-through) until {self.owner_lock.path} is released.")
+        return False
+
+    def _load(self, user_id):
+        with read_session() as session:
+            snapshot = load_snapshot(session, user_id)
+        return PlayerState.from_snapshot(snapshot) if snapshot is not None else None
+
+    def _cached(self, user_id):
+        """Запись из памяти (с учетом вытесненных, но не записанных). Вызывать под блокировкой."""
+        state = self._entries.get(user_id)
+        if state is not None:
+            self._entries.move_to_end(user_id)
+            return state
+        state = self._evicted.pop(user_id, None)
+        if state is not None:
+            self._insert(user_id, state)
+        return state
+
+    def _insert(self, user_id, state):
+        """Добавляет запись с вытеснением самых старых. Вызывать под блокировкой."""
+        self._entries[user_id] = state
+        while len(self._entries) > self.maxsize:
+            evicted_id, evicted_state = self._entries.popitem(last=False)
+            if evicted_id in self._dirty or evicted_id in self._flushing:
+                self._evicted[evicted_id] = evicted_state
+        return state
+
+    def _with_state(self, user_id, action):
+        """
+        Выполняет action(state) под блокировкой над записью из кэша.
+        При промахе запись загружается из БД без удержания блокировки.
+        """
+        with self._lock:
+            state = self._cached(user_id)
+            if state is not None:
+                return action(state)
+
+        loaded = self._load(user_id)
+        if loaded is None:
+            return None
+        with self._lock:
+            state = self._cached(user_id) or self._insert(user_id, loaded)
+            return action(state)
+
+    def get(self, user_id):
+        """Возвращает PlayerSnapshot игрока или None, если данных игрока нет."""
+        if not self.enabled or not self._claim():
+            with read_session() as session:
+                return load_snapshot(session, user_id)
+        return self._with_state(user_id, PlayerSnapshot.from_state)
+
+    def mutate(self, user_id, mutation):
+        """
+        Применяет изменение к состоянию игрока и ставит его в очередь на запись.
+
+        Args:
+            user_id: ID игрока.
+            mutation: Функция, принимающая PlayerState и изменяющая его на месте.
+
+        Returns:
+            PlayerSnapshot после изменения или None, если данных игрока нет.
+        """
+        if not self.enabled or not self._claim():
+            state = self._load(user_id)
+            if state is None:
+                return None
+            mutation(state)
+            self._write([state.resources_row()], [state.buildings_row()])
+            return PlayerSnapshot.from_state(state)
+
+        def apply(state):
+            mutation(state)
+            self._dirty.add(user_id)
+            return PlayerSnapshot.from_state(state)
+
+        result = self._with_state(user_id, apply)
+        if result is not None:
+            self._ensure_flusher()
+        return result
+
+    def _write(self, resources_rows, buildings_rows):
+        db.session.execute(update(Resources), resources_rows)
+        db.session.execute(update(Buildings), buildings_rows)
+        db.session.commit()
+
+    def flush(self) -> int:
+        """
+        Записывает все измененные состояния в БД одной транзакцией.
+        Должна вызываться внутри app_context.
+
+        Returns:
+            Количество записанных игроков.
+        """
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self) -> int:
+        with self._lock:
+            if not self._dirty:
+                return 0
+            dirty_ids = set(self._dirty)
+            states = [self._entries.get(user_id) or self._evicted[user_id] for user_id in dirty_ids]
+            # Строки для записи формируются под блокировкой - это согласованный снимок
+            resources_rows = [state.resources_row() for state in states]
+            buildings_rows = [state.buildings_row() for state in states]
+            self._flushing = dirty_ids
+            self._dirty.clear()
+
+        try:
+            self._write(resources_rows, buildings_rows)
+        except Exception:
+            db.session.rollback()
+            with self._lock:
+                self._dirty |= dirty_ids
+                self._flushing = set()
+            raise
+
+        with self._lock:
+            self._flushing = set()
+            # Вытесненные записи больше не нужны, если их не изменили заново во время записи
+            for user_id in [user_id for user_id in self._evicted if user_id not in self._dirty]:
+                del self._evicted[user_id]
+        logger.debug(f"Flushed state of {len(states)} player(s) to DB.")
+        return len(states)
+
+    def invalidate(self) -> int:
+        """
+        Записывает изменения и забывает все записи, чтобы следующие обращения
+        перечитали состояние из БД (после массовых изменений в обход кэша).
+        Записи, измененные во время сброса, остаются в кэше до следующего сброса.
+        Должна вызываться внутри app_context.
+
+        Returns:
+            Количество записанных игроков.
+        """
+        with self._flush_lock:
+            flushed = self._flush()
+            with self._lock:
+                for user_id in [user_id for user_id in self._entries if user_id not in self._dirty]:
+                    del self._entries[user_id]
+        return flushed
+
+    def _ensure_flusher(self):
+        # Поток создается при первом изменении, а не в create_app,
+        # чтобы не наследоваться процессами, форкнутыми после создания приложения
+        if self._flusher is None:
+            with self._lock:
+                if self._flusher is None:
+                    self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+                    self._flusher.start()
+                    atexit.register(self.close)
+
+    def _flush_loop(self):
+        logger.info(f"Player state flusher started (interval={self.flush_interval}s).")
+        while not self._wakeup.wait(self.flush_interval):
+            try:
+                with self.app.app_context():
+                    self.flush()
+            except Exception as e:
+                logger.error(f"[!] Failed to flush player state: {e}", exc_info=True)
+
+    def close(self):
+        """Останавливает фоновый поток, записывает оставшиеся изменения и снимает блокировку."""
+        self._wakeup.set()
+        with self.app.app_context():
+            flushed = self.flush()
+        if flushed:
+            logger.info(f"Flushed state of {flushed} player(s) on shutdown.")
+        if self.owner_lock is not None:
+            self.owner_lock.release()
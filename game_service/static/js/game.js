@@ -1,50 +1,145 @@
 document.addEventListener("DOMContentLoaded", () => {
+    const API_STATE_URL = '/api/v1/state';
+    const API_STREAM_URL = '/api/v1/stream';
+    const POLL_INTERVAL_MS = 30000;
+    const RESOURCES = ['wood', 'stone', 'gold'];
+    const BUILDINGS = ['sawmill', 'quarry', 'mine'];
+
+    // Последнее состояние с сервера, его ETag и разница часов клиента и сервера
+    let state = null;
+    let etag = null;
+    let clockOffsetMs = 0;
+
     function getToken() {
-        return localStorage.getItem('jwt') || 
+        const input = document.querySelector('input[name="token"]');
+        return (input && input.value) || localStorage.getItem('jwt') ||
                document.cookie.replace(/(?:(?:^|.*;\s*)access_token\s*=\s*([^;]*).*$)|^.*$/, '$1');
     }
 
-    async function loadResources() {
-        try {
-            const response = await fetch('/resources', {
-                headers: { 'Authorization': `Bearer ${getToken()}` }
-            });
+    function setText(element, value) {
+        if (element) {
+            element.textContent = value;
+        }
+    }
 
-            if (response.ok) {
-                const data = await response.json();
-                document.getElementById('wood').textContent = data.wood;
-                document.getElementById('stone').textContent = data.stone;
-                document.getElementById('gold').textContent = data.gold;
-            }
-        } catch (error) {
-            console.error('Ошибка загрузки ресурсов:', error);
+    function applyState(data) {
+        state = data;
+        clockOffsetMs = Date.parse(data.server_time) - Date.now();
+        RESOURCES.forEach(resource => setText(document.getElementById(`${resource}-rate`), data.rates[resource]));
+        BUILDINGS.forEach(building => {
+            const level = data.buildings[`${building}_level`];
+            setText(document.getElementById(building), level);
+            document.querySelectorAll(`[data-level="${building}"]`).forEach(element => setText(element, level));
+        });
+        renderBalances();
+    }
+
+    // Балансы растут непрерывно: досчитываем их по скорости от контрольной точки
+    function renderBalances() {
+        if (!state) {
+            return;
         }
+        const now = Date.now() + clockOffsetMs;
+        const elapsed = Math.max(0, Math.floor((now - Date.parse(state.checkpoint_at)) / 1000));
+        RESOURCES.forEach(resource => {
+            const carry = (state.carry && state.carry[resource]) || 0;
+            const amount = state.checkpoint[resource] + Math.floor((carry + state.rates[resource] * elapsed) / 3600);
+            setText(document.getElementById(resource), amount);
+        });
     }
 
-    document.getElementById('collect-btn').addEventListener('click', async () => {
-        try {
-            const response = await fetch('/collect_resources', {
-                method: 'POST',
-                headers: {
-                    'Authorization': `Bearer ${getToken()}`,
-                    'Content-Type': 'application/json'
-                }
-            });
+    // Дельта SSE: вложенные объекты (rates, buildings, ...) обновляются по ключам
+    function mergeDelta(delta) {
+        const merged = Object.assign({}, state);
+        Object.entries(delta).forEach(([key, value]) => {
+            merged[key] = (value && typeof value === 'object')
+                ? Object.assign({}, state[key], value)
+                : value;
+        });
+        return merged;
+    }
+
+    async function apiRequest(url, options = {}) {
+        const headers = Object.assign({ 'Authorization': `Bearer ${getToken()}` }, options.headers || {});
+        return fetch(url, Object.assign({}, options, { headers }));
+    }
 
-            const result = await response.json();
+    async function loadState() {
+        try {
+            const headers = etag ? { 'If-None-Match': etag } : {};
+            const response = await apiRequest(API_STATE_URL, { headers });
+            if (response.status === 304) {
+                return;
+            }
             if (response.ok) {
-                document.getElementById('wood').textContent = result.resources.wood;
-                document.getElementById('stone').textContent = result.resources.stone;
-                document.getElementById('gold').textContent = result.resources.gold;
-                document.getElementById('message').textContent = 'Ресурсы собраны!';
-            } else {
-                document.getElementById('message').textContent = result.message || 'Ошибка';
+                etag = response.headers.get('ETag');
+                applyState(await response.json());
             }
         } catch (error) {
-            console.error('Ошибка:', error);
+            console.error('Ошибка загрузки состояния:', error);
         }
+    }
+
+    // Формы действий отправляются одним запросом к JSON API вместо POST -> redirect -> render.
+    // Без JavaScript формы продолжают работать через обычные HTML-роуты.
+    document.querySelectorAll('form[data-api-action]').forEach(form => {
+        form.addEventListener('submit', async event => {
+            event.preventDefault();
+            try {
+                const response = await apiRequest(form.dataset.apiAction, { method: 'POST' });
+                const result = await response.json();
+                if (response.ok) {
+                    etag = response.headers.get('ETag');
+                    applyState(result);
+                    setText(document.getElementById('message'), 'Готово!');
+                } else {
+                    setText(document.getElementById('message'), result.message || 'Ошибка');
+                }
+            } catch (error) {
+                console.error('Ошибка:', error);
+                form.submit();
+            }
+        });
     });
 
+    // Одно SSE-соединение вместо периодического опроса; без EventSource - опрос с ETag
+    let pollTimer = null;
 
-    loadResources();
+    function startPolling() {
+        if (pollTimer === null) {
+            loadState();
+            pollTimer = setInterval(loadState, POLL_INTERVAL_MS);
+        }
+    }
+
+    function stopPolling() {
+        if (pollTimer !== null) {
+            clearInterval(pollTimer);
+            pollTimer = null;
+        }
+    }
+
+    if (window.EventSource && getToken()) {
+        const source = new EventSource(`${API_STREAM_URL}?token=${encodeURIComponent(getToken())}`);
+        source.addEventListener('state', event => {
+            stopPolling();
+            etag = `W/"${event.lastEventId}"`;
+            applyState(JSON.parse(event.data));
+        });
+        source.addEventListener('delta', event => {
+            if (state) {
+                etag = `W/"${event.lastEventId}"`;
+                applyState(mergeDelta(JSON.parse(event.data)));
+            }
+        });
+        // EventSource переподключается сам; пока соединения нет, состояние опрашивается
+        source.addEventListener('error', () => {
+            if (source.readyState === EventSource.CLOSED) {
+                startPolling();
+            }
+        });
+    } else {
+        startPolling();
+    }
+    setInterval(renderBalances, 1000);
 });
@@ -1,24 +1,92 @@
 # game_service/utils.py
 
+import hashlib
+import threading
+import time
 import jwt
+from collections import OrderedDict
 from flask import current_app
 from sqlalchemy.exc import SQLAlchemyError
-from datetime import datetime
 import logging
 
-# Импортируем db и модели.
 # utils.py импортируется только из run_game.py
 # и routes.py, ПОСЛЕ того как __init__.py уже создал 'db'.
-from . import db
-from .models import Resources, Buildings
+from .repository import get_player_repository
 
 logger = logging.getLogger(__name__)
 
+# --- Кэш декодированных JWT ---
+class TokenCache:
+    """
+    Ограниченный LRU-кэш декодированных JWT.
+
+    Ключ - SHA-256 от токена (сами токены в памяти не храним), значение -
+    срок действия (exp) и payload. Запись удаляется при первом обращении
+    после exp, поэтому просроченный токен никогда не будет принят из кэша.
+
+    Args:
+        secret_key: Ключ проверки подписи JWT.
+        maxsize: Максимальное число токенов в кэше.
+    """
+
+    def __init__(self, secret_key: str, maxsize: int = 10000):
+        self.secret_key = secret_key
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str):
+        """Возвращает payload из кэша или None, если токена нет или он истек."""
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                exp, payload = entry
+                if time.time() < exp:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return payload
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, token: str, payload: dict):
+        """Сохраняет проверенный payload. Токены без exp не кэшируются."""
+        exp = payload.get('exp')
+        if not isinstance(exp, (int, float)):
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (exp, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
 # --- Функция проверки JWT ---
 def verify_jwt_token(token):
+    if not token:
+        return None
+    cache = current_app.extensions['jwt_token_cache']
+    decoded = cache.get(token)
+    if decoded is not None:
+        return decoded
     try:
-        secret_key = current_app.config['JWT_SECRET_KEY']
-        decoded = jwt.decode(token, secret_key, algorithms=['HS256'])
+        decoded = jwt.decode(token, cache.secret_key, algorithms=['HS256'])
+        # Refresh-токен AuthService подписан тем же ключом, но доступа к игре не дает
+        if decoded.get('type', 'access') != 'access':
+            logger.warning(f"JWT verification failed: '{decoded.get('type')}' token used for access")
+            return None
+        cache.put(token, decoded)
         return decoded
     except jwt.ExpiredSignatureError:
         logger.warning("JWT verification failed: Token has expired")
@@ -30,44 +98,74 @@ def verify_jwt_token(token):
         logger.error(f"An unexpected error occurred during JWT verification: {e}", exc_info=True)
         return None
 
-# --- Функция-обработчик для сообщений 'user_created' ---
-def process_user_created_message(message_data: dict):
+# --- Функции-обработчики для сообщений 'user_created' ---
+def process_user_created_batch(messages: list):
     """
-    Обрабатывает сообщение о создании пользователя.
-    Вызывается из консьюмера RabbitMQ внутри app_context.
+    Обрабатывает пачку сообщений о создании пользователей одной транзакцией.
+    Вызывается из пакетного консьюмера RabbitMQ внутри app_context.
 
     Args:
-        message_data: Словарь с данными из сообщения ('user_id', 'username').
+        messages: Список словарей с данными из сообщений ('user_id', 'username').
     """
     try:
-        user_id = message_data['user_id']
-        username = message_data['username']
-
-        # Проверяем, существуют ли уже данные для этого пользователя
-        existing_resources = db.session.get(Resources, user_id)
-        if not existing_resources:
-            existing_buildings = db.session.get(Buildings, user_id)
-            if not existing_buildings:
-                logger.info(f"Creating initial game data for user {username} ({user_id}).")
-                new_resources = Resources(user_id=user_id)
-                new_buildings = Buildings(user_id=user_id)
-                db.session.add(new_resources)
-                db.session.add(new_buildings)
-                db.session.commit()
-                logger.info(f"Successfully created game data for user {username} ({user_id}).")
-            else:
-                logger.warning(f"User {username} ({user_id}) has buildings but no resources. Data might be inconsistent.")
-        else:
-            logger.info(f"User {username} ({user_id}) already exists in game DB. No action needed.")
+        user_ids = [message_data['user_id'] for message_data in messages]
+        get_player_repository().provision(user_ids)
+        logger.info(f"Provisioned game data for {len(user_ids)} user(s) from user_created batch.")
 
     except KeyError as e:
-        logger.error(f"Missing key {e} in user_created message: {message_data}")
-        raise # Передаем ошибку выше для nack в RabbitMQ wrapper
+        logger.error(f"Missing key {e} in user_created batch of {len(messages)} message(s).")
+        raise # Передаем ошибку выше, консьюмер обработает сообщения по одному
     except SQLAlchemyError as e:
-        logger.error(f"Database error processing user_created for user_id {message_data.get('user_id', 'N/A')}: {e}", exc_info=True)
-        # Откат сессии будет сделан в callback_wrapper в shared/rabbitmq.py
-        raise # Передаем ошибку выше для nack
-    except Exception as e:
-         logger.error(f"Unexpected error processing user_created_message: {e}", exc_info=True)
-         # Откат сессии будет сделан в callback_wrapper
-         raise # Передаем ошибку выше для nack
+        logger.error(f"Database error processing user_created batch of {len(messages)} message(s): {e}", exc_info=True)
+        raise
+
+def process_user_created_message(message_data: dict):
+    """
+    Обрабатывает одно сообщение о создании пользователя.
+    Вызывается из консьюмера RabbitMQ внутри app_context.
+
+    Args:
+        message_data: Словарь с данными из сообщения ('user_id', 'username').
+    """
+    process_user_created_batch([message_data])
+
+def start_user_created_consumer(app):
+    """
+    Запускает консьюмер очереди 'user_created' с параметрами из конфигурации:
+    до CONSUMER_BATCH_SIZE сообщений на одну транзакцию (0 - по одному). При CONSUMER_RUNTIME
+    = 'asyncio' до CONSUMER_CONCURRENCY пачек обрабатываются одновременно
+    (shared/async_consumer.py), иначе - по одной пачке с одним ack.
+    При MESSAGE_PARTITIONS > 0 читаются назначенные процессу партиции очереди,
+    по одной пачке на партицию (порядок событий пользователя сохраняется).
+
+    Args:
+        app: Экземпляр Flask приложения GameService.
+
+    Returns:
+        Поток консьюмера.
+    """
+    batch_size = app.config.get('CONSUMER_BATCH_SIZE') or None
+    # Без пакетного режима консьюмер передает обработчику одно сообщение (словарь), а не список
+    handler = process_user_created_batch if batch_size else process_user_created_message
+    if app.config.get('CONSUMER_RUNTIME', 'thread') == 'asyncio':
+        if app.config.get('MESSAGE_TRANSPORT', 'rabbitmq') == 'rabbitmq':
+            from shared.async_consumer import AsyncConsumerRuntime
+            runtime = AsyncConsumerRuntime(app, executor_workers=app.config.get('CONSUMER_EXECUTOR_WORKERS', 4))
+            runtime.subscribe(
+                'user_created', handler,
+                concurrency=app.config.get('CONSUMER_CONCURRENCY', 4),
+                prefetch=app.config.get('CONSUMER_PREFETCH', 0),
+                batch_size=batch_size,
+                batch_timeout_ms=app.config.get('CONSUMER_BATCH_TIMEOUT_MS', 200),
+                partitions=app.config.get('MESSAGE_PARTITIONS', 0)
+            )
+            return runtime.start()
+        logger.warning("CONSUMER_RUNTIME=asyncio requires MESSAGE_TRANSPORT=rabbitmq, using the thread consumer.")
+
+    from shared.rabbitmq import start_consumer_thread
+    return start_consumer_thread(
+        app, 'user_created', handler,
+        batch_size=batch_size,
+        batch_timeout_ms=app.config.get('CONSUMER_BATCH_TIMEOUT_MS', 200),
+        partitions=app.config.get('MESSAGE_PARTITIONS', 0)
+    )
@@ -0,0 +1,240 @@
+# game_service/world_tick.py
+
+"""
+Массовые операции экономики над всеми игроками ("тик мира").
+
+Таблица resources JOIN buildings обходится чанками по user_id (keyset-пагинация).
+Каждый чанк загружается в массивы NumPy, новые значения считаются векторно
+для всего чанка и записываются одним executemany. Чанк читается и
+записывается в одной транзакции BEGIN IMMEDIATE, поэтому параллельные записи
+роутов (например, улучшение здания через UPDATE ... RETURNING) не теряются.
+
+Тик всегда:
+    1. фиксирует начисленное по текущей скорости (как economy.checkpoint) -
+       "догоняющее" начисление для игроков, которые давно не заходили;
+    2. если задан rate_multiplier - пересчитывает скорости по уровням зданий
+       с этим множителем (глобальный буст производства; 1.0 - обычные скорости),
+       иначе оставляет текущие скорости (в том числе действующий буст);
+    3. начисляет payout_hours часов производства по новой скорости (сезонная
+       выплата) и фиксированную сумму grant;
+    4. переносит контрольную точку на начисленные целые секунды (почти now),
+       доли единиц остаются в *_carry, как в economy.checkpoint.
+
+Буст хранится в Resources.*_rate и действует до следующего тика с другим
+множителем; улучшение здания игроком пересчитывает его скорости без буста.
+
+Кэш состояния игроков (PlayerStateCache) в других процессах об этих изменениях
+не знает, и его отложенная запись перезаписала бы результаты тика. Поэтому
+run_world_tick захватывает блокировку владельца строк игроков (state_cache.OWNER_LOCK_NAME)
+и отказывается запускаться, пока ее держит работающий сервис с включенным кэшем;
+такой сервис, наоборот, ждет окончания тика перед первым чтением в кэш.
+Сервис с PLAYER_STATE_CACHE_SIZE = 0 (run_production.py с несколькими воркерами)
+блокировку не берет, и тик можно запускать при работающем сервисе.
+"""
+
+import logging
+import time
+from datetime import datetime
+from typing import NamedTuple
+
+import numpy as np
+
+from shared.locks import FileLock, database_lock_path
+
+from .economy import PRODUCTION_PER_LEVEL, RESOURCE_NAMES, SECONDS_PER_HOUR
+from .state_cache import OWNER_LOCK_NAME
+
+logger = logging.getLogger(__name__)
+
+# Формат, в котором SQLAlchemy хранит DateTime в SQLite
+SQLITE_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+MICROSECONDS_PER_SECOND = 1000000
+
+LEVEL_FIELDS = tuple(PRODUCTION_PER_LEVEL[resource][0] for resource in RESOURCE_NAMES)
+PER_LEVEL = np.array([PRODUCTION_PER_LEVEL[resource][1] for resource in RESOURCE_NAMES], dtype=np.int64)
+
+_SELECT_CHUNK = (
+    "SELECT r.user_id, "
+    + ", ".join(f"COALESCE(r.{resource}, 0)" for resource in RESOURCE_NAMES) + ", "
+    + ", ".join(f"COALESCE(r.{resource}_rate, 0)" for resource in RESOURCE_NAMES) + ", "
+    + ", ".join(f"COALESCE(r.{resource}_carry, 0)" for resource in RESOURCE_NAMES) + ", "
+    + ", ".join(f"COALESCE(b.{field}, 0)" for field in LEVEL_FIELDS) + ", "
+    + "r.last_collected"
+    + " FROM resources r JOIN buildings b ON b.user_id = r.user_id"
+    " WHERE r.user_id > :after ORDER BY r.user_id LIMIT :limit"
+)
+_UPDATE_ROW = (
+    "UPDATE resources SET "
+    + ", ".join(f"{resource} = ?" for resource in RESOURCE_NAMES) + ", "
+    + ", ".join(f"{resource}_rate = ?" for resource in RESOURCE_NAMES) + ", "
+    + ", ".join(f"{resource}_carry = ?" for resource in RESOURCE_NAMES)
+    + ", last_collected = ? WHERE user_id = ?"
+)
+
+
+class TickResult(NamedTuple):
+    players: int
+    chunks: int
+    seconds: float
+
+    @property
+    def players_per_sec(self) -> float:
+        return self.players / self.seconds if self.seconds else 0.0
+
+
+def compute_chunk(data: np.ndarray, last_collected: np.ndarray, now: np.datetime64,
+                  rate_multiplier: float = None, payout_hours: float = 0, grant: np.ndarray = None):
+    """
+    Векторный расчет тика для чанка.
+
+    Args:
+        data: Массив int64 формы (N, 13): user_id, балансы (3), скорости (3),
+              неначисленные остатки (3), уровни зданий (3).
+        last_collected: Контрольные точки игроков, datetime64[us] (NaT - нет точки).
+        now: Момент тика, datetime64[us].
+        rate_multiplier: Множитель скоростей по уровням зданий (None - скорости не меняются).
+        payout_hours: Сколько часов производства начислить сразу.
+        grant: Фиксированная добавка к балансам (массив из 3 значений).
+
+    Returns:
+        (балансы (N, 3), скорости (N, 3), остатки (N, 3), контрольные точки datetime64[us] (N,)).
+    """
+    amounts = data[:, 1:4]
+    rates = data[:, 4:7]
+    carry = data[:, 7:10]
+    levels = data[:, 10:13]
+    # Целые секунды с контрольной точки, как economy.elapsed_seconds
+    missing = np.isnat(last_collected)
+    elapsed_us = (now - last_collected).astype(np.int64)
+    elapsed = np.where(missing, 0, np.maximum(elapsed_us, 0) // MICROSECONDS_PER_SECOND)
+    checkpoints = np.where(missing, now, last_collected + elapsed.astype('timedelta64[s]'))
+
+    # Начисленное с контрольной точки - по старой скорости, как в economy.checkpoint
+    produced = carry + rates * elapsed[:, None]
+    if rate_multiplier is None:
+        new_rates = rates
+    elif rate_multiplier == 1.0:
+        new_rates = levels * PER_LEVEL
+    else:
+        new_rates = np.floor(levels * PER_LEVEL * rate_multiplier).astype(np.int64)
+    if payout_hours:
+        produced = produced + new_rates * round(payout_hours * SECONDS_PER_HOUR)
+    amounts = amounts + produced // SECONDS_PER_HOUR
+    if grant is not None:
+        amounts += grant
+    return amounts, new_rates, produced % SECONDS_PER_HOUR, checkpoints
+
+
+def world_tick(engine, now: datetime = None, rate_multiplier: float = None, payout_hours: float = 0,
+               grant: dict = None, chunk_size: int = 50000) -> TickResult:
+    """
+    Применяет тик ко всем игрокам.
+
+    Args:
+        engine: Движок SQLAlchemy БД GameService (движок записи).
+        now: Момент тика (UTC, по умолчанию - сейчас).
+        rate_multiplier: Множитель скоростей производства (глобальный буст);
+                         None - скорости не меняются.
+        payout_hours: Часы производства, начисляемые сразу (сезонная выплата).
+        grant: Фиксированная добавка к балансам, например {'gold': 100}.
+        chunk_size: Игроков в одном чанке (и одной транзакции).
+    """
+    now = now or datetime.utcnow()
+    now_value = np.datetime64(now, 'us')
+    grant_vector = np.array([(grant or {}).get(resource, 0) for resource in RESOURCE_NAMES], dtype=np.int64)
+    if not grant_vector.any():
+        grant_vector = None
+
+    started = time.perf_counter()
+    players = chunks = 0
+    last_user_id = -1
+    connection = engine.raw_connection()
+    dbapi_connection = connection.driver_connection
+    isolation_level = dbapi_connection.isolation_level
+    # Транзакции управляются явно (BEGIN IMMEDIATE), а не модулем sqlite3
+    dbapi_connection.isolation_level = None
+    cursor = dbapi_connection.cursor()
+    try:
+        while True:
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                rows = cursor.execute(_SELECT_CHUNK, {'after': last_user_id, 'limit': chunk_size}).fetchall()
+                if not rows:
+                    cursor.execute("COMMIT")
+                    break
+                data = np.array([row[:-1] for row in rows], dtype=np.int64)
+                last_collected = np.array([row[-1] for row in rows], dtype='datetime64[us]')
+                amounts, rates, carry, checkpoints = compute_chunk(
+                    data, last_collected, now_value, rate_multiplier, payout_hours, grant_vector
+                )
+                updates = np.column_stack((amounts, rates, carry)).tolist()
+                # 'YYYY-MM-DDTHH:MM:SS.ffffff' -> формат DateTime SQLAlchemy в SQLite
+                checkpoint_texts = np.char.replace(np.datetime_as_string(checkpoints, unit='us'), 'T', ' ').tolist()
+                user_ids = data[:, 0].tolist()
+                cursor.executemany(
+                    _UPDATE_ROW,
+                    (values + [checkpoint, user_id]
+                     for values, checkpoint, user_id in zip(updates, checkpoint_texts, user_ids))
+                )
+                cursor.execute("COMMIT")
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+            players += len(rows)
+            chunks += 1
+            last_user_id = user_ids[-1]
+    finally:
+        cursor.close()
+        dbapi_connection.isolation_level = isolation_level
+        connection.close()
+
+    result = TickResult(players, chunks, time.perf_counter() - started)
+    logger.info(
+        f"World tick updated {result.players} player(s) in {result.chunks} chunk(s), "
+        f"{result.seconds:.2f}s ({result.players_per_sec:.0f} players/s)."
+    )
+    return result
+
+
+def run_world_tick(app, **kwargs) -> TickResult:
+    """
+    Тик для приложения GameService под блокировкой владельца строк игроков
+    (см. описание модуля): записывает и сбрасывает кэш состояния этого
+    процесса до и после тика и пересобирает снимок рейтингов.
+
+    Args:
+        app: Экземпляр Flask приложения GameService.
+        **kwargs: Параметры world_tick.
+
+    Raises:
+        RuntimeError: Блокировку держит другой процесс (сервис с кэшем состояния).
+    """
+    lock_path = database_lock_path(app.config['SQLALCHEMY_DATABASE_URI'], OWNER_LOCK_NAME)
+    owner_lock = FileLock(lock_path) if lock_path else None
+    if owner_lock is not None and not owner_lock.acquire(blocking=False):
+        raise RuntimeError(
+            f"Player rows are owned by process {owner_lock.owner_pid()} ({lock_path}): a service with "
+            f"the player state cache is running. Stop it or run it with PLAYER_STATE_CACHE_SIZE=0."
+        )
+    try:
+        return _run_locked(app, **kwargs)
+    finally:
+        if owner_lock is not None:
+            owner_lock.release()
+
+
+def _run_locked(app, **kwargs) -> TickResult:
+    cache = app.extensions.get('player_state_cache')
+    with app.app_context():
+        if cache is not None and cache.enabled:
+            cache.invalidate()
+        engine = app.extensions['sqlalchemy'].engine
+        result = world_tick(engine, **kwargs)
+        if cache is not None and cache.enabled:
+            cache.invalidate()
+        # Снимок рейтингов пересобирается, чтобы сервис не загрузил устаревшие очки
+        leaderboards = app.extensions.get('leaderboards')
+        if leaderboards is not None and leaderboards.snapshot_path:
+            leaderboards.rebuild()
+            leaderboards.save_snapshot()
+    return result
@@ -1,5 +1,7 @@
 # run_auth.py
+import os
 from auth_service import create_app, db
+from auth_service.outbox import start_outbox_relay
 
 app = create_app()
 
@@ -17,4 +19,10 @@ if __name__ == '__main__':
         print("Warning: PORT not found in app config, defaulting to 5000")
         port = 5000
 
-    app.run(host='0.0.0.0', port=port, debug=True) # Используем 0.0.0.0 для доступности извне (если нужно)
+    # Relay outbox запускаем только в рабочем процессе перезагрузчика Werkzeug,
+    # чтобы не было двух потоков, отправляющих одни и те же события
+    debug = True
+    if not debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_outbox_relay(app)
+
+    app.run(host='0.0.0.0', port=port, debug=debug) # Используем 0.0.0.0 для доступности извне (если нужно)
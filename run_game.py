@@ -4,10 +4,8 @@ import os
 import logging
 # Убедимся, что game_service/__init__.py определяет create_app
 from game_service import create_app
-# Импортируем общую функцию запуска потока RabbitMQ
-from shared.rabbitmq import start_consumer_thread
-# Импортируем специфичный обработчик сообщений для этого сервиса
-from game_service.utils import process_user_created_message
+# Запуск консьюмера 'user_created' (общий с run_production.py)
+from game_service.utils import start_user_created_consumer
 
 # Настройка базового логгирования
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -23,7 +21,8 @@ if __name__ == '__main__':
     # Передаем экземпляр app (может понадобиться для контекста),
     # имя очереди для прослушивания и функцию-обработчик
     logger.info("Initializing RabbitMQ consumer thread for 'user_created' queue...")
-    start_consumer_thread(app, 'user_created', process_user_created_message)
+    # Пакетный режим: до CONSUMER_BATCH_SIZE сообщений на одну транзакцию и один ack
+    start_user_created_consumer(app)
     logger.info("RabbitMQ consumer thread started.")
 
     # === Настройка параметров запуска Flask ===
@@ -0,0 +1,105 @@
+# run_production.py
+
+"""
+Production-запуск сервисов: pre-fork HTTP-воркеры и отдельный фоновый процесс
+(consumer 'user_created' для game, relay outbox для auth). См. shared/launcher.py.
+
+Примеры:
+    python run_production.py game --workers 4
+    python run_production.py auth --workers 4 --max-requests 10000
+
+Плавная перезагрузка: kill -HUP <pid мастера>. Остановка: kill -TERM <pid мастера>.
+"""
+
+import argparse
+import logging
+import os
+
+from shared.launcher import PreforkLauncher
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(process)d - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Код сервисов импортируется только в дочерних процессах
+SERVICES = {
+    'auth': {
+        'factory': 'auth_service:create_app',
+        'background': 'auth_service.outbox:start_outbox_relay',
+        'preload': ('flask_jwt_extended',),
+        'port': 5000,
+    },
+    'game': {
+        'factory': 'game_service:create_app',
+        'background': 'game_service.utils:start_user_created_consumer',
+        'preload': ('jwt',),
+        'port': 5001,
+    },
+}
+
+# Сторонние библиотеки, общие для сервисов: импортируются мастером один раз
+PRELOAD_MODULES = (
+    'flask', 'flask_sqlalchemy', 'sqlalchemy.orm', 'sqlalchemy.dialects.sqlite',
+    'jinja2', 'werkzeug.serving', 'pika',
+)
+
+
+def configure_environment(workers: int):
+    """
+    Значения конфигурации по умолчанию для нескольких процессов. Выставляются
+    в окружение до форка, поэтому shared.config в дочерних процессах их видит;
+    явно заданные переменные окружения не переопределяются.
+    """
+    os.environ.setdefault('TEMPLATE_PROFILE', 'production')
+    # Схема создается один раз до запуска воркеров (bootstrap), а не в каждом create_app
+    os.environ.setdefault('AUTO_CREATE_SCHEMA', '0')
+    # Пул хеширования создается в каждом воркере - делим ядра между воркерами
+    os.environ.setdefault('PASSWORD_HASH_WORKERS', str(max(1, (os.cpu_count() or 1) // workers)))
+    if os.environ.get('MESSAGE_TRANSPORT') == 'memory':
+        # Брокер в памяти не связывает процессы: воркеры, фоновый процесс и другой сервис его не разделяют
+        logger.warning("MESSAGE_TRANSPORT=memory delivers messages only within one process; use 'rabbitmq' here.")
+    if workers > 1:
+        # Кэш состояния с отложенной записью допускает только один процесс-писатель
+        if os.environ.get('PLAYER_STATE_CACHE_SIZE', '0') != '0':
+            logger.warning("PLAYER_STATE_CACHE_SIZE is ignored with more than one worker.")
+        os.environ['PLAYER_STATE_CACHE_SIZE'] = '0'
+        # Рейтинги в памяти каждого воркера видят только его действия - периодически сверяем с БД
+        os.environ.setdefault('LEADERBOARD_REBUILD_INTERVAL', '300')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('service', choices=sorted(SERVICES))
+    parser.add_argument('--host', default=os.environ.get('FLASK_RUN_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=None, help='По умолчанию - порт сервиса из конфигурации')
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WEB_WORKERS', os.cpu_count() or 1)))
+    parser.add_argument('--max-requests', type=int, default=int(os.environ.get('WEB_MAX_REQUESTS', 0)),
+                        help='Перезапуск воркера после N запросов (0 - без перезапуска)')
+    parser.add_argument('--max-requests-jitter', type=int, default=int(os.environ.get('WEB_MAX_REQUESTS_JITTER', 0)))
+    parser.add_argument('--graceful-timeout', type=float, default=float(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30)))
+    parser.add_argument('--no-background', action='store_true',
+                        help='Не запускать фоновый процесс (например, он работает на другой машине)')
+    args = parser.parse_args()
+
+    service = SERVICES[args.service]
+    workers = max(1, args.workers)
+    configure_environment(workers)
+    preload = PRELOAD_MODULES + service['preload']
+    if os.environ.get('SWAGGER_ENABLED', '1') != '0':
+        preload += ('flasgger',)
+
+    PreforkLauncher(
+        service['factory'],
+        host=args.host,
+        port=args.port or service['port'],
+        workers=workers,
+        background_path=None if args.no_background else service['background'],
+        max_requests=args.max_requests,
+        max_requests_jitter=args.max_requests_jitter,
+        graceful_timeout=args.graceful_timeout,
+        preload=preload,
+        bootstrap_path='shared.schema:create_schema',
+    ).run()
+
+
+if __name__ == '__main__':
+    main()
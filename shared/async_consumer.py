@@ -0,0 +1,252 @@
+# shared/async_consumer.py
+
+"""
+Asyncio-runtime консьюмеров RabbitMQ на aio-pika (CONSUMER_RUNTIME = 'asyncio').
+
+В отличие от потоковых консьюмеров shared/rabbitmq.py (одно блокирующее
+соединение на очередь, одно сообщение или одна пачка за раз) runtime держит
+одно соединение (connect_robust, с автоматическим переподключением) на все
+очереди процесса:
+    - у каждой очереди свой канал, prefetch и число одновременно
+      обрабатываемых сообщений (пачек);
+    - обработчики - обычные синхронные функции, как у потоковых консьюмеров;
+      они выполняются внутри app_context в общем ограниченном пуле потоков,
+      чтобы блокирующая работа с БД не останавливала event loop;
+    - сообщения распаковываются по content_type (shared/envelope.py),
+      в пакетном режиме обработчик получает события всех сообщений пачки;
+    - сообщение подтверждается после успешной обработки, при ошибке -
+      отклоняется без повторной постановки (как в shared/rabbitmq.py).
+
+Пропускная способность растет с числом сообщений в обработке, а не
+ограничена одним сообщением, как при prefetch_count = 1.
+
+Партиционированная очередь (subscribe(..., partitions=K)) читается как
+назначенные процессу партиции (shared/rabbitmq.prepare_partitions), у каждой
+из которых одна пачка в обработке, чтобы сохранить порядок сообщений ключа.
+
+Runtime работает только с RabbitMQ: для MESSAGE_TRANSPORT = 'memory'
+используйте потоковые консьюмеры.
+"""
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+from .envelope import unpack
+from .rabbitmq import _rollback_db_session, assigned_partitions, prepare_partitions
+
+logger = logging.getLogger(__name__)
+
+RECONNECT_DELAY = 5.0
+
+
+class Subscription(NamedTuple):
+    queue_name: str
+    handler: callable
+    concurrency: int
+    prefetch: int
+    batch_size: int
+    batch_timeout: float
+    partitions: int
+
+
+def _handle(app, subscription: Subscription, messages: list) -> list:
+    """
+    Обрабатывает сообщения в потоке пула. Пачка, которая не обработалась
+    целиком, повторяется по одному сообщению, как в shared/rabbitmq._process_batch.
+
+    Args:
+        messages: Списки событий сообщений в порядке получения.
+
+    Returns:
+        Список флагов успешной обработки в порядке messages.
+    """
+    if subscription.batch_size:
+        try:
+            with app.app_context():
+                subscription.handler([message_data for events in messages for message_data in events])
+            return [True] * len(messages)
+        except Exception as e:
+            logger.error(f"Error processing batch of {len(messages)} message(s) from '{subscription.queue_name}': {e}. "
+                         f"Retrying one by one.")
+            _rollback_db_session(app)
+            if len(messages) == 1:
+                return [False]
+
+    results = []
+    for events in messages:
+        try:
+            with app.app_context():
+                if subscription.batch_size:
+                    subscription.handler(events)
+                else:
+                    for message_data in events:
+                        subscription.handler(message_data)
+            results.append(True)
+        except Exception as e:
+            logger.error(f"Error processing message from '{subscription.queue_name}': {e}. Data: {events}")
+            _rollback_db_session(app)
+            results.append(False)
+    return results
+
+
+class AsyncConsumerRuntime:
+    """
+    Консьюмеры нескольких очередей на одном соединении aio-pika в отдельном потоке с event loop.
+
+    Args:
+        app: Экземпляр Flask приложения (контекст обработчиков и конфигурация).
+        executor_workers: Размер пула потоков для обработчиков.
+    """
+
+    def __init__(self, app, executor_workers: int = 4):
+        self.app = app
+        self.executor_workers = executor_workers
+        self.subscriptions = []
+
+    def subscribe(self, queue_name: str, handler: callable, concurrency: int = 4, prefetch: int = 0,
+                  batch_size: int = None, batch_timeout_ms: int = 200, partitions: int = 0):
+        """
+        Добавляет очередь (до start).
+
+        Args:
+            queue_name: Имя очереди.
+            handler: Обработчик: словарь сообщения или, при batch_size, список словарей.
+            concurrency: Сообщений (пачек) очереди в обработке одновременно.
+            prefetch: prefetch_count канала очереди; 0 - concurrency * размер пачки.
+            batch_size: Если задан, обработчик получает до batch_size сообщений за вызов.
+            batch_timeout_ms: Максимальное ожидание неполной пачки.
+            partitions: Число партиций очереди (MESSAGE_PARTITIONS); если больше 0,
+                        читаются назначенные процессу партиции по одной пачке за раз,
+                        а concurrency и prefetch не используются.
+
+        Raises:
+            ValueError: Некорректное назначение партиций процессу.
+        """
+        if partitions:
+            assigned_partitions(partitions, self.app.config.get('CONSUMER_PROCESS_INDEX', 0),
+                                self.app.config.get('CONSUMER_PROCESS_COUNT', 1))
+        concurrency = max(1, concurrency)
+        prefetch = prefetch or concurrency * (batch_size or 1)
+        self.subscriptions.append(Subscription(
+            queue_name, handler, concurrency, prefetch, batch_size or 0, batch_timeout_ms / 1000.0, partitions
+        ))
+        return self
+
+    def start(self) -> threading.Thread:
+        """Запускает event loop runtime в демон-потоке."""
+        thread = threading.Thread(target=asyncio.run, args=(self._run(),), daemon=True)
+        thread.start()
+        logger.info(f"Asyncio consumer runtime initiated for queue(s) "
+                    f"{', '.join(s.queue_name for s in self.subscriptions)}.")
+        return thread
+
+    async def _run(self):
+        import aio_pika
+
+        host = self.app.config.get('RABBITMQ_HOST', 'localhost')
+        executor = ThreadPoolExecutor(max_workers=self.executor_workers, thread_name_prefix='consumer')
+        while True:
+            try:
+                # Робастное соединение само переподключается и восстанавливает каналы и консьюмеры
+                subscriptions = await self._expand_partitions(executor)
+                connection = await aio_pika.connect_robust(host=host)
+                async with connection:
+                    logger.info(f"Asyncio consumer runtime connected to RabbitMQ at {host}.")
+                    await asyncio.gather(*(
+                        self._consume(connection, subscription, executor) for subscription in subscriptions
+                    ))
+            except Exception as e:
+                logger.warning(f"Asyncio consumer runtime lost RabbitMQ at {host}: {e}. "
+                               f"Retrying in {RECONNECT_DELAY:.0f} seconds...")
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def _expand_partitions(self, executor) -> list:
+        """Заменяет партиционированные подписки подписками на партиции процесса."""
+        loop = asyncio.get_running_loop()
+        subscriptions = []
+        for subscription in self.subscriptions:
+            if not subscription.partitions:
+                subscriptions.append(subscription)
+                continue
+            # Объявление и перенос лишних партиций - блокирующий pika, поэтому в пуле потоков
+            partitions = await loop.run_in_executor(
+                executor, prepare_partitions, self.app, subscription.queue_name, subscription.partitions
+            )
+            subscriptions.extend(
+                subscription._replace(queue_name=partition, concurrency=1, prefetch=subscription.batch_size or 1,
+                                      partitions=0)
+                for partition in partitions
+            )
+        return subscriptions
+
+    async def _consume(self, connection, subscription: Subscription, executor):
+        channel = await connection.channel()
+        await channel.set_qos(prefetch_count=subscription.prefetch)
+        queue = await channel.declare_queue(subscription.queue_name, durable=True)
+        slots = asyncio.Semaphore(subscription.concurrency)
+        in_flight = set()
+        batch = []
+        flush_at = None
+        logger.info(f"[*] Consuming '{subscription.queue_name}' (concurrency={subscription.concurrency}, "
+                    f"prefetch={subscription.prefetch}, batch_size={subscription.batch_size or 1}).")
+
+        async def dispatch(messages):
+            # Слот берется до создания задачи: при занятых слотах чтение очереди ждет
+            await slots.acquire()
+            task = asyncio.create_task(self._process(subscription, messages, executor, slots))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+
+        loop = asyncio.get_running_loop()
+        async with queue.iterator() as messages:
+            while True:
+                timeout = None if flush_at is None else max(flush_at - loop.time(), 0)
+                try:
+                    message = await asyncio.wait_for(messages.__anext__(), timeout)
+                except asyncio.TimeoutError:
+                    message = None
+                except StopAsyncIteration:
+                    break
+                if message is not None:
+                    if not subscription.batch_size:
+                        await dispatch([message])
+                        continue
+                    batch.append(message)
+                    if flush_at is None:
+                        flush_at = loop.time() + subscription.batch_timeout
+                if batch and (message is None or len(batch) >= subscription.batch_size or loop.time() >= flush_at):
+                    await dispatch(batch)
+                    batch, flush_at = [], None
+        # Неполная пачка при закрытии канала не обрабатывается: брокер доставит ее повторно
+        if in_flight:
+            await asyncio.gather(*in_flight, return_exceptions=True)
+
+    async def _process(self, subscription: Subscription, messages: list, executor, slots):
+        try:
+            decoded, valid = [], []
+            for message in messages:
+                try:
+                    decoded.append(unpack(message.body, message.content_type))
+                    valid.append(message)
+                except ValueError as e:
+                    logger.error(f"Failed to decode message from '{subscription.queue_name}': {e}. "
+                                 f"Body: {message.body[:100]}...")
+                    await message.nack(requeue=False)
+            if not valid:
+                return
+            results = await asyncio.get_running_loop().run_in_executor(
+                executor, _handle, self.app, subscription, decoded
+            )
+            # Пачки обрабатываются параллельно, поэтому ack(multiple=True) задел бы чужие сообщения
+            for message, ok in zip(valid, results):
+                if ok:
+                    await message.ack()
+                else:
+                    await message.nack(requeue=False)
+        except Exception as e:
+            logger.error(f"[!] Unexpected error in consumer of '{subscription.queue_name}': {e}", exc_info=True)
+        finally:
+            slots.release()
@@ -7,19 +7,45 @@ class Config:
     # --- Общие настройки ---
     SECRET_KEY = os.environ.get('SECRET_KEY', 'a-very-secret-key-needs-to-be-set')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    TEMPLATES_AUTO_RELOAD = True
+    # Профиль рендеринга шаблонов (shared/templating.py): 'development' или 'production'
+    TEMPLATE_PROFILE = os.environ.get('TEMPLATE_PROFILE', 'development')
+    TEMPLATES_AUTO_RELOAD = TEMPLATE_PROFILE != 'production'
+    # Максимальное число отрендеренных фрагментов {% cache %} (только в профиле production)
+    TEMPLATE_FRAGMENT_CACHE_SIZE = int(os.environ.get('TEMPLATE_FRAGMENT_CACHE_SIZE', 1024))
+
+    # --- Настройки SQLite ---
+    # db.create_all() в create_app; при 0 схема создается командой 'flask init-db' (shared/schema.py)
+    AUTO_CREATE_SCHEMA = os.environ.get('AUTO_CREATE_SCHEMA', '1') != '0'
+    # Профиль PRAGMA из shared/storage.py: 'default', 'wal' или 'durable'
+    SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', 'wal')
+    # Размер пула отдельного движка для чтения (0 - читать через основной движок)
+    SQLITE_READ_POOL_SIZE = int(os.environ.get('SQLITE_READ_POOL_SIZE', 8))
 
     # --- Настройки JWT ---
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'fallback-super-secret-key-please-change')
 
     # --- Настройки RabbitMQ ---
+    # Транспорт сообщений (shared/rabbitmq.py): 'rabbitmq' или 'memory' (брокер в памяти процесса)
+    MESSAGE_TRANSPORT = os.environ.get('MESSAGE_TRANSPORT', 'rabbitmq')
     RABBITMQ_HOST = os.environ.get('RABBITMQ_HOST', 'localhost')
+    # Размер пула долгоживущих соединений для публикации сообщений
+    RABBITMQ_PUBLISHER_POOL_SIZE = int(os.environ.get('RABBITMQ_PUBLISHER_POOL_SIZE', 4))
+    # Число партиций очередей, публикуемых с ключом (user_id), через consistent-hash exchange
+    # (0 - одна общая очередь). Должно совпадать у AuthService и GameService
+    MESSAGE_PARTITIONS = int(os.environ.get('MESSAGE_PARTITIONS', 0))
+    # Формат публикуемых сообщений (shared/envelope.py): 'none' - событие на сообщение, 'json' или
+    # 'compact' (сжатый по столбцам) - конверт до EVENT_ENVELOPE_MAX_EVENTS событий.
+    # Консьюмеры читают все форматы, поэтому включать конверты можно после их обновления
+    EVENT_ENCODING = os.environ.get('EVENT_ENCODING', 'none')
+    EVENT_ENVELOPE_MAX_EVENTS = int(os.environ.get('EVENT_ENVELOPE_MAX_EVENTS', 100))
 
     # --- URL других сервисов ---
     AUTH_SERVICE_URL = os.environ.get('AUTH_SERVICE_URL', 'http://localhost:5000')
     GAME_SERVICE_URL = os.environ.get('GAME_SERVICE_URL', 'http://localhost:5001')
 
     # --- Настройки Swagger (Общие, если нужны) ---
+    # Без Swagger flasgger не импортируется - быстрее старт сервиса и воркеров
+    SWAGGER_ENABLED = os.environ.get('SWAGGER_ENABLED', '1') != '0'
     SWAGGER_HOST = 'localhost' # Базовый хост для Swagger
     SWAGGER_TITLE = "Game Project API"
     SWAGGER_VERSION = "1.0.0"
@@ -31,18 +57,69 @@ class Config:
 class AuthConfig(Config):
     """Конфигурация для AuthService."""
     _basedir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'auth_service'))
-    _instance_path = os.path.join(_basedir, 'instance')
-    os.makedirs(_instance_path, exist_ok=True)
+    # Каталог БД и кэшей сервиса (переопределяется, например, бенчмарками)
+    _instance_path = os.environ.get('AUTH_INSTANCE_PATH', os.path.join(_basedir, 'instance'))
     SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(_instance_path, 'users.db')}"
+    # Байткод шаблонов Jinja в профиле production (общий для всех процессов сервиса)
+    TEMPLATE_CACHE_DIR = os.path.join(_instance_path, 'jinja_cache')
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=30)
+    # Refresh-токены (/api/refresh, auth_service/tokens.py): срок жизни и интервал подгрузки
+    # отзывов, сделанных другими процессами (сек.)
+    JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=int(os.environ.get('JWT_REFRESH_TOKEN_DAYS', 30)))
+    TOKEN_DENYLIST_REFRESH_INTERVAL = float(os.environ.get('TOKEN_DENYLIST_REFRESH_INTERVAL', 1.0))
     PORT = 5000 # Явно указываем порт для AuthService
     SWAGGER_DESCRIPTION = "Authentication Service API" # Описание для Auth
+    # Transactional outbox: размер пачки и интервал отправки (сек.)
+    OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', 100))
+    OUTBOX_FLUSH_INTERVAL = float(os.environ.get('OUTBOX_FLUSH_INTERVAL', 1.0))
+    # Unix-сокет, через который воркеры будят relay в фоновом процессе (пусто - только внутри процесса)
+    OUTBOX_WAKEUP_SOCKET = os.environ.get('OUTBOX_WAKEUP_SOCKET', os.path.join(_instance_path, 'outbox-wakeup.sock')) or None
+    # Фильтр Блума занятых имен (auth_service/usernames.py): начальная емкость, доля ложноположительных
+    # ответов и интервал подгрузки пользователей, зарегистрированных другими процессами (сек.)
+    USERNAME_FILTER_CAPACITY = int(os.environ.get('USERNAME_FILTER_CAPACITY', 100000))
+    USERNAME_FILTER_ERROR_RATE = float(os.environ.get('USERNAME_FILTER_ERROR_RATE', 0.01))
+    USERNAME_FILTER_REFRESH_INTERVAL = float(os.environ.get('USERNAME_FILTER_REFRESH_INTERVAL', 1.0))
+    # Хеширование паролей: параметры werkzeug и пул процессов (0 процессов - без пула)
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+    PASSWORD_SALT_LENGTH = int(os.environ.get('PASSWORD_SALT_LENGTH', 16))
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+    PASSWORD_HASH_QUEUE_SIZE = int(os.environ.get('PASSWORD_HASH_QUEUE_SIZE', 64))
+    PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10.0))
 
 class GameConfig(Config):
     """Конфигурация для GameService."""
     _basedir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'game_service'))
-    _instance_path = os.path.join(_basedir, 'instance')
-    os.makedirs(_instance_path, exist_ok=True)
+    # Каталог БД и кэшей сервиса (переопределяется, например, бенчмарками)
+    _instance_path = os.environ.get('GAME_INSTANCE_PATH', os.path.join(_basedir, 'instance'))
     SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(_instance_path, 'game.db')}"
+    TEMPLATE_CACHE_DIR = os.path.join(_instance_path, 'jinja_cache')
     PORT = 5001 # Явно указываем порт для GameService
+    # Пакетная обработка очереди user_created: размер пачки (0 - по одному сообщению) и максимальное ожидание (мс)
+    CONSUMER_BATCH_SIZE = int(os.environ.get('CONSUMER_BATCH_SIZE', 100))
+    CONSUMER_BATCH_TIMEOUT_MS = int(os.environ.get('CONSUMER_BATCH_TIMEOUT_MS', 200))
+    # Runtime консьюмеров: 'thread' (pika, по потоку на очередь) или 'asyncio' (aio-pika, shared/async_consumer.py).
+    # Для asyncio: пачек в обработке на очередь, prefetch (0 - concurrency * размер пачки) и потоки для обработчиков
+    CONSUMER_RUNTIME = os.environ.get('CONSUMER_RUNTIME', 'thread')
+    CONSUMER_CONCURRENCY = int(os.environ.get('CONSUMER_CONCURRENCY', 4))
+    CONSUMER_PREFETCH = int(os.environ.get('CONSUMER_PREFETCH', 0))
+    CONSUMER_EXECUTOR_WORKERS = int(os.environ.get('CONSUMER_EXECUTOR_WORKERS', 4))
+    # Партиции, которые читает процесс при MESSAGE_PARTITIONS > 0: номера i, для которых
+    # i % CONSUMER_PROCESS_COUNT == CONSUMER_PROCESS_INDEX (процессы-консьюмеры делят партиции между собой)
+    CONSUMER_PROCESS_INDEX = int(os.environ.get('CONSUMER_PROCESS_INDEX', 0))
+    CONSUMER_PROCESS_COUNT = int(os.environ.get('CONSUMER_PROCESS_COUNT', 1))
+    # Максимальное число декодированных JWT в кэше
+    JWT_CACHE_SIZE = int(os.environ.get('JWT_CACHE_SIZE', 10000))
+    # Кэш состояния игроков: размер (0 - отключен) и интервал записи в БД (сек.)
+    PLAYER_STATE_CACHE_SIZE = int(os.environ.get('PLAYER_STATE_CACHE_SIZE', 10000))
+    PLAYER_STATE_FLUSH_INTERVAL = float(os.environ.get('PLAYER_STATE_FLUSH_INTERVAL', 1.0))
+    # Сколько запрос ждет блокировку строк игроков (тик мира, старый воркер после перезагрузки),
+    # прежде чем выполниться без кэша со сквозной записью в БД (сек.)
+    PLAYER_STATE_LOCK_TIMEOUT = float(os.environ.get('PLAYER_STATE_LOCK_TIMEOUT', 2.0))
+    # SSE-поток состояния: буфер снимков на соединение и интервал keepalive-комментариев (сек.)
+    SSE_CLIENT_BUFFER_SIZE = int(os.environ.get('SSE_CLIENT_BUFFER_SIZE', 16))
+    SSE_KEEPALIVE_INTERVAL = float(os.environ.get('SSE_KEEPALIVE_INTERVAL', 15.0))
+    # Рейтинги: файл снимка, интервал его сохранения и пересборки из БД (сек., 0 - без пересборки)
+    LEADERBOARD_SNAPSHOT_PATH = os.environ.get('LEADERBOARD_SNAPSHOT_PATH', os.path.join(_instance_path, 'leaderboard.snapshot'))
+    LEADERBOARD_SNAPSHOT_INTERVAL = float(os.environ.get('LEADERBOARD_SNAPSHOT_INTERVAL', 60.0))
+    LEADERBOARD_REBUILD_INTERVAL = float(os.environ.get('LEADERBOARD_REBUILD_INTERVAL', 0.0))
     SWAGGER_DESCRIPTION = "Game Logic Service API" # Описание для Game
\ No newline at end of file
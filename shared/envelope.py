@@ -0,0 +1,127 @@
+# shared/envelope.py
+
+"""
+Конверты событий для сообщений между сервисами.
+
+Формат сообщения определяется его content_type:
+    - 'application/json' - одно событие (словарь) в сообщении, исходный формат;
+    - 'application/x-events+json; v=1' - конверт {"v": 1, "events": [...]}
+      с несколькими событиями в одном сообщении брокера;
+    - 'application/x-events+zlib; v=1' - компактный конверт: события
+      с одинаковым набором ключей записываются по столбцам
+      ({"v": 1, "fields": [...], "rows": [[...], ...]}), JSON сжимается zlib.
+
+Консьюмеры принимают все форматы независимо от EVENT_ENCODING публикующего
+сервиса, поэтому сначала обновляются консьюмеры, затем включаются конверты.
+Порядок событий внутри конверта сохраняется.
+"""
+
+import json
+import zlib
+
+ENVELOPE_VERSION = 1
+
+PLAIN_JSON = 'application/json'
+EVENTS_JSON = 'application/x-events+json'
+EVENTS_COMPACT = 'application/x-events+zlib'
+
+# EVENT_ENCODING -> базовый content_type
+ENCODINGS = {
+    'none': PLAIN_JSON,
+    'json': EVENTS_JSON,
+    'compact': EVENTS_COMPACT,
+}
+
+# Уровень сжатия компактного формата: 1 - быстрее, разница в размере для событий невелика
+COMPRESSION_LEVEL = 1
+
+
+def content_type_for(encoding: str) -> str:
+    """
+    content_type сообщений для EVENT_ENCODING (с версией конверта).
+
+    Raises:
+        ValueError: Неизвестная кодировка.
+    """
+    base = ENCODINGS.get(encoding)
+    if base is None:
+        raise ValueError(f"Unknown EVENT_ENCODING '{encoding}' (expected one of {', '.join(ENCODINGS)})")
+    return base if base == PLAIN_JSON else f"{base}; v={ENVELOPE_VERSION}"
+
+
+def _columns(events: list):
+    fields = list(events[0])
+    if all(isinstance(event, dict) and list(event) == fields for event in events):
+        return {'v': ENVELOPE_VERSION, 'fields': fields, 'rows': [list(event.values()) for event in events]}
+    return {'v': ENVELOPE_VERSION, 'events': events}
+
+
+def pack(events: list, encoding: str, max_events: int = 100) -> list:
+    """
+    Упаковывает события в тела сообщений.
+
+    Args:
+        events: Список словарей (событий) в порядке отправки.
+        encoding: 'none' - по сообщению на событие, 'json' или 'compact' -
+                  до max_events событий в одном конверте.
+        max_events: Максимальное число событий в одном сообщении.
+
+    Returns:
+        Список тел сообщений (str для 'none' и 'json', bytes для 'compact').
+    """
+    if encoding == 'none':
+        return [json.dumps(event) for event in events]
+    content_type_for(encoding)
+    bodies = []
+    for start in range(0, len(events), max_events):
+        chunk = events[start:start + max_events]
+        if encoding == 'json':
+            bodies.append(json.dumps({'v': ENVELOPE_VERSION, 'events': chunk}))
+        else:
+            encoded = json.dumps(_columns(chunk), separators=(',', ':')).encode()
+            bodies.append(zlib.compress(encoded, COMPRESSION_LEVEL))
+    return bodies
+
+
+def _parse_content_type(content_type: str):
+    base, _, params = (content_type or PLAIN_JSON).partition(';')
+    version = None
+    for param in params.split(';'):
+        name, _, value = param.strip().partition('=')
+        if name == 'v':
+            version = value
+    return base.strip().lower(), version
+
+
+def unpack(body: bytes, content_type: str = None) -> list:
+    """
+    Распаковывает тело сообщения в список событий.
+
+    Сообщения без content_type считаются одним событием в JSON (исходный формат).
+
+    Raises:
+        ValueError: Неизвестный content_type или версия конверта, поврежденное тело.
+    """
+    base, version = _parse_content_type(content_type)
+    if base == PLAIN_JSON:
+        return [json.loads(body)]
+    if base not in (EVENTS_JSON, EVENTS_COMPACT):
+        raise ValueError(f"Unsupported message content type '{content_type}'")
+    if version is not None and version != str(ENVELOPE_VERSION):
+        raise ValueError(f"Unsupported event envelope version {version} (supported: {ENVELOPE_VERSION})")
+
+    if base == EVENTS_COMPACT:
+        try:
+            body = zlib.decompress(body)
+        except zlib.error as e:
+            raise ValueError(f"Corrupted compact event envelope: {e}")
+    envelope = json.loads(body)
+    if not isinstance(envelope, dict) or envelope.get('v') != ENVELOPE_VERSION:
+        raise ValueError(f"Unsupported event envelope version {envelope.get('v') if isinstance(envelope, dict) else None}")
+    try:
+        if 'rows' in envelope:
+            fields = envelope['fields']
+            return [dict(zip(fields, row)) for row in envelope['rows']]
+        return list(envelope['events'])
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"Malformed event envelope: {e!r}")
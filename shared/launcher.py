@@ -0,0 +1,425 @@
+# shared/launcher.py
+
+"""
+Production-запуск сервиса: pre-fork HTTP-воркеры и отдельный фоновый процесс.
+
+Мастер-процесс:
+    - открывает слушающий сокет и форкает N HTTP-воркеров, которые принимают
+      соединения с одного и того же сокета (нагрузку распределяет ядро);
+    - запускает ровно один фоновый процесс (консьюмер RabbitMQ, relay outbox),
+      чтобы фоновая работа не отнимала время у потоков обработки запросов;
+    - перезапускает упавшие процессы и воркеры, отработавшие max_requests
+      запросов (защита от утечек памяти): воркер сообщает мастеру о достижении
+      лимита, мастер запускает замену и только затем останавливает его;
+    - по SIGHUP плавно перезагружает все процессы: новые воркеры стартуют
+      до остановки старых, поэтому сокет не остается без обработчиков;
+    - по SIGTERM/SIGINT плавно останавливает все процессы.
+
+Мастер не импортирует код сервиса: фабрика приложения задается строкой
+'package:create_app' и импортируется в дочернем процессе, поэтому перезагрузка
+по SIGHUP подхватывает новый код. Тяжелые сторонние библиотеки (Flask,
+SQLAlchemy и т.д.) мастер может импортировать заранее (preload): воркеры
+получают их через fork уже загруженными, и запуск воркера стоит только
+создания приложения. Схема БД создается один раз (bootstrap) до запуска
+воркеров, а не в каждом воркере. Плавная остановка воркера - прекращение
+приема соединений и ожидание текущих запросов, но не дольше graceful_timeout
+(долгие SSE-соединения обрываются по истечении этого времени).
+"""
+
+import atexit
+import errno
+import importlib
+import logging
+import os
+import random
+import select
+import signal
+import socket
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Процесс, завершившийся быстрее, перезапускается с задержкой (защита от цикла падений)
+MIN_UPTIME = 1.0
+RESPAWN_DELAY = 1.0
+
+
+def import_string(path: str):
+    """Импортирует объект по строке 'package.module:attribute'."""
+    module_name, _, attribute = path.partition(':')
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    """Открывает слушающий TCP-сокет, наследуемый дочерними процессами."""
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+class _RequestTracker:
+    """
+    WSGI-обертка воркера: считает обработанные и текущие запросы.
+    Запрос считается завершенным при закрытии ответа (важно для потоковых ответов).
+    """
+
+    def __init__(self, wsgi_app, max_requests: int, on_limit):
+        self.wsgi_app = wsgi_app
+        self.max_requests = max_requests
+        self.on_limit = on_limit
+        self.served = 0
+        self.active = 0
+        self._idle = threading.Condition()
+
+    def __call__(self, environ, start_response):
+        from werkzeug.wsgi import ClosingIterator
+
+        with self._idle:
+            self.active += 1
+            self.served += 1
+            limit_reached = self.max_requests and self.served == self.max_requests
+        if limit_reached:
+            self.on_limit()
+        try:
+            return ClosingIterator(self.wsgi_app(environ, start_response), [self._finished])
+        except BaseException:
+            self._finished()
+            raise
+
+    def _finished(self):
+        with self._idle:
+            self.active -= 1
+            if not self.active:
+                self._idle.notify_all()
+
+    def wait_idle(self, timeout: float) -> bool:
+        """Ждет завершения текущих запросов. Returns: True, если все завершились."""
+        with self._idle:
+            return self._idle.wait_for(lambda: not self.active, timeout)
+
+
+def _reset_signals():
+    signal.set_wakeup_fd(-1)
+    for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+        signal.signal(signum, signal.SIG_DFL)
+    # Ctrl+C в терминале получает вся группа процессов - останавливает только мастер
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _serve_worker(factory_path: str, sock: socket.socket, max_requests: int, graceful_timeout: float,
+                  retire_fd: int = None):
+    """
+    Тело HTTP-воркера: создает приложение и обслуживает общий сокет до остановки.
+
+    По достижении max_requests воркер пишет свой PID в retire_fd и продолжает
+    принимать соединения, пока мастер не запустит замену и не пришлет SIGTERM.
+    """
+    from werkzeug.serving import make_server
+
+    app = import_string(factory_path)()
+    stopping = threading.Event()
+
+    def request_stop(*_):
+        if not stopping.is_set():
+            stopping.set()
+            # shutdown() ждет выхода из serve_forever - вызывается не из потока сервера
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+    def request_retire():
+        if retire_fd is not None:
+            try:
+                os.write(retire_fd, f"{os.getpid()}\n".encode())
+                return
+            except OSError as e:
+                logger.warning(f"HTTP worker {os.getpid()} failed to notify the launcher: {e}")
+        request_stop()
+
+    tracker = _RequestTracker(app.wsgi_app, max_requests, request_retire)
+    app.wsgi_app = tracker
+    host, port = sock.getsockname()[:2]
+    server = make_server(host, port, app, threaded=True, fd=sock.fileno())
+    signal.signal(signal.SIGTERM, request_stop)
+
+    logger.info(f"HTTP worker {os.getpid()} started (max_requests={max_requests or 'unlimited'}).")
+    server.serve_forever()
+    if not tracker.wait_idle(graceful_timeout):
+        logger.warning(f"HTTP worker {os.getpid()} stopped with {tracker.active} request(s) still active.")
+    logger.info(f"HTTP worker {os.getpid()} exiting after {tracker.served} request(s).")
+
+
+def _run_bootstrap(factory_path: str, bootstrap_path: str):
+    """Тело одноразового процесса подготовки: bootstrap_path(app), например создание схемы БД."""
+    app = import_string(factory_path)()
+    import_string(bootstrap_path)(app)
+    return 0
+
+
+def _run_background(factory_path: str, background_path: str):
+    """
+    Тело фонового процесса: создает приложение и запускает фоновую работу.
+
+    Функция background_path принимает app и запускает фоновые потоки (например,
+    start_outbox_relay). Если она вернула поток и он завершился, процесс
+    завершается с ошибкой и перезапускается мастером.
+    """
+    app = import_string(factory_path)()
+    thread = import_string(background_path)(app)
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopping.set())
+
+    logger.info(f"Background process {os.getpid()} started ({background_path}).")
+    while not stopping.wait(1.0):
+        if isinstance(thread, threading.Thread) and not thread.is_alive():
+            logger.error(f"Background thread of {background_path} died; exiting for restart.")
+            return 1
+    return 0
+
+
+class PreforkLauncher:
+    """
+    Мастер-процесс pre-fork сервера.
+
+    Args:
+        factory_path: Фабрика приложения в виде 'package:create_app'.
+        host: Адрес для прослушивания.
+        port: Порт.
+        workers: Число HTTP-воркеров.
+        background_path: Функция запуска фоновой работы 'module:function' (принимает app)
+                         или None, если фоновый процесс не нужен.
+        max_requests: Перезапуск воркера после стольких запросов (0 - без перезапуска).
+        max_requests_jitter: Случайная добавка к max_requests, чтобы воркеры
+                             не перезапускались одновременно.
+        graceful_timeout: Время на завершение текущих запросов при остановке (сек.).
+        preload: Модули, импортируемые мастером до форка (только сторонние библиотеки:
+                 они не перезагружаются по SIGHUP).
+        bootstrap_path: Функция 'module:function' (принимает app), выполняемая один раз
+                        в отдельном процессе до запуска воркеров (например, создание схемы БД).
+    """
+
+    def __init__(self, factory_path: str, host: str, port: int, workers: int,
+                 background_path: str = None, max_requests: int = 0,
+                 max_requests_jitter: int = 0, graceful_timeout: float = 30.0,
+                 preload=(), bootstrap_path: str = None):
+        self.factory_path = factory_path
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.background_path = background_path
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.graceful_timeout = graceful_timeout
+        self.preload = tuple(preload)
+        self.bootstrap_path = bootstrap_path
+        self.generation = 0
+        self._workers = {}  # pid -> (поколение, время запуска)
+        self._retiring = set()  # Воркеры, отработавшие max_requests: замена уже запущена
+        self._background = None  # (pid, время запуска)
+        self._respawn_after = 0.0
+        self._signals = []
+        self._socket = None
+        self._retire_fd = None  # Канал, в который воркеры пишут PID по достижении max_requests
+
+    # --- Дочерние процессы ---
+
+    def _fork(self, target, *args) -> int:
+        pid = os.fork()
+        if pid:
+            return pid
+        # Дочерний процесс: не возвращается в цикл мастера
+        code = 1
+        try:
+            _reset_signals()
+            result = target(*args)
+            code = result if isinstance(result, int) else 0
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else 1
+        except BaseException:
+            logger.exception(f"Child process {os.getpid()} crashed.")
+        finally:
+            # atexit-обработчики сервиса: сброс кэшей, закрытие соединений и пулов
+            try:
+                atexit._run_exitfuncs()
+            finally:
+                os._exit(code)
+
+    def _spawn_worker(self):
+        jitter = random.randint(0, self.max_requests_jitter) if self.max_requests and self.max_requests_jitter else 0
+        max_requests = self.max_requests + jitter if self.max_requests else 0
+        pid = self._fork(_serve_worker, self.factory_path, self._socket, max_requests, self.graceful_timeout,
+                         self._retire_fd)
+        self._workers[pid] = (self.generation, time.monotonic())
+
+    def _spawn_background(self):
+        pid = self._fork(_run_background, self.factory_path, self.background_path)
+        self._background = (pid, time.monotonic())
+
+    def _reap(self):
+        """Собирает завершившиеся дочерние процессы."""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if not pid:
+                return
+            code = os.waitstatus_to_exitcode(status)
+            retired = pid in self._retiring
+            if pid in self._workers:
+                generation, started = self._workers.pop(pid)
+                self._retiring.discard(pid)
+                kind = 'HTTP worker'
+            elif self._background and self._background[0] == pid:
+                started = self._background[1]
+                self._background = None
+                kind = 'Background process'
+            else:
+                continue
+            uptime = time.monotonic() - started
+            log = logger.info if code == 0 else logger.warning
+            log(f"{kind} {pid} exited with code {code} after {uptime:.1f}s.")
+            # Остановка по max_requests - не падение, даже если лимит исчерпан быстро
+            if uptime < MIN_UPTIME and not retired:
+                self._respawn_after = time.monotonic() + RESPAWN_DELAY
+
+    def _maintain(self):
+        """Дозапускает недостающие процессы текущего поколения."""
+        if time.monotonic() < self._respawn_after:
+            return
+        current = sum(1 for pid, (generation, _) in self._workers.items()
+                      if generation == self.generation and pid not in self._retiring)
+        for _ in range(self.workers - current):
+            self._spawn_worker()
+        # Фоновый процесс запускается только после выхода предыдущего - он всегда один
+        if self.background_path and self._background is None:
+            self._spawn_background()
+
+    def _retire(self, pids):
+        """Запускает замену воркеров, отработавших max_requests, затем плавно останавливает их."""
+        pids = [pid for pid in pids if pid in self._workers and pid not in self._retiring]
+        if not pids:
+            return
+        logger.info(f"HTTP worker(s) {', '.join(map(str, pids))} reached max_requests; starting replacement(s).")
+        self._retiring.update(pids)
+        self._maintain()
+        self._signal_children(pids)
+
+    def _read_retired(self, fd):
+        """PID воркеров, сообщивших о достижении max_requests."""
+        data = b''
+        while True:
+            try:
+                chunk = os.read(fd, 4096)
+            except BlockingIOError:
+                break
+            if not chunk:
+                break
+            data += chunk
+        return [int(line) for line in data.split() if line.isdigit()]
+
+    def _signal_children(self, pids, signum=signal.SIGTERM):
+        for pid in pids:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def _child_pids(self):
+        pids = list(self._workers)
+        if self._background:
+            pids.append(self._background[0])
+        return pids
+
+    def _prepare(self):
+        """Предзагрузка библиотек и одноразовая подготовка до запуска воркеров."""
+        if self.preload:
+            started = time.perf_counter()
+            for module_name in self.preload:
+                importlib.import_module(module_name)
+            logger.info(f"Preloaded {len(self.preload)} module(s) in {time.perf_counter() - started:.2f}s.")
+        if self.bootstrap_path:
+            pid = self._fork(_run_bootstrap, self.factory_path, self.bootstrap_path)
+            _, status = os.waitpid(pid, 0)
+            code = os.waitstatus_to_exitcode(status)
+            if code != 0:
+                raise RuntimeError(f"Bootstrap {self.bootstrap_path} failed with exit code {code}.")
+
+    # --- Сигналы мастера ---
+
+    def _reload(self):
+        """Новое поколение воркеров, затем плавная остановка старого и фонового процесса."""
+        self.generation += 1
+        logger.info(f"Reloading: starting worker generation {self.generation}.")
+        old = [pid for pid, (generation, _) in self._workers.items() if generation < self.generation]
+        self._respawn_after = 0.0
+        self._maintain()
+        self._signal_children(old)
+        if self._background:
+            self._signal_children([self._background[0]])
+
+    def _stop(self):
+        logger.info(f"Stopping {len(self._child_pids())} child process(es)...")
+        self._signal_children(self._child_pids())
+        deadline = time.monotonic() + self.graceful_timeout + 5
+        while self._child_pids() and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        if self._child_pids():
+            logger.warning(f"Killing {len(self._child_pids())} child process(es) after graceful timeout.")
+            self._signal_children(self._child_pids(), signal.SIGKILL)
+            for pid in self._child_pids():
+                try:
+                    os.waitpid(pid, 0)
+                except ChildProcessError:
+                    pass
+        self._socket.close()
+        logger.info("Launcher stopped.")
+
+    def run(self):
+        """Основной цикл мастера. Блокирует до SIGTERM/SIGINT."""
+        self._prepare()
+        self._socket = bind_socket(self.host, self.port)
+        retire_read, self._retire_fd = os.pipe()
+        os.set_blocking(retire_read, False)
+        wakeup_read, wakeup_write = os.pipe()
+        os.set_blocking(wakeup_read, False)
+        os.set_blocking(wakeup_write, False)
+        signal.set_wakeup_fd(wakeup_write)
+        for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+            signal.signal(signum, lambda signum, frame: self._signals.append(signum))
+
+        logger.info(
+            f"Launcher {os.getpid()} listening on http://{self.host}:{self.port}/ "
+            f"with {self.workers} worker(s){' and a background process' if self.background_path else ''}."
+        )
+        try:
+            self._maintain()
+            while True:
+                try:
+                    select.select([wakeup_read, retire_read], [], [], 1.0)
+                    os.read(wakeup_read, 4096)
+                except BlockingIOError:
+                    pass
+                except OSError as e:
+                    if e.errno != errno.EINTR:
+                        raise
+
+                self._reap()
+                self._retire(self._read_retired(retire_read))
+                pending, self._signals = self._signals, []
+                if signal.SIGTERM in pending or signal.SIGINT in pending:
+                    break
+                if signal.SIGHUP in pending:
+                    self._reload()
+                self._maintain()
+        finally:
+            self._stop()
+            signal.set_wakeup_fd(-1)
+            os.close(wakeup_read)
+            os.close(wakeup_write)
+            os.close(retire_read)
+            os.close(self._retire_fd)
@@ -0,0 +1,118 @@
+# shared/locks.py
+
+"""
+Межпроцессные блокировки на файлах (flock) рядом с файлом БД SQLite.
+
+Используются там, где процессы одного сервиса должны исключать друг друга,
+например кэш состояния игроков GameService и тик мира (world-tick):
+блокировка снимается ОС автоматически, даже если процесс завершился аварийно.
+На платформах без fcntl (Windows) блокировка не действует.
+"""
+
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy.engine import make_url
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Интервал опроса занятой блокировки при ожидании с таймаутом (сек.)
+POLL_INTERVAL = 0.05
+
+
+def database_lock_path(uri: str, name: str):
+    """
+    Путь файла блокировки name рядом с файлом БД SQLite
+    (None для БД в памяти и не-SQLite БД).
+    """
+    url = make_url(uri)
+    if url.get_backend_name() != 'sqlite' or not url.database or url.database == ':memory:':
+        return None
+    return f"{os.path.abspath(url.database)}.{name}.lock"
+
+
+class FileLock:
+    """
+    Эксклюзивная блокировка файла, удерживаемая до release() или завершения процесса.
+
+    Args:
+        path: Путь файла блокировки (создается при необходимости).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+
+    @property
+    def held(self) -> bool:
+        return self._file is not None
+
+    def acquire(self, blocking: bool = True, timeout: float = None) -> bool:
+        """
+        Захватывает блокировку (повторный вызов в том же объекте ничего не делает).
+
+        Args:
+            blocking: Ждать, пока блокировку держит другой процесс.
+            timeout: Максимальное ожидание при blocking=True (None - без ограничения).
+
+        Returns:
+            True, если блокировка захвачена; False, если ее держит другой
+            процесс, а blocking=False или timeout истек.
+        """
+        if blocking and timeout is not None:
+            # flock не умеет ждать с таймаутом - опрашиваем неблокирующими попытками
+            deadline = time.monotonic() + timeout
+            while not self.acquire(blocking=False):
+                if time.monotonic() >= deadline:
+                    return False
+                time.sleep(POLL_INTERVAL)
+            return True
+        with self._lock:
+            if self._file is not None:
+                return True
+            if fcntl is None:
+                logger.warning(f"File locks are not supported on this platform, {self.path} is not locked.")
+                self._file = open(os.devnull, 'w')
+                return True
+            lock_file = open(self.path, 'a+')
+            try:
+                flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+                fcntl.flock(lock_file.fileno(), flags)
+            except BlockingIOError:
+                lock_file.close()
+                return False
+            except BaseException:
+                lock_file.close()
+                raise
+            # Для диагностики: какой процесс держит блокировку
+            lock_file.seek(0)
+            lock_file.truncate()
+            lock_file.write(f"{os.getpid()}\n")
+            lock_file.flush()
+            self._file = lock_file
+            return True
+
+    def release(self):
+        with self._lock:
+            if self._file is None:
+                return
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+    def owner_pid(self):
+        """PID процесса, записанный последним владельцем блокировки (или None)."""
+        try:
+            with open(self.path) as lock_file:
+                return int(lock_file.read().strip() or 0) or None
+        except (OSError, ValueError):
+            return None
@@ -0,0 +1,345 @@
+# shared/memory_broker.py
+
+"""
+Брокер сообщений в памяти процесса (транспорт MESSAGE_TRANSPORT = 'memory').
+
+Повторяет подмножество BlockingConnection/BlockingChannel pika, которое
+используют публикация и консьюмеры shared/rabbitmq.py, с той же семантикой
+очередей RabbitMQ:
+    - queue_declare идемпотентен, повторное объявление с другим durable -
+      ошибка PRECONDITION_FAILED (ChannelClosedByBroker 406);
+    - публикация в default exchange ('') в необъявленную очередь теряется
+      (как немаршрутизируемое сообщение без mandatory);
+    - exchange типа 'x-consistent-hash' (плагин rabbitmq_consistent_hash_exchange)
+      распределяет сообщения по привязанным очередям по хэшу routing key;
+      ключ привязки - вес очереди на кольце хэшей;
+    - basic_qos(prefetch_count) ограничивает число неподтвержденных сообщений канала;
+    - basic_ack/basic_nack с multiple, nack с requeue=True и закрытие канала
+      возвращают сообщения в начало очереди с redelivered=True.
+
+Брокер общий для всех приложений процесса, поэтому подходит для тестов,
+бенчмарков и запуска сервисов в одном процессе. Сообщения не переживают
+перезапуск процесса независимо от durable и delivery_mode, и процессы
+не видят очереди друг друга.
+"""
+
+import bisect
+import hashlib
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+
+from pika.exceptions import ChannelClosedByBroker, ChannelWrongStateError
+from pika.frame import Method
+from pika.spec import Basic, BasicProperties, Queue
+
+logger = logging.getLogger(__name__)
+
+CONSISTENT_HASH = 'x-consistent-hash'
+# Точек на кольце хэшей на единицу веса привязки
+RING_POINTS_PER_WEIGHT = 100
+
+
+def _ring_hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+
+class _MemoryQueue:
+    def __init__(self, name: str, durable: bool, lock: threading.Lock):
+        self.name = name
+        self.durable = durable
+        self.messages = deque()  # (body, properties, redelivered, exchange, routing_key)
+        self.available = threading.Condition(lock)
+
+
+class _ConsistentHashExchange:
+    """
+    Exchange 'x-consistent-hash': у каждой привязанной очереди weight * RING_POINTS_PER_WEIGHT
+    точек на кольце, сообщение уходит в очередь ближайшей по часовой стрелке точки
+    от хэша routing key. Добавление или удаление очереди переносит только ключи
+    соседних с ее точками участков кольца.
+    """
+
+    def __init__(self, name: str, durable: bool):
+        self.name = name
+        self.durable = durable
+        self.bindings = {}  # очередь -> вес
+        self._ring = []  # отсортированные (хэш точки, очередь)
+
+    def bind(self, queue: str, routing_key: str):
+        try:
+            weight = int(routing_key)
+        except (TypeError, ValueError):
+            raise ValueError(f"Binding key of consistent-hash exchange '{self.name}' must be an integer weight, "
+                             f"got {routing_key!r}")
+        self.bindings[queue] = weight
+        self._rebuild()
+
+    def unbind(self, queue: str):
+        if self.bindings.pop(queue, None) is not None:
+            self._rebuild()
+
+    def _rebuild(self):
+        self._ring = sorted(
+            (_ring_hash(f"{queue}:{point}"), queue)
+            for queue, weight in self.bindings.items()
+            for point in range(weight * RING_POINTS_PER_WEIGHT)
+        )
+
+    def route(self, routing_key: str):
+        if not self._ring:
+            return None
+        index = bisect.bisect(self._ring, (_ring_hash(routing_key),))
+        return self._ring[index % len(self._ring)][1]
+
+
+class MemoryBroker:
+    """Очереди брокера в памяти. Все операции потокобезопасны."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queues = {}
+        self._exchanges = {}
+
+    def queue_declare(self, queue: str, durable: bool = False) -> _MemoryQueue:
+        with self._lock:
+            declared = self._queues.get(queue)
+            if declared is None:
+                declared = self._queues[queue] = _MemoryQueue(queue, durable, self._lock)
+            elif declared.durable != durable:
+                raise ChannelClosedByBroker(
+                    406, f"PRECONDITION_FAILED - inequivalent arg 'durable' for queue '{queue}': "
+                         f"received '{str(durable).lower()}' but current is '{str(declared.durable).lower()}'"
+                )
+            return declared
+
+    def exchange_declare(self, exchange: str, exchange_type: str, durable: bool = False):
+        if exchange_type != CONSISTENT_HASH:
+            raise ValueError(f"Memory broker supports only '{CONSISTENT_HASH}' exchanges, got '{exchange_type}'")
+        with self._lock:
+            declared = self._exchanges.get(exchange)
+            if declared is None:
+                self._exchanges[exchange] = _ConsistentHashExchange(exchange, durable)
+            elif declared.durable != durable:
+                raise ChannelClosedByBroker(
+                    406, f"PRECONDITION_FAILED - inequivalent arg 'durable' for exchange '{exchange}'"
+                )
+
+    def _get_exchange(self, exchange: str) -> _ConsistentHashExchange:
+        declared = self._exchanges.get(exchange)
+        if declared is None:
+            raise ChannelClosedByBroker(404, f"NOT_FOUND - no exchange '{exchange}'")
+        return declared
+
+    def queue_bind(self, queue: str, exchange: str, routing_key: str):
+        with self._lock:
+            if queue not in self._queues:
+                raise ChannelClosedByBroker(404, f"NOT_FOUND - no queue '{queue}'")
+            self._get_exchange(exchange).bind(queue, routing_key)
+
+    def queue_unbind(self, queue: str, exchange: str):
+        with self._lock:
+            self._get_exchange(exchange).unbind(queue)
+
+    def publish(self, queue: str, bodies: list, properties: BasicProperties = None):
+        """Помещает сообщения в очередь (необъявленная очередь - сообщения теряются)."""
+        with self._lock:
+            declared = self._queues.get(queue)
+            if declared is None:
+                logger.warning(f"Dropped {len(bodies)} unroutable message(s) for undeclared queue '{queue}'.")
+                return
+            declared.messages.extend(
+                (body.encode() if isinstance(body, str) else body, properties, False, '', queue) for body in bodies
+            )
+            declared.available.notify_all()
+
+    def publish_routed(self, exchange: str, routing_keys: list, bodies: list, properties: BasicProperties = None):
+        """
+        Публикует сообщения в exchange: каждое - в очередь, выбранную по своему routing key
+        (без привязанных очередей сообщения теряются).
+        """
+        with self._lock:
+            declared_exchange = self._get_exchange(exchange)
+            woken = {}
+            for routing_key, body in zip(routing_keys, bodies):
+                declared = self._queues.get(declared_exchange.route(routing_key))
+                if declared is None:
+                    logger.warning(f"Dropped unroutable message with key '{routing_key}' for exchange '{exchange}'.")
+                    continue
+                declared.messages.append(
+                    (body.encode() if isinstance(body, str) else body, properties, False, exchange, routing_key)
+                )
+                woken[declared.name] = declared
+            for declared in woken.values():
+                declared.available.notify_all()
+
+    def queue_delete(self, queue: str):
+        with self._lock:
+            declared = self._queues.pop(queue, None)
+            for exchange in self._exchanges.values():
+                exchange.unbind(queue)
+            if declared is not None:
+                declared.messages.clear()
+                declared.available.notify_all()
+
+    def get_queue(self, queue: str) -> _MemoryQueue:
+        with self._lock:
+            declared = self._queues.get(queue)
+        if declared is None:
+            raise ChannelClosedByBroker(404, f"NOT_FOUND - no queue '{queue}'")
+        return declared
+
+    def message_count(self, queue: str) -> int:
+        """Число сообщений, ожидающих доставки (без неподтвержденных)."""
+        with self._lock:
+            declared = self._queues.get(queue)
+            return len(declared.messages) if declared is not None else 0
+
+    def _requeue(self, entries):
+        """Возвращает сообщения в начало своих очередей в исходном порядке. Вызывать под блокировкой."""
+        for declared, body, properties, exchange, routing_key in reversed(entries):
+            declared.messages.appendleft((body, properties, True, exchange, routing_key))
+            declared.available.notify_all()
+
+
+class MemoryChannel:
+    """Канал брокера в памяти с интерфейсом подмножества pika BlockingChannel."""
+
+    def __init__(self, broker: MemoryBroker):
+        self.broker = broker
+        self.is_open = True
+        self.prefetch_count = 0  # 0 - без ограничения, как в RabbitMQ
+        self._tags = itertools.count(1)
+        self._unacked = {}  # delivery_tag -> (очередь, тело, свойства, exchange, routing key)
+
+    def _check_open(self):
+        if not self.is_open:
+            raise ChannelWrongStateError('Channel is closed.')
+
+    def queue_declare(self, queue: str, passive: bool = False, durable: bool = False, **kwargs):
+        """Как в pika: возвращает Method с Queue.DeclareOk; passive - только проверка существования."""
+        self._check_open()
+        declared = self.broker.get_queue(queue) if passive else self.broker.queue_declare(queue, durable)
+        return Method(1, Queue.DeclareOk(queue=queue, message_count=self.broker.message_count(declared.name)))
+
+    def exchange_declare(self, exchange: str, exchange_type: str = CONSISTENT_HASH, durable: bool = False, **kwargs):
+        self._check_open()
+        self.broker.exchange_declare(exchange, exchange_type, durable)
+
+    def queue_bind(self, queue: str, exchange: str, routing_key: str = None, **kwargs):
+        self._check_open()
+        self.broker.queue_bind(queue, exchange, routing_key)
+
+    def queue_unbind(self, queue: str, exchange: str = None, routing_key: str = None, **kwargs):
+        self._check_open()
+        self.broker.queue_unbind(queue, exchange)
+
+    def queue_delete(self, queue: str, **kwargs):
+        self._check_open()
+        self.broker.queue_delete(queue)
+
+    def basic_qos(self, prefetch_count: int = 0, **kwargs):
+        self._check_open()
+        self.prefetch_count = prefetch_count
+
+    def confirm_delivery(self):
+        """Публикация в брокер в памяти синхронна, отдельные подтверждения не нужны."""
+        self._check_open()
+
+    def basic_publish(self, exchange: str, routing_key: str, body, properties: BasicProperties = None, **kwargs):
+        self._check_open()
+        if exchange:
+            self.broker.publish_routed(exchange, [routing_key], [body], properties)
+        else:
+            self.broker.publish(routing_key, [body], properties)
+
+    def _window_open(self) -> bool:
+        return not self.prefetch_count or len(self._unacked) < self.prefetch_count
+
+    def consume(self, queue: str, auto_ack: bool = False, inactivity_timeout: float = None):
+        """
+        Генератор доставок (method, properties, body), как BlockingChannel.consume.
+        Если за inactivity_timeout сообщений нет, выдает (None, None, None).
+        """
+        self._check_open()
+        declared = self.broker.get_queue(queue)
+        while self.is_open:
+            deadline = time.monotonic() + inactivity_timeout if inactivity_timeout is not None else None
+            with declared.available:
+                while self.is_open and not (declared.messages and (auto_ack or self._window_open())):
+                    remaining = deadline - time.monotonic() if deadline is not None else None
+                    if remaining is not None and remaining <= 0:
+                        break
+                    declared.available.wait(remaining)
+                if not self.is_open:
+                    return
+                if not declared.messages or not (auto_ack or self._window_open()):
+                    delivery = None
+                else:
+                    body, properties, redelivered, exchange, routing_key = declared.messages.popleft()
+                    delivery_tag = next(self._tags)
+                    if not auto_ack:
+                        self._unacked[delivery_tag] = (declared, body, properties, exchange, routing_key)
+                    delivery = (Basic.Deliver(delivery_tag=delivery_tag, redelivered=redelivered,
+                                              exchange=exchange, routing_key=routing_key),
+                                properties or BasicProperties(), body)
+            yield delivery if delivery is not None else (None, None, None)
+
+    def _settle(self, delivery_tag: int, multiple: bool) -> list:
+        """Снимает сообщения с учета неподтвержденных. Вызывать под блокировкой брокера."""
+        tags = [tag for tag in self._unacked if tag <= delivery_tag] if multiple else [delivery_tag]
+        entries = [self._unacked.pop(tag) for tag in tags if tag in self._unacked]
+        # Окно prefetch освободилось - будим ожидающих доставки в этих очередях
+        for declared in {id(entry[0]): entry[0] for entry in entries}.values():
+            declared.available.notify_all()
+        return entries
+
+    def basic_ack(self, delivery_tag: int = 0, multiple: bool = False):
+        self._check_open()
+        with self.broker._lock:
+            self._settle(delivery_tag, multiple)
+
+    def basic_nack(self, delivery_tag: int = 0, multiple: bool = False, requeue: bool = True):
+        self._check_open()
+        with self.broker._lock:
+            entries = self._settle(delivery_tag, multiple)
+            if requeue:
+                self.broker._requeue(entries)
+
+    def cancel(self):
+        """Как BlockingChannel.cancel: неподтвержденные сообщения возвращаются в очереди."""
+        with self.broker._lock:
+            self.broker._requeue(list(self._unacked.values()))
+            self._unacked.clear()
+
+    def close(self):
+        if not self.is_open:
+            return
+        self.cancel()
+        with self.broker._lock:
+            self.is_open = False
+            for declared in self.broker._queues.values():
+                declared.available.notify_all()
+
+
+class MemoryConnection:
+    """Соединение с брокером в памяти (интерфейс подмножества pika BlockingConnection)."""
+
+    def __init__(self, broker: MemoryBroker):
+        self.broker = broker
+        self.is_open = True
+        self._channels = []
+
+    def channel(self) -> MemoryChannel:
+        if not self.is_open:
+            raise ChannelWrongStateError('Connection is closed.')
+        channel = MemoryChannel(self.broker)
+        self._channels.append(channel)
+        return channel
+
+    def close(self):
+        for channel in self._channels:
+            channel.close()
+        self.is_open = False
@@ -1,61 +1,509 @@
 # shared/rabbitmq.py
+
+"""
+Публикация и консьюмеры сообщений сервисов.
+
+Транспорт выбирается настройкой MESSAGE_TRANSPORT:
+    - 'rabbitmq' (по умолчанию) - RabbitMQ через pika (PikaTransport);
+    - 'memory' - брокер в памяти процесса (MemoryTransport, shared/memory_broker.py)
+      для тестов, бенчмарков и сервисов, запущенных в одном процессе.
+Оба транспорта дают консьюмерам соединение с одинаковым интерфейсом
+(подмножество pika BlockingConnection) и одинаковой семантикой очередей:
+durable-очереди, ручные ack/nack и prefetch.
+
+Партиционирование (MESSAGE_PARTITIONS = K > 0): сообщения, отправленные
+с ключом (send_message(..., partition_key=user_id)), публикуются не в очередь
+<queue>, а в exchange <queue>.partitioned типа 'x-consistent-hash' (для RabbitMQ
+нужен плагин rabbitmq_consistent_hash_exchange), который по хэшу ключа
+выбирает одну из K очередей-партиций <queue>.p0 ... <queue>.p{K-1}. Все
+сообщения одного ключа попадают в одну партицию, а у каждой партиции ровно
+один консьюмер во всем парке процессов, поэтому сообщения одного пользователя
+обрабатываются по порядку. Процесс читает партиции с номерами i, для которых
+i % CONSUMER_PROCESS_COUNT == CONSUMER_PROCESS_INDEX.
+
+Изменение K: при увеличении consistent hashing переносит в новые партиции
+примерно долю 1/K ключей; при уменьшении процесс с CONSUMER_PROCESS_INDEX = 0
+при старте отвязывает лишние партиции, переносит их сообщения обратно
+в exchange и удаляет их. Пока старые партиции не разобраны, порядок
+сообщений перенесенных ключей не гарантируется. K должно меняться
+одновременно у публикующих сервисов и консьюмеров, а старые консьюмеры -
+останавливаться до запуска новых.
+
+Формат тел сообщений задает EVENT_ENCODING публикующего сервиса
+(shared/envelope.py): по событию на сообщение или конверты из нескольких
+событий. Консьюмеры распаковывают сообщения по content_type и передают
+события пакетному обработчику одной пачкой.
+"""
+
+import atexit
 import pika
-import json
+import queue
 import logging
 import time
 import threading
 from flask import current_app # Используем current_app для доступа к config
 
+from .envelope import PLAIN_JSON, content_type_for, pack, unpack
+from .memory_broker import MemoryBroker, MemoryConnection
+
 logger = logging.getLogger(__name__)
 
-# --- Функция для отправки сообщений ---
-def send_message(queue_name: str, message_body: dict):
+# --- Пул соединений для отправки сообщений ---
+
+# Максимальное ожидание подтверждений брокера на пачку (сек.)
+CONFIRM_TIMEOUT = 30.0
+
+# Тип exchange партиций и вес каждой партиции на кольце хэшей (ключ привязки)
+CONSISTENT_HASH_EXCHANGE = 'x-consistent-hash'
+PARTITION_WEIGHT = '1'
+
+_persistent_properties = {}
+
+def _persistent(content_type: str) -> pika.BasicProperties:
+    properties = _persistent_properties.get(content_type)
+    if properties is None:
+        properties = _persistent_properties[content_type] = pika.BasicProperties(
+            delivery_mode=2,  # Сделать сообщение постоянным
+            content_type=content_type,
+        )
+    return properties
+
+
+class _PublisherChannel:
+    """
+    Долгоживущее соединение и канал для публикации.
+
+    Канал работает в режиме publisher confirms. BlockingChannel.basic_publish
+    в этом режиме ждет подтверждения каждого сообщения отдельно, поэтому пачка
+    публикуется через асинхронный канал pika, лежащий под BlockingChannel,
+    а подтверждения брокера (в том числе multiple=True) собираются одним
+    ожиданием на всю пачку.
+    """
+
+    def __init__(self, host: str, confirm_timeout: float = CONFIRM_TIMEOUT):
+        self.connection = pika.BlockingConnection(pika.ConnectionParameters(host=host))
+        self.channel = self.connection.channel()
+        self.confirm_timeout = confirm_timeout
+        self.declared_queues = set() # Очереди, уже объявленные на этом канале
+        self._impl = self.channel._impl  # Асинхронный pika.channel.Channel
+        self._last_tag = 0  # Номер последнего опубликованного сообщения (delivery tag)
+        self._unconfirmed = set()
+        self._nacked = 0
+        selected = []
+        self._impl.confirm_delivery(ack_nack_callback=self._on_confirm, callback=selected.append)
+        self._wait(lambda: selected, "Confirm.Select")
+
+    @property
+    def is_open(self) -> bool:
+        return self.connection.is_open and self.channel.is_open
+
+    def _on_confirm(self, frame):
+        method = frame.method
+        tags = ({tag for tag in self._unconfirmed if tag <= method.delivery_tag}
+                if method.multiple else {method.delivery_tag} & self._unconfirmed)
+        self._unconfirmed -= tags
+        if isinstance(method, pika.spec.Basic.Nack):
+            self._nacked += len(tags)
+
+    def _wait(self, ready: callable, what: str):
+        deadline = time.monotonic() + self.confirm_timeout
+        while not ready():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.is_open:
+                raise pika.exceptions.AMQPChannelError(f"No {what} from RabbitMQ within {self.confirm_timeout}s")
+            self.connection.process_data_events(time_limit=remaining)
+
+    def publish(self, queue_name: str, bodies: list, partition_keys: list = None, partitions: int = 0,
+                content_type: str = PLAIN_JSON):
+        if partition_keys is not None and partitions:
+            if (queue_name, partitions) not in self.declared_queues:
+                declare_partitions(self.channel, queue_name, partitions)
+                self.declared_queues.add((queue_name, partitions))
+            exchange = partition_exchange_name(queue_name)
+            routing_keys = [str(key) for key in partition_keys]
+        else:
+            if queue_name not in self.declared_queues:
+                # Объявляем очередь как durable=True для устойчивости (один раз на канал)
+                self.channel.queue_declare(queue=queue_name, durable=True)
+                self.declared_queues.add(queue_name)
+            exchange = ''
+            routing_keys = [queue_name] * len(bodies)
+
+        self._nacked = 0
+        properties = _persistent(content_type)
+        for body, routing_key in zip(bodies, routing_keys):
+            # Публикуем сообщение с delivery_mode=2 для персистентности
+            self._impl.basic_publish(
+                exchange=exchange,
+                routing_key=routing_key,
+                body=body,
+                properties=properties,
+            )
+            self._last_tag += 1
+            self._unconfirmed.add(self._last_tag)
+        # Одно ожидание на пачку: брокер подтверждает сообщения по мере записи на диск
+        self._wait(lambda: not self._unconfirmed, "publisher confirms")
+        if self._nacked:
+            raise pika.exceptions.AMQPChannelError(f"RabbitMQ rejected {self._nacked} of {len(bodies)} message(s)")
+
+    def close(self):
+        try:
+            if self.connection.is_open:
+                self.connection.close()
+        except Exception as e:
+            logger.debug(f"Error closing pooled RabbitMQ connection: {e}")
+
+
+class Publisher:
+    """
+    Потокобезопасный пул соединений RabbitMQ для публикации сообщений.
+
+    Каждый поток на время публикации берет из пула свой канал (BlockingConnection
+    не потокобезопасен), после чего возвращает его обратно. Разорванные
+    соединения отбрасываются, и публикация повторяется на новом соединении.
+
+    Args:
+        host: Хост RabbitMQ.
+        pool_size: Максимальное число одновременно открытых соединений.
+    """
+
+    def __init__(self, host: str, pool_size: int = 4):
+        self.host = host
+        self._idle = queue.LifoQueue() # LIFO: чаще используем "теплые" соединения
+        self._slots = threading.BoundedSemaphore(pool_size)
+
+    def _checkout(self) -> _PublisherChannel:
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                return _PublisherChannel(self.host)
+            if pooled.is_open:
+                return pooled
+            pooled.close()
+
+    def publish(self, queue_name: str, bodies: list, partition_keys: list = None, partitions: int = 0,
+                content_type: str = PLAIN_JSON, retries: int = 1):
+        """
+        Публикует пачку уже сериализованных сообщений и ждет подтверждения брокера.
+        С partition_keys и partitions > 0 - в партиции очереди (ключ на каждое сообщение).
+
+        Raises:
+            pika.exceptions.AMQPError: Если публикация не удалась и после переподключения.
+        """
+        with self._slots:
+            for attempt in range(retries + 1):
+                pooled = None
+                try:
+                    pooled = self._checkout()
+                    pooled.publish(queue_name, bodies, partition_keys, partitions, content_type)
+                    self._idle.put(pooled)
+                    return
+                except pika.exceptions.AMQPError as e:
+                    if pooled:
+                        pooled.close()
+                    if attempt >= retries:
+                        raise
+                    logger.warning(f"RabbitMQ publish to '{queue_name}' failed ({e!r}). Reconnecting...")
+
+    def close(self):
+        """Закрывает все простаивающие соединения пула."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+_publishers = {}
+_publishers_lock = threading.Lock()
+
+def get_publisher(host: str, pool_size: int = 4) -> Publisher:
+    """Возвращает общий для процесса пул публикации для указанного хоста."""
+    publisher = _publishers.get(host)
+    if publisher is None:
+        with _publishers_lock:
+            publisher = _publishers.get(host)
+            if publisher is None:
+                publisher = _publishers[host] = Publisher(host, pool_size)
+    return publisher
+
+@atexit.register
+def _close_publishers():
+    for publisher in list(_publishers.values()):
+        publisher.close()
+
+# --- Транспорты сообщений ---
+
+class Transport:
+    """
+    Интерфейс транспорта сообщений.
+
+    connect() возвращает соединение с интерфейсом pika BlockingConnection
+    (channel(), close(), is_open) для консьюмеров, publish() публикует пачку
+    сериализованных сообщений с content_type в durable-очередь (или, с
+    partition_keys и partitions > 0, в ее партиции) и ждет подтверждения брокера.
+    """
+
+    name = None
+
+    def connect(self):
+        raise NotImplementedError
+
+    def publish(self, queue_name: str, bodies: list, partition_keys: list = None, partitions: int = 0,
+                content_type: str = PLAIN_JSON):
+        raise NotImplementedError
+
+
+class PikaTransport(Transport):
+    """RabbitMQ через pika: пул публикации (Publisher) и BlockingConnection для консьюмеров."""
+
+    name = 'rabbitmq'
+
+    def __init__(self, host: str, pool_size: int = 4):
+        self.host = host
+        self.pool_size = pool_size
+
+    def __str__(self):
+        return f"RabbitMQ at {self.host}"
+
+    def connect(self):
+        return pika.BlockingConnection(pika.ConnectionParameters(host=self.host))
+
+    def publish(self, queue_name: str, bodies: list, partition_keys: list = None, partitions: int = 0,
+                content_type: str = PLAIN_JSON):
+        get_publisher(self.host, self.pool_size).publish(queue_name, bodies, partition_keys, partitions, content_type)
+
+
+class MemoryTransport(Transport):
+    """Брокер в памяти процесса (shared/memory_broker.py)."""
+
+    name = 'memory'
+
+    def __init__(self, broker: MemoryBroker):
+        self.broker = broker
+
+    def __str__(self):
+        return "in-memory broker"
+
+    def connect(self):
+        return MemoryConnection(self.broker)
+
+    def publish(self, queue_name: str, bodies: list, partition_keys: list = None, partitions: int = 0,
+                content_type: str = PLAIN_JSON):
+        # Как Publisher: очереди объявляются durable, сообщения - persistent
+        if partition_keys is not None and partitions:
+            connection = self.connect()
+            try:
+                declare_partitions(connection.channel(), queue_name, partitions)
+            finally:
+                connection.close()
+            self.broker.publish_routed(partition_exchange_name(queue_name), [str(key) for key in partition_keys],
+                                       bodies, _persistent(content_type))
+            return
+        self.broker.queue_declare(queue_name, durable=True)
+        self.broker.publish(queue_name, bodies, _persistent(content_type))
+
+
+# Общий брокер в памяти: публикация и консьюмеры всех приложений процесса
+memory_broker = MemoryBroker()
+
+def get_transport(config) -> Transport:
+    """
+    Транспорт по конфигурации приложения (MESSAGE_TRANSPORT).
+
+    Raises:
+        ValueError: Неизвестное значение MESSAGE_TRANSPORT.
+    """
+    name = config.get('MESSAGE_TRANSPORT', 'rabbitmq')
+    if name == PikaTransport.name:
+        return PikaTransport(config.get('RABBITMQ_HOST', 'localhost'), config.get('RABBITMQ_PUBLISHER_POOL_SIZE', 4))
+    if name == MemoryTransport.name:
+        return MemoryTransport(memory_broker)
+    raise ValueError(f"Unknown MESSAGE_TRANSPORT '{name}' (expected '{PikaTransport.name}' or '{MemoryTransport.name}')")
+
+# --- Партиции очередей ---
+
+def partition_exchange_name(queue_name: str) -> str:
+    return f"{queue_name}.partitioned"
+
+def partition_queue_name(queue_name: str, index: int) -> str:
+    return f"{queue_name}.p{index}"
+
+def declare_partitions(channel, queue_name: str, partitions: int):
+    """Объявляет consistent-hash exchange очереди и привязанные к нему партиции 0..partitions-1 (идемпотентно)."""
+    exchange = partition_exchange_name(queue_name)
+    channel.exchange_declare(exchange=exchange, exchange_type=CONSISTENT_HASH_EXCHANGE, durable=True)
+    for index in range(partitions):
+        partition = partition_queue_name(queue_name, index)
+        channel.queue_declare(queue=partition, durable=True)
+        channel.queue_bind(queue=partition, exchange=exchange, routing_key=PARTITION_WEIGHT)
+
+def _partition_exists(connection, queue: str) -> bool:
+    # Пассивное объявление несуществующей очереди закрывает канал (404), поэтому канал отдельный
+    probe = connection.channel()
+    try:
+        probe.queue_declare(queue=queue, passive=True)
+        return True
+    except pika.exceptions.ChannelClosedByBroker:
+        return False
+    finally:
+        if probe.is_open:
+            probe.close()
+
+def rebalance_partitions(connection, queue_name: str, partitions: int, drain_timeout: float = 1.0) -> int:
+    """
+    Объявляет партиции очереди и убирает лишние, оставшиеся от большего числа партиций.
+
+    Лишние партиции (номера от partitions подряд, пока очередь существует)
+    отвязываются от exchange, их сообщения публикуются обратно в exchange
+    с исходным ключом (и попадают в актуальные партиции), после чего очередь
+    удаляется. Консьюмеры лишних партиций должны быть уже остановлены.
+
+    Returns:
+        Число перенесенных сообщений.
+    """
+    channel = connection.channel()
+    declare_partitions(channel, queue_name, partitions)
+    # Подтверждение каждой перенесенной публикации до ack исходного сообщения
+    channel.confirm_delivery()
+    exchange = partition_exchange_name(queue_name)
+    moved = 0
+    index = partitions
+    while _partition_exists(connection, partition_queue_name(queue_name, index)):
+        stale = partition_queue_name(queue_name, index)
+        channel.queue_unbind(queue=stale, exchange=exchange, routing_key=PARTITION_WEIGHT)
+        count = 0
+        for method, properties, body in channel.consume(stale, auto_ack=False, inactivity_timeout=drain_timeout):
+            if method is None:
+                break
+            channel.basic_publish(exchange=exchange, routing_key=method.routing_key, body=body, properties=properties)
+            channel.basic_ack(delivery_tag=method.delivery_tag)
+            count += 1
+        channel.cancel()
+        channel.queue_delete(queue=stale)
+        logger.info(f"Removed stale partition '{stale}', moved {count} message(s) to '{exchange}'.")
+        moved += count
+        index += 1
+    channel.close()
+    return moved
+
+def assigned_partitions(partitions: int, process_index: int, process_count: int) -> list:
+    """
+    Номера партиций, которые читает процесс process_index из process_count.
+
+    Raises:
+        ValueError: Некорректные process_index/process_count.
+    """
+    if process_count < 1 or not 0 <= process_index < process_count:
+        raise ValueError(f"Invalid consumer process {process_index} of {process_count} "
+                         f"(CONSUMER_PROCESS_INDEX must be in 0..CONSUMER_PROCESS_COUNT-1)")
+    return [index for index in range(partitions) if index % process_count == process_index]
+
+def prepare_partitions(app, queue_name: str, partitions: int) -> list:
+    """
+    Готовит партиции очереди к чтению этим процессом: объявляет их, а в процессе
+    с CONSUMER_PROCESS_INDEX = 0 еще и убирает лишние (rebalance_partitions).
+
+    Returns:
+        Имена партиций, назначенных процессу.
+
+    Raises:
+        pika.exceptions.AMQPError: Брокер недоступен.
+    """
+    process_index = app.config.get('CONSUMER_PROCESS_INDEX', 0)
+    owned = assigned_partitions(partitions, process_index, app.config.get('CONSUMER_PROCESS_COUNT', 1))
+    transport = get_transport(app.config)
+    connection = transport.connect()
+    try:
+        if process_index == 0:
+            moved = rebalance_partitions(connection, queue_name, partitions)
+            if moved:
+                logger.warning(f"Moved {moved} message(s) of '{queue_name}' from stale partitions; "
+                               f"their per-user order is not guaranteed.")
+        else:
+            declare_partitions(connection.channel(), queue_name, partitions)
+    finally:
+        if connection.is_open:
+            connection.close()
+    return [partition_queue_name(queue_name, index) for index in owned]
+
+# --- Функции для отправки сообщений ---
+def send_messages(queue_name: str, message_bodies: list, partition_keys: list = None) -> bool:
     """
-    Отправляет JSON-сообщение в указанную очередь RabbitMQ.
+    Отправляет пачку JSON-событий в указанную очередь и ждет подтверждений брокера.
+
+    Важно: эта функция должна вызываться из контекста запроса или приложения Flask.
 
     Args:
         queue_name: Имя очереди.
-        message_body: Словарь Python, который будет сериализован в JSON.
+        message_bodies: Список словарей Python (событий). При EVENT_ENCODING = 'none'
+                        каждое сериализуется в отдельное сообщение, иначе события
+                        упаковываются в конверты до EVENT_ENVELOPE_MAX_EVENTS штук.
+        partition_keys: Ключи партиционирования (например, user_id) для каждого события.
+                        При MESSAGE_PARTITIONS > 0 события публикуются в партиции очереди,
+                        а в один конверт попадают только события одного ключа.
+
+    Returns:
+        True, если брокер подтвердил всю пачку, иначе False.
     """
-    connection = None
+    config = current_app.config
+    transport = get_transport(config)
     try:
-        # Получаем хост из конфигурации текущего Flask-приложения
-        # Важно: эта функция должна вызываться из контекста запроса или приложения Flask
-        # ИЛИ ей нужно передавать config/app явно, если она вызывается вне контекста.
-        # Для простоты предположим, что она вызывается из роутов Flask.
-        rmq_host = current_app.config.get('RABBITMQ_HOST', 'localhost')
-
-        connection = pika.BlockingConnection(pika.ConnectionParameters(host=rmq_host))
-        channel = connection.channel()
-
-        # Объявляем очередь как durable=True для устойчивости
-        channel.queue_declare(queue=queue_name, durable=True)
-
-        # Сериализуем сообщение
-        body_str = json.dumps(message_body)
-
-        # Публикуем сообщение с delivery_mode=2 для персистентности
-        channel.basic_publish(
-            exchange='',
-            routing_key=queue_name,
-            body=body_str,
-            properties=pika.BasicProperties(
-                delivery_mode=2,  # Сделать сообщение постоянным
-                content_type='application/json',
-            )
-        )
-        logger.info(f"Sent message to queue '{queue_name}'. Body: {body_str[:100]}...") # Логгируем часть тела
+        if partition_keys is not None and len(partition_keys) != len(message_bodies):
+            raise ValueError(f"Got {len(partition_keys)} partition key(s) for {len(message_bodies)} message(s)")
+        encoding = config.get('EVENT_ENCODING', 'none')
+        max_events = config.get('EVENT_ENVELOPE_MAX_EVENTS', 100)
+        partitions = config.get('MESSAGE_PARTITIONS', 0)
+        if partition_keys is None or not partitions:
+            bodies, keys = pack(message_bodies, encoding, max_events), None
+        else:
+            by_key = {}
+            for key, message_body in zip(partition_keys, message_bodies):
+                by_key.setdefault(str(key), []).append(message_body)
+            bodies, keys = [], []
+            for key, events in by_key.items():
+                packed = pack(events, encoding, max_events)
+                bodies.extend(packed)
+                keys.extend([key] * len(packed))
+        transport.publish(queue_name, bodies, keys, partitions, content_type_for(encoding))
+        logger.info(f"Sent {len(message_bodies)} event(s) in {len(bodies)} message(s) to queue '{queue_name}' "
+                    f"({encoding} encoding).")
+        return True
     except pika.exceptions.AMQPConnectionError as e:
-        logger.error(f"Failed to connect to RabbitMQ at {rmq_host}: {e}")
+        logger.error(f"Failed to connect to {transport}: {e}")
     except Exception as e:
-        logger.error(f"Error sending message to RabbitMQ queue '{queue_name}': {e}")
-    finally:
-        if connection and connection.is_open:
-            connection.close()
-            logger.debug(f"RabbitMQ connection closed for sending to '{queue_name}'.")
+        logger.error(f"Error sending message to queue '{queue_name}' via {transport}: {e}")
+    return False
+
+def send_message(queue_name: str, message_body: dict, partition_key=None) -> bool:
+    """
+    Отправляет JSON-сообщение в указанную очередь.
+
+    Для RabbitMQ использует общий пул соединений, поэтому не открывает новое
+    TCP/AMQP-соединение на каждый вызов.
+
+    Args:
+        queue_name: Имя очереди.
+        message_body: Словарь Python, который будет сериализован в JSON.
+        partition_key: Ключ партиционирования (например, user_id), см. send_messages.
+
+    Returns:
+        True, если брокер подтвердил сообщение, иначе False.
+    """
+    return send_messages(queue_name, [message_body], None if partition_key is None else [partition_key])
 
 # --- Функции для запуска консьюмера ---
 
+def _rollback_db_session(app):
+    """Откатывает сессию Flask-SQLAlchemy приложения после ошибки обработки."""
+    db = app.extensions.get('sqlalchemy')
+    if db is None:
+        return
+    with app.app_context():
+        db.session.rollback()
+    logger.warning("Database session rolled back due to processing error.")
+
 def _consumer_loop(app, queue_name: str, processing_callback: callable):
     """
     Внутренний цикл консьюмера, обрабатывающий соединение и сообщения.
@@ -70,13 +518,13 @@ def _consumer_loop(app, queue_name: str, processing_callback: callable):
     """
     logger.info(f"Consumer thread for queue '{queue_name}' started. Waiting for app context...")
     time.sleep(2) # Даем приложению время на запуск
+    transport = get_transport(app.config)
 
     while True:
         connection = None
         try:
-            rmq_host = app.config.get('RABBITMQ_HOST', 'localhost')
-            logger.info(f"Attempting RabbitMQ connection to {rmq_host} for queue '{queue_name}'...")
-            connection = pika.BlockingConnection(pika.ConnectionParameters(host=rmq_host))
+            logger.info(f"Attempting connection to {transport} for queue '{queue_name}'...")
+            connection = transport.connect()
             channel = connection.channel()
 
             # Объявляем очередь здесь тоже (durable=True) на случай, если консьюмер запустился первым
@@ -87,48 +535,40 @@ def _consumer_loop(app, queue_name: str, processing_callback: callable):
             # Помогает распределять нагрузку, если будет несколько инстансов консьюмера.
             channel.basic_qos(prefetch_count=1)
 
-            def callback_wrapper(ch, method, properties, body):
-                """Обертка для вызова processing_callback внутри app_context и ack/nack."""
+            logger.info(f"[*] Waiting for messages in queue '{queue_name}'. To exit press CTRL+C")
+            # Ручное подтверждение (auto_ack=False); consume одинаково работает для всех транспортов
+            for method, properties, body in channel.consume(queue_name, auto_ack=False):
                 logger.debug(f"Received message from '{queue_name}'. Delivery tag: {method.delivery_tag}")
+                try:
+                    events = unpack(body, properties.content_type)
+                except ValueError as e:
+                    logger.error(f"Failed to decode message from '{queue_name}': {e}. Body: {body[:100]}...")
+                    # Отклоняем сообщение без повторной постановки в очередь (requeue=False)
+                    channel.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+                    continue
+
                 message_data = None
                 try:
-                    message_data = json.loads(body)
-                    # Выполняем реальную обработку внутри контекста приложения
+                    # Выполняем реальную обработку внутри контекста приложения, по одному событию конверта
                     with app.app_context():
-                        processing_callback(message_data)
+                        for message_data in events:
+                            processing_callback(message_data)
 
                     # Подтверждаем успешную обработку сообщения
-                    ch.basic_ack(delivery_tag=method.delivery_tag)
+                    channel.basic_ack(delivery_tag=method.delivery_tag)
                     logger.debug(f"Message acked. Delivery tag: {method.delivery_tag}")
 
-                except json.JSONDecodeError as e:
-                    logger.error(f"Failed to decode JSON message from '{queue_name}': {e}. Body: {body[:100]}...")
-                    # Отклоняем сообщение без повторной постановки в очередь (requeue=False)
-                    ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
                 except Exception as e:
                     logger.error(f"Error processing message from '{queue_name}': {e}. Data: {message_data}")
                     # Отклоняем сообщение, но можно вернуть в очередь (requeue=True), если ошибка временная
                     # Осторожно: может привести к зацикливанию, если ошибка постоянная.
                     # Лучше False, а проблемные сообщения анализировать отдельно (Dead Letter Queue)
-                    ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
-                    # Можно добавить откат db.session.rollback() здесь, если ошибка была в БД
-                    with app.app_context():
-                       from flask_sqlalchemy import get_debug_queries # Пример доступа к db
-                       # Проверяем, есть ли db в расширениях app
-                       if 'sqlalchemy' in app.extensions:
-                           db = app.extensions['sqlalchemy'].db
-                           db.session.rollback()
-                           logger.warning("Database session rolled back due to processing error.")
-
-
-            # Устанавливаем auto_ack=False для ручного подтверждения
-            channel.basic_consume(queue=queue_name, on_message_callback=callback_wrapper, auto_ack=False)
-
-            logger.info(f"[*] Waiting for messages in queue '{queue_name}'. To exit press CTRL+C")
-            channel.start_consuming()
+                    channel.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+                    # Откатываем сессию БД, если ошибка была в БД
+                    _rollback_db_session(app)
 
         except pika.exceptions.AMQPConnectionError as e:
-            logger.warning(f"RabbitMQ connection failed for queue '{queue_name}': {e}. Retrying in 5 seconds...")
+            logger.warning(f"Connection to {transport} failed for queue '{queue_name}': {e}. Retrying in 5 seconds...")
             if connection and connection.is_open:
                 connection.close()
             time.sleep(5)
@@ -143,20 +583,182 @@ def _consumer_loop(app, queue_name: str, processing_callback: callable):
                 connection.close()
             time.sleep(10) # Ждем дольше при неизвестной ошибке
 
-def start_consumer_thread(app, queue_name: str, processing_callback: callable):
+def _process_batch(app, channel, queue_name: str, batch: list, processing_callback: callable):
     """
-    Запускает консьюмер RabbitMQ для указанной очереди в отдельном демон-потоке.
+    Обрабатывает накопленную пачку сообщений и подтверждает ее одним basic_ack(multiple=True).
+
+    Если пачка целиком не обработалась, сообщения обрабатываются по одному
+    (все события сообщения - одним вызовом), чтобы одно "плохое" сообщение
+    не отбрасывало всю пачку.
+
+    Args:
+        batch: Список кортежей (delivery_tag, события сообщения) в порядке получения.
+    """
+    try:
+        with app.app_context():
+            processing_callback([message_data for _, events in batch for message_data in events])
+        channel.basic_ack(delivery_tag=batch[-1][0], multiple=True)
+        logger.debug(f"Batch of {len(batch)} message(s) from '{queue_name}' acked.")
+        return
+    except Exception as e:
+        logger.error(f"Error processing batch of {len(batch)} message(s) from '{queue_name}': {e}. Retrying one by one.")
+        _rollback_db_session(app)
+
+    for delivery_tag, events in batch:
+        try:
+            with app.app_context():
+                processing_callback(events)
+            channel.basic_ack(delivery_tag=delivery_tag)
+        except Exception as e:
+            logger.error(f"Error processing message from '{queue_name}': {e}. Data: {events}")
+            channel.basic_nack(delivery_tag=delivery_tag, requeue=False)
+            _rollback_db_session(app)
+
+def _batch_consumer_loop(app, queue_name: str, processing_callback: callable,
+                         batch_size: int, batch_timeout_ms: int):
+    """
+    Пакетный цикл консьюмера: набирает до batch_size событий (сообщений или
+    событий из конвертов) или ждет не дольше batch_timeout_ms, после чего
+    обрабатывает их одним вызовом.
 
     Args:
         app: Экземпляр Flask приложения.
         queue_name: Имя очереди для прослушивания.
-        processing_callback: Функция для обработки сообщений (принимает словарь).
+        processing_callback: Функция, принимающая список десериализованных
+                             событий (словарей). Запускается внутри app_context
+                             один раз на пачку.
+        batch_size: Максимальный размер пачки в событиях (он же prefetch_count в сообщениях).
+        batch_timeout_ms: Максимальное время ожидания неполной пачки.
     """
+    logger.info(f"Batch consumer thread for queue '{queue_name}' started (batch_size={batch_size}, timeout={batch_timeout_ms}ms).")
+    time.sleep(2) # Даем приложению время на запуск
+    batch_timeout = batch_timeout_ms / 1000.0
+    transport = get_transport(app.config)
+
+    while True:
+        connection = None
+        try:
+            logger.info(f"Attempting connection to {transport} for queue '{queue_name}'...")
+            connection = transport.connect()
+            channel = connection.channel()
+            channel.queue_declare(queue=queue_name, durable=True)
+            # Брокер может выдать сразу всю пачку без ожидания подтверждений
+            channel.basic_qos(prefetch_count=batch_size)
+
+            batch = []
+            batch_events = 0
+            deadline = None
+            logger.info(f"[*] Waiting for messages in queue '{queue_name}'. To exit press CTRL+C")
+            for method, properties, body in channel.consume(queue_name, auto_ack=False, inactivity_timeout=batch_timeout):
+                if method is not None:
+                    try:
+                        events = unpack(body, properties.content_type)
+                        batch.append((method.delivery_tag, events))
+                        batch_events += len(events)
+                    except ValueError as e:
+                        logger.error(f"Failed to decode message from '{queue_name}': {e}. Body: {body[:100]}...")
+                        channel.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+                    if deadline is None:
+                        deadline = time.monotonic() + batch_timeout
+
+                if batch and (batch_events >= batch_size or method is None or time.monotonic() >= deadline):
+                    _process_batch(app, channel, queue_name, batch, processing_callback)
+                    batch = []
+                    batch_events = 0
+                    deadline = None
+
+        except pika.exceptions.AMQPConnectionError as e:
+            logger.warning(f"Connection to {transport} failed for queue '{queue_name}': {e}. Retrying in 5 seconds...")
+            if connection and connection.is_open:
+                connection.close()
+            time.sleep(5)
+        except KeyboardInterrupt:
+            logger.info(f"[-] Consumer for queue '{queue_name}' stopped by user.")
+            if connection and connection.is_open:
+                connection.close()
+            break
+        except Exception as e:
+            logger.error(f"[!] An unexpected error occurred in the batch consumer loop for '{queue_name}': {e}")
+            if connection and connection.is_open:
+                connection.close()
+            time.sleep(10)
+
+def _start_loop(app, queue_name: str, processing_callback: callable, batch_size: int, batch_timeout_ms: int):
+    if batch_size:
+        target = _batch_consumer_loop
+        args = (app, queue_name, processing_callback, batch_size, batch_timeout_ms)
+    else:
+        target = _consumer_loop
+        args = (app, queue_name, processing_callback)
+
     consumer_thread = threading.Thread(
-        target=_consumer_loop,
-        args=(app, queue_name, processing_callback),
+        target=target,
+        args=args,
         daemon=True # Поток завершится, когда завершится основной процесс
     )
     consumer_thread.start()
-    logger.info(f"RabbitMQ consumer thread initiated for queue '{queue_name}'.")
-    return consumer_thread
\ No newline at end of file
+    return consumer_thread
+
+def _partition_supervisor(app, queue_name: str, processing_callback: callable, partitions: int,
+                          batch_size: int, batch_timeout_ms: int):
+    """
+    Готовит партиции очереди и держит по одному консьюмеру на каждую партицию
+    этого процесса, перезапуская завершившиеся.
+    """
+    while True:
+        try:
+            owned = prepare_partitions(app, queue_name, partitions)
+            break
+        except pika.exceptions.AMQPError as e:
+            logger.warning(f"Failed to prepare partitions of '{queue_name}': {e!r}. Retrying in 5 seconds...")
+            time.sleep(5)
+    logger.info(f"Consuming {len(owned)} of {partitions} partition(s) of '{queue_name}': {', '.join(owned) or '-'}.")
+
+    consumers = {}
+    while True:
+        for partition in owned:
+            consumer = consumers.get(partition)
+            if consumer is None or not consumer.is_alive():
+                if consumer is not None:
+                    logger.warning(f"Consumer of partition '{partition}' exited, restarting.")
+                consumers[partition] = _start_loop(app, partition, processing_callback, batch_size, batch_timeout_ms)
+        time.sleep(5)
+
+def start_consumer_thread(app, queue_name: str, processing_callback: callable,
+                          batch_size: int = None, batch_timeout_ms: int = 200, partitions: int = 0):
+    """
+    Запускает консьюмер очереди (транспорт - MESSAGE_TRANSPORT) в отдельном демон-потоке.
+
+    Args:
+        app: Экземпляр Flask приложения.
+        queue_name: Имя очереди для прослушивания.
+        processing_callback: Функция для обработки сообщений. Без batch_size
+                             принимает словарь, в пакетном режиме - список словарей.
+        batch_size: Если задан, включает пакетный режим: до batch_size сообщений
+                    обрабатываются одним вызовом и подтверждаются одним ack.
+        batch_timeout_ms: Максимальное ожидание неполной пачки в пакетном режиме.
+        partitions: Число партиций очереди (MESSAGE_PARTITIONS). Если больше 0,
+                    поток - супервизор с отдельным консьюмером на каждую партицию,
+                    назначенную процессу (CONSUMER_PROCESS_INDEX/CONSUMER_PROCESS_COUNT).
+
+    Raises:
+        ValueError: Некорректное назначение партиций процессу.
+    """
+    transport_name = app.config.get('MESSAGE_TRANSPORT', 'rabbitmq')
+    if partitions:
+        # Ошибка назначения партиций должна остановить запуск, а не поток супервизора
+        assigned_partitions(partitions, app.config.get('CONSUMER_PROCESS_INDEX', 0),
+                            app.config.get('CONSUMER_PROCESS_COUNT', 1))
+        supervisor_thread = threading.Thread(
+            target=_partition_supervisor,
+            args=(app, queue_name, processing_callback, partitions, batch_size, batch_timeout_ms),
+            daemon=True
+        )
+        supervisor_thread.start()
+        logger.info(f"Partition supervisor initiated for queue '{queue_name}' "
+                    f"({partitions} partition(s), {transport_name} transport).")
+        return supervisor_thread
+
+    consumer_thread = _start_loop(app, queue_name, processing_callback, batch_size, batch_timeout_ms)
+    logger.info(f"Consumer thread initiated for queue '{queue_name}' ({transport_name} transport).")
+    return consumer_thread
@@ -0,0 +1,118 @@
+# shared/schema.py
+
+"""
+Создание схемы БД сервиса отдельно от создания приложения.
+
+create_app больше не обязан выполнять db.create_all(): при
+AUTO_CREATE_SCHEMA = False схема создается один раз командой
+
+    flask --app game_service init-db
+    flask --app auth_service init-db
+
+или запускателем run_production.py перед стартом воркеров.
+
+Существующие таблицы дополняются недостающими колонками моделей
+(ALTER TABLE ... ADD COLUMN), после чего выполняются шаги обновления
+сервиса (например, заполнение новых колонок по старым данным).
+"""
+
+import logging
+import os
+
+import click
+from sqlalchemy import inspect
+from sqlalchemy.engine import make_url
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_UPGRADES_KEY = 'schema_upgrades'
+
+
+def _ensure_database_dir(uri: str):
+    """Создает каталог файла SQLite (например, instance/ сервиса), если его нет."""
+    url = make_url(uri)
+    if url.get_backend_name() == 'sqlite' and url.database and url.database != ':memory:':
+        directory = os.path.dirname(os.path.abspath(url.database))
+        os.makedirs(directory, exist_ok=True)
+
+
+def _column_default(column):
+    """Константа DEFAULT для ALTER TABLE (SQLite не допускает выражений)."""
+    default = column.default
+    if default is None or not default.is_scalar or default.arg is None:
+        return ''
+    value = default.arg
+    if isinstance(value, bool):
+        value = int(value)
+    if isinstance(value, (int, float)):
+        return f" DEFAULT {value}"
+    return " DEFAULT '" + str(value).replace("'", "''") + "'"
+
+
+def add_missing_columns(connection, metadata) -> dict:
+    """
+    Добавляет в существующие таблицы колонки моделей, которых в них еще нет.
+
+    Returns:
+        {имя таблицы: [имена добавленных колонок]}.
+    """
+    inspector = inspect(connection)
+    existing_tables = set(inspector.get_table_names())
+    added = {}
+    for table in metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=connection.dialect)
+            connection.exec_driver_sql(
+                f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}{_column_default(column)}'
+            )
+            added.setdefault(table.name, []).append(column.name)
+            logger.info(f"Added column {table.name}.{column.name} to existing table.")
+    return added
+
+
+def create_schema(app):
+    """
+    Создает недостающие таблицы всех моделей сервиса, дополняет существующие
+    таблицы новыми колонками и выполняет шаги обновления сервиса (идемпотентно).
+
+    Args:
+        app: Экземпляр Flask приложения с инициализированным Flask-SQLAlchemy.
+    """
+    db = app.extensions['sqlalchemy']
+    _ensure_database_dir(app.config['SQLALCHEMY_DATABASE_URI'])
+    with app.app_context():
+        with db.engine.begin() as connection:
+            added = add_missing_columns(connection, db.metadata)
+            for upgrade in app.extensions.get(SCHEMA_UPGRADES_KEY, ()):
+                upgrade(connection, added)
+        db.create_all()
+    logger.info(f"Database schema is up to date for {app.name}.")
+
+
+def init_schema(app, upgrades=()):
+    """
+    Регистрирует команду 'flask init-db' и, если включено AUTO_CREATE_SCHEMA,
+    сразу создает схему. Вызывается в create_app после импорта моделей.
+
+    Args:
+        app: Экземпляр Flask приложения.
+        upgrades: Шаги обновления данных: функции (connection, added), где added -
+                  результат add_missing_columns. Выполняются в той же транзакции.
+    """
+    app.extensions[SCHEMA_UPGRADES_KEY] = tuple(upgrades)
+
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Создать таблицы БД сервиса."""
+        create_schema(app)
+        click.echo(f"Database schema is up to date for {app.name}.")
+
+    if app.config.get('AUTO_CREATE_SCHEMA', True):
+        create_schema(app)
+    else:
+        _ensure_database_dir(app.config['SQLALCHEMY_DATABASE_URI'])
@@ -0,0 +1,114 @@
+# shared/storage.py
+
+"""
+Профили хранения SQLite и отдельный движок для чтения.
+
+Профиль - набор PRAGMA, которые выполняются на каждом новом соединении
+(событие 'connect' движка SQLAlchemy). Профиль выбирается через
+SQLITE_PROFILE в конфигурации сервиса.
+
+Для маршрутов, которые только читают данные, создается отдельный движок
+со своим пулом соединений (SQLITE_READ_POOL_SIZE) и PRAGMA query_only:
+в режиме WAL читатели не блокируются писателем, а пул записи не занят
+читающими запросами.
+"""
+
+from flask import current_app
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+
+STORAGE_PROFILES = {
+    # Настройки SQLite по умолчанию (журнал DELETE), только ожидание блокировок
+    'default': {
+        'busy_timeout': 5000,
+    },
+    # WAL: читатели не блокируются писателем; synchronous=NORMAL безопасен в WAL
+    # (при сбое питания можно потерять последние транзакции, но не целостность БД)
+    'wal': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,  # В КиБ (отрицательное значение), т.е. 64 МиБ
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,
+    },
+    # WAL с fsync на каждый commit
+    'durable': {
+        'journal_mode': 'WAL',
+        'synchronous': 'FULL',
+        'cache_size': -64 * 1024,
+        'busy_timeout': 10000,
+    },
+}
+
+READ_ENGINE_KEY = 'sqlite_read_engine'
+
+
+def apply_storage_profile(engine, profile_name: str, read_only: bool = False):
+    """
+    Регистрирует PRAGMA профиля на событие 'connect' движка.
+
+    Args:
+        engine: Движок SQLAlchemy (SQLite).
+        profile_name: Имя профиля из STORAGE_PROFILES.
+        read_only: Включить PRAGMA query_only для соединений движка.
+
+    Raises:
+        ValueError: Если профиль неизвестен.
+    """
+    if profile_name not in STORAGE_PROFILES:
+        raise ValueError(f"Unknown SQLite storage profile '{profile_name}'. Available: {', '.join(STORAGE_PROFILES)}")
+    pragmas = dict(STORAGE_PROFILES[profile_name])
+    if read_only:
+        pragmas['query_only'] = 'ON'
+
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def _is_memory_database(uri: str) -> bool:
+    return uri in ('sqlite://', 'sqlite:///:memory:') or 'mode=memory' in uri
+
+
+def init_storage(app, db):
+    """
+    Применяет профиль хранения к движку Flask-SQLAlchemy и создает движок для чтения.
+    Вызывается в create_app сразу после db.init_app(app), до первого соединения.
+
+    Args:
+        app: Экземпляр Flask приложения.
+        db: Экземпляр SQLAlchemy сервиса.
+    """
+    profile_name = app.config.get('SQLITE_PROFILE', 'wal')
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+
+    with app.app_context():
+        write_engine = db.engine
+    apply_storage_profile(write_engine, profile_name)
+
+    read_pool_size = app.config.get('SQLITE_READ_POOL_SIZE', 8)
+    if not read_pool_size or _is_memory_database(uri):
+        # Отдельный движок для БД в памяти указывал бы на другую (пустую) БД
+        app.extensions[READ_ENGINE_KEY] = write_engine
+        return
+
+    read_engine = create_engine(uri, pool_size=read_pool_size, max_overflow=read_pool_size)
+    apply_storage_profile(read_engine, profile_name, read_only=True)
+    app.extensions[READ_ENGINE_KEY] = read_engine
+
+
+def read_session() -> Session:
+    """
+    Новая сессия SQLAlchemy на движке для чтения текущего приложения.
+
+    Пример:
+        with read_session() as session:
+            user = session.get(User, user_id)
+    """
+    return Session(current_app.extensions[READ_ENGINE_KEY])
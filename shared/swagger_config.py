@@ -1,14 +1,47 @@
 # swagger_config.py
 
 # shared/swagger_config.py
-from flasgger import Swagger
-import os # Импортируем os, если его еще нет
+import gzip
+import hashlib
+import logging
+import threading
+
+from flask import Response, request
+
+logger = logging.getLogger(__name__)
+
+APISPEC_ENDPOINT = 'apispec'
+APISPEC_CACHE_KEY = 'apispec_cache'
+
+
+def swag_from(specs: dict):
+    """
+    Легкая замена flasgger.swag_from для спецификаций-словарей.
+
+    Сохраняет спецификацию в атрибуте specs_dict функции - там же, где ее ищет
+    flasgger при построении apispec. Роуты не импортируют flasgger, поэтому
+    при SWAGGER_ENABLED = False сервис не загружает его вовсе.
+
+    Args:
+        specs: Спецификация эндпоинта в формате flasgger (dict).
+    """
+    def decorator(function):
+        function.specs_dict = specs
+        return function
+    return decorator
+
 
 def init_swagger(app):
     """
     Инициализация Swagger для Flask-приложения.
     Автоматически определяет host на основе конфигурации приложения.
+    Ничего не делает при SWAGGER_ENABLED = False (flasgger не импортируется).
     """
+    if not app.config.get('SWAGGER_ENABLED', True):
+        logger.info(f"Swagger is disabled for {app.name}.")
+        return
+    from flasgger import Swagger
+
     # Определяем хост и порт
     # Сначала пытаемся взять SERVER_NAME, если он задан (например, 'mydomain.com' или 'localhost:5000')
     host = app.config.get('SERVER_NAME')
@@ -61,4 +94,92 @@ def init_swagger(app):
     }
 
     # Инициализация Swagger с подготовленной конфигурацией
-    Swagger(app, config=swagger_config)
\ No newline at end of file
+    swagger = Swagger(app, config=swagger_config)
+
+    # /apispec.json отдается из памяти готовыми байтами (см. ApiSpecCache)
+    spec_cache = ApiSpecCache(app, swagger)
+    app.extensions[APISPEC_CACHE_KEY] = spec_cache
+    app.view_functions[f"{swagger.config.get('endpoint', 'flasgger')}.{APISPEC_ENDPOINT}"] = spec_cache.view
+
+
+def precompute_apispec(app):
+    """
+    Строит спецификацию заранее (вызывается в create_app после регистрации
+    всех blueprint'ов), чтобы первый запрос к /apispec.json не платил за сборку.
+    """
+    spec_cache = app.extensions.get(APISPEC_CACHE_KEY)
+    if spec_cache is not None:
+        with app.app_context():
+            spec_cache.get()
+
+
+class _SpecEntry:
+    """Сериализованная спецификация: JSON, gzip-версия и их ETag."""
+
+    __slots__ = ('fingerprint', 'body', 'gzip_body', 'etag')
+
+    def __init__(self, fingerprint: str, body: bytes):
+        self.fingerprint = fingerprint
+        self.body = body
+        self.gzip_body = gzip.compress(body, compresslevel=9, mtime=0)
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+
+
+class ApiSpecCache:
+    """
+    Спецификация OpenAPI, собранная один раз и хранимая в виде готовых байтов.
+
+    flasgger собирает спецификацию обходом всех правил URL и разбором swag_from
+    (в debug-режиме - на каждый запрос) и сериализует ее заново на каждый запрос.
+    Здесь спецификация собирается при первом обращении (или в precompute_apispec),
+    сериализуется и сжимается один раз и отдается со строгим ETag (хеш содержимого,
+    одинаковый во всех воркерах). Пересборка - только при изменении таблицы маршрутов.
+
+    Args:
+        app: Экземпляр Flask приложения.
+        swagger: Экземпляр flasgger.Swagger этого приложения.
+    """
+
+    def __init__(self, app, swagger):
+        self.app = app
+        self.swagger = swagger
+        self._entry = None
+        self._rule_count = None
+        self._lock = threading.Lock()
+
+    def _route_fingerprint(self) -> str:
+        rules = sorted(
+            (rule.rule, rule.endpoint, ','.join(sorted(rule.methods or ())))
+            for rule in self.app.url_map.iter_rules()
+        )
+        return hashlib.sha256(repr(rules).encode()).hexdigest()
+
+    def get(self) -> _SpecEntry:
+        """Актуальная сериализованная спецификация. Вызывать внутри app_context."""
+        # Правила в url_map только добавляются - число правил дешево выявляет изменения
+        rule_count = len(self.app.url_map._rules)
+        entry = self._entry
+        if entry is not None and rule_count == self._rule_count:
+            return entry
+        with self._lock:
+            fingerprint = self._route_fingerprint()
+            if self._entry is None or self._entry.fingerprint != fingerprint:
+                spec = self.swagger.get_apispecs(APISPEC_ENDPOINT)
+                self._entry = _SpecEntry(fingerprint, self.app.json.dumps(spec).encode())
+                logger.info(f"Built API spec for {self.app.name} ({len(self._entry.body)} bytes).")
+            self._rule_count = rule_count
+            return self._entry
+
+    def view(self):
+        entry = self.get()
+        if 'gzip' in request.accept_encodings:
+            response = Response(entry.gzip_body, mimetype='application/json')
+            response.headers['Content-Encoding'] = 'gzip'
+            # Строгий ETag различается для разных представлений
+            response.set_etag(f"{entry.etag}-gzip")
+        else:
+            response = Response(entry.body, mimetype='application/json')
+            response.set_etag(entry.etag)
+        response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = 'public, no-cache'
+        return response.make_conditional(request)
\ No newline at end of file
@@ -0,0 +1,155 @@
+# shared/templating.py
+
+"""
+Настройка Jinja для сервисов: загрузчик шаблонов и профиль рендеринга.
+
+Профиль выбирается через TEMPLATE_PROFILE:
+    - 'development' (по умолчанию): шаблоны перечитываются при изменении файлов,
+      кэш фрагментов выключен;
+    - 'production': без проверки файлов (TEMPLATES_AUTO_RELOAD = False),
+      байткод шаблонов хранится на диске (TEMPLATE_CACHE_DIR) и общий для всех
+      процессов сервиса, все шаблоны компилируются при старте, а блоки
+      {% cache %} кэшируют отрендеренные фрагменты.
+
+Кэш фрагментов:
+    {% cache 'buildings', buildings.sawmill_level, buildings.quarry_level %}
+        ...
+    {% endcache %}
+Ключ - имя шаблона и все перечисленные значения, поэтому внутри блока
+можно использовать только то, что входит в ключ.
+"""
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import jinja2
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+logger = logging.getLogger(__name__)
+
+PRODUCTION_PROFILE = 'production'
+
+
+class FragmentCache:
+    """
+    Потокобезопасный LRU-кэш отрендеренных фрагментов.
+
+    Args:
+        maxsize: Максимальное число фрагментов.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+class FragmentCacheExtension(Extension):
+    """Тег {% cache key, ... %}...{% endcache %}. Без environment.fragment_cache рендерит блок как есть."""
+
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key_parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            key_parts.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        args = [nodes.Const(parser.name), nodes.Tuple(key_parts, 'load')]
+        return nodes.CallBlock(self.call_method('_cached_fragment', args), [], [], body).set_lineno(lineno)
+
+    def _cached_fragment(self, template_name, key_parts, caller):
+        cache = self.environment.fragment_cache
+        if cache is None:
+            return caller()
+        key = (template_name,) + tuple(key_parts)
+        fragment = cache.get(key)
+        if fragment is None:
+            fragment = caller()
+            cache.put(key, fragment)
+        return fragment
+
+
+def configure_templates(app, extra_folders=('shared',)):
+    """
+    Настраивает загрузчик шаблонов и профиль рендеринга приложения.
+    Вызывается в create_app до первого рендеринга.
+
+    Args:
+        app: Экземпляр Flask приложения.
+        extra_folders: Каталоги с общими шаблонами относительно корня проекта
+                       (ищутся после шаблонов сервиса).
+    """
+    service_templates = os.path.join(app.root_path, app.template_folder)
+    project_root = os.path.abspath(os.path.join(app.root_path, '..'))
+    app.jinja_loader = jinja2.ChoiceLoader(
+        [jinja2.FileSystemLoader(service_templates)] +
+        [jinja2.FileSystemLoader(os.path.join(project_root, folder, 'templates')) for folder in extra_folders]
+    )
+
+    production = app.config.get('TEMPLATE_PROFILE') == PRODUCTION_PROFILE
+    options = dict(app.jinja_options)
+    options['extensions'] = list(options.get('extensions', ())) + [FragmentCacheExtension]
+    if production:
+        app.config['TEMPLATES_AUTO_RELOAD'] = False
+        cache_dir = app.config.get('TEMPLATE_CACHE_DIR') or os.path.join(app.instance_path, 'jinja_cache')
+        os.makedirs(cache_dir, exist_ok=True)
+        options['bytecode_cache'] = jinja2.FileSystemBytecodeCache(cache_dir)
+    app.jinja_options = options
+
+    env = app.jinja_env
+    env.globals['now'] = datetime.utcnow
+    if production:
+        env.fragment_cache = FragmentCache(app.config.get('TEMPLATE_FRAGMENT_CACHE_SIZE', 1024))
+        precompile_templates(app)
+
+
+def precompile_templates(app) -> int:
+    """
+    Компилирует все HTML-шаблоны приложения (и записывает байткод в кэш),
+    чтобы первые запросы не платили за разбор шаблонов.
+
+    Returns:
+        Количество скомпилированных шаблонов.
+    """
+    env = app.jinja_env
+    compiled = 0
+    for name in env.list_templates(extensions=('html',)):
+        try:
+            env.get_template(name)
+            compiled += 1
+        except jinja2.TemplateError as e:
+            logger.error(f"Failed to precompile template '{name}': {e}")
+    logger.info(f"Precompiled {compiled} template(s) for {app.name}.")
+    return compiled